@@ -0,0 +1,70 @@
+"""连接池基准测试
+
+对比 FoodManager 每次调用新建连接与使用连接池时的开销：
+    python benchmarks/bench_connection_pool.py
+"""
+import sqlite3
+
+from common import create_temp_db, populate, timed
+
+from data.food_manager import FoodManager
+from data.connection_manager import ConnectionManager
+
+
+def bench_open_close(db_path, rounds):
+    """单纯打开/关闭连接的开销"""
+    def plain():
+        for _ in range(rounds):
+            conn = sqlite3.connect(db_path)
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.close()
+    
+    manager = ConnectionManager(db_path)
+    
+    def pooled():
+        for _ in range(rounds):
+            manager.get_reader().close()
+    
+    plain_time, _ = timed(plain)
+    pooled_time, _ = timed(pooled)
+    manager.close()
+    return plain_time, pooled_time
+
+
+def bench_get_photo(db_path, photo_ids, use_pool):
+    """详情面板和导出循环的访问模式：逐张读取照片"""
+    manager = FoodManager(db_path, use_pool=use_pool)
+    
+    def run():
+        for photo_id in photo_ids:
+            manager.get_photo(photo_id)
+    
+    elapsed, _ = timed(run)
+    if manager.connection_manager:
+        manager.connection_manager.close()
+    return elapsed
+
+
+def main():
+    db_path = create_temp_db()
+    populate(db_path, item_count=500, photos_per_item=4)
+    
+    conn = sqlite3.connect(db_path)
+    photo_ids = [row[0] for row in conn.execute("SELECT id FROM food_photos")]
+    conn.close()
+    
+    rounds = 2000
+    plain_time, pooled_time = bench_open_close(db_path, rounds)
+    print(f"打开/关闭连接 x{rounds}")
+    print(f"  每次新建连接: {plain_time * 1000:8.1f} ms ({plain_time / rounds * 1e6:6.1f} us/次)")
+    print(f"  连接池借还:   {pooled_time * 1000:8.1f} ms ({pooled_time / rounds * 1e6:6.1f} us/次)")
+    
+    plain_time = bench_get_photo(db_path, photo_ids, use_pool=False)
+    pooled_time = bench_get_photo(db_path, photo_ids, use_pool=True)
+    print(f"get_photo x{len(photo_ids)}")
+    print(f"  每次新建连接: {plain_time * 1000:8.1f} ms")
+    print(f"  连接池:       {pooled_time * 1000:8.1f} ms (加速 {plain_time / pooled_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""美食列表筛选基准测试
+
+对比旧的 QListWidget 逐项重建与分页查询的模型/视图列表在输入搜索关键字时的耗时：
+    python benchmarks/bench_food_list_filter.py [记录数]
+
+模型/视图列表的耗时从修改搜索框开始，到第一页显示为止，包括在数据库中的筛选和排序。
+
+没有显示环境时可设置 QT_QPA_PLATFORM=offscreen 运行。
+"""
+import sys
+import time
+
+from common import create_temp_db, populate, timed
+
+from PyQt5.QtWidgets import QApplication, QListWidget, QListWidgetItem
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QIcon
+
+from data.food_manager import FoodManager
+from ui.food_list_widget import FoodListWidget
+
+
+def make_items(count):
+    return [
+        {"id": i, "name": f"测试店铺{i}", "city": "北京" if i % 2 else "上海", "rating": 5 + i % 6}
+        for i in range(count)
+    ]
+
+
+def legacy_filter(list_widget, items, search_text):
+    """旧做法：清空列表，为每个符合条件的记录新建列表项和图标"""
+    list_widget.clear()
+    for item in items:
+        if search_text and search_text not in item["name"].lower():
+            continue
+        list_item = QListWidgetItem()
+        if item["rating"] >= 9:
+            list_item.setIcon(QIcon("icons/star_gold.png"))
+        elif item["rating"] >= 7:
+            list_item.setIcon(QIcon("icons/star_silver.png"))
+        else:
+            list_item.setIcon(QIcon("icons/star_bronze.png"))
+        list_item.setText(f"{item['name']} ({item['city']}) - {item['rating']}分")
+        list_item.setData(Qt.UserRole, item)
+        list_widget.addItem(list_item)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    app = QApplication(sys.argv)
+    items = make_items(count)
+
+    # 模拟逐字输入 "99" 再清空
+    keystrokes = ["9", "99", "9", ""]
+    print(f"{count} 条记录，依次输入搜索关键字 {keystrokes}")
+
+    list_widget = QListWidget()
+    list_widget.show()
+
+    def run_legacy():
+        for text in keystrokes:
+            legacy_filter(list_widget, items, text)
+            app.processEvents()
+
+    db_path = create_temp_db()
+    populate(db_path, item_count=count, photos_per_item=0)
+    food_list = FoodListWidget(FoodManager(db_path, use_pool=True))
+    food_list.show()
+
+    def wait_first_page():
+        loaded = []
+        food_list.model.modelReset.connect(lambda: loaded.append(True))
+        while not loaded:
+            app.processEvents()
+            time.sleep(0.001)
+        food_list.model.modelReset.disconnect()
+
+    food_list.set_collection(1)
+    wait_first_page()
+
+    def run_model():
+        for text in keystrokes:
+            food_list.search_edit.setText(text)
+            wait_first_page()
+
+    for name, run in (("QListWidget 重建", run_legacy), ("分页查询列表", run_model)):
+        elapsed, _ = timed(run)
+        print(f"  {name}: 每次按键 {elapsed * 1000 / len(keystrokes):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""名称模糊匹配基准测试
+
+生成随机中文店名，对比二字组索引查找与逐条计算编辑距离查找相近名称的耗时：
+    python benchmarks/bench_fuzzy_dedup.py [记录数]
+
+导入时每条新记录都要查找一次，逐条比较的总耗时随记录数平方增长。
+"""
+import random
+import sys
+
+from common import timed
+
+from data.dedup import NameIndex, edit_distance, fuzzy_distance_limit, normalize_name
+
+# 生成店名用的常见字
+NAME_CHARS = "金谷园饺子馆老北京炸酱面川味小吃麻辣烫火锅烤鸭海底捞四季民福东来顺全聚德西贝莜面村南门涮肉牛肉拉面鸡公煲黄焖米饭湘菜粤菜茶餐厅烧腊"
+
+
+def make_names(count, rng):
+    return [normalize_name("".join(rng.choice(NAME_CHARS) for _ in range(rng.randint(4, 10)))) for _ in range(count)]
+
+
+def misspell(name, rng):
+    """随机替换一个字，模拟输入错误或同一家店的不同写法"""
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice(NAME_CHARS) + name[i + 1:]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = random.Random(0)
+    names = make_names(count, rng)
+    queries = [misspell(rng.choice(names), rng) for _ in range(50)]
+
+    build_time, index = timed(lambda: build_index(names))
+
+    def index_search():
+        return [index.search(query, fuzzy_distance_limit(query)) for query in queries]
+
+    def linear_search():
+        return [[name for name in names if edit_distance(query, name) <= fuzzy_distance_limit(query)]
+                for query in queries]
+
+    index_time, index_results = timed(index_search)
+    linear_time, linear_results = timed(linear_search)
+    assert [sum(len(values) for _, _, values in result) for result in index_results] == \
+        [len(result) for result in linear_results]
+
+    print(f"{count} 条随机店名，{len(queries)} 次查找，建索引 {build_time * 1000:.0f} ms")
+    print(f"  二字组索引 每次查找 {index_time * 1000 / len(queries):8.2f} ms")
+    print(f"  逐条比较   每次查找 {linear_time * 1000 / len(queries):8.2f} ms")
+
+
+def build_index(names):
+    index = NameIndex()
+    for i, name in enumerate(names):
+        index.add(name, i)
+    return index
+
+
+if __name__ == "__main__":
+    main()
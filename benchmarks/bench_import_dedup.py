@@ -0,0 +1,75 @@
+"""导入查重基准测试
+
+向已有大量记录的数据库导入JSON文件，对比逐条 SELECT 查重与内存查重键集合：
+    python benchmarks/bench_import_dedup.py [已有条数] [导入条数]
+"""
+import json
+import os
+import sqlite3
+import sys
+
+from common import create_temp_db, populate, timed
+
+from data.dedup import dedup_key
+from data.food_manager import FoodManager
+
+
+def select_duplicates(db_path, items, with_index):
+    """旧做法：每条导入记录执行一次 SELECT 查重"""
+    conn = sqlite3.connect(db_path)
+    if with_index:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_food_items_name_address ON food_items(name, address)")
+    duplicates = 0
+    for item in items:
+        cursor = conn.execute("""
+            SELECT id FROM food_items
+            WHERE name = ? AND address = ?
+        """, (item.get("name", ""), item.get("address", "")))
+        if cursor.fetchone():
+            duplicates += 1
+    conn.execute("DROP INDEX IF EXISTS idx_food_items_name_address")
+    conn.close()
+    return duplicates
+
+
+def key_set_duplicates(db_path, items):
+    """新做法：一次读出全部查重键，在内存中比对"""
+    conn = sqlite3.connect(db_path)
+    keys = {row[0] for row in conn.execute("SELECT dedup_key FROM food_items WHERE dedup_key IS NOT NULL")}
+    conn.close()
+    return sum(1 for item in items if dedup_key(item.get("name", ""), item.get("address", "")) in keys)
+
+
+def main():
+    existing_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    import_count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    db_path = create_temp_db()
+    populate(db_path, item_count=existing_count, photos_per_item=0)
+
+    # 一半与已有记录重复，一半是新记录
+    items = []
+    for i in range(import_count):
+        index = i if i % 2 else existing_count + i
+        items.append({"name": f"测试店铺{index}", "address": f"测试地址{index}号", "city": "北京"})
+
+    file_path = os.path.join(os.path.dirname(db_path), "import.json")
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False)
+
+    no_index_time, duplicates = timed(lambda: select_duplicates(db_path, items, False))
+    index_time, _ = timed(lambda: select_duplicates(db_path, items, True))
+    key_set_time, key_set_count = timed(lambda: key_set_duplicates(db_path, items))
+
+    food_manager = FoodManager(db_path, use_pool=True)
+    import_time, (success, message) = timed(lambda: food_manager.import_data(file_path))
+
+    print(f"已有 {existing_count} 条记录，导入 {import_count} 条（其中 {duplicates} 条重复）")
+    print(f"逐条 SELECT 查重（无索引）:   {no_index_time * 1000:.1f} ms")
+    print(f"逐条 SELECT 查重（名称地址索引）: {index_time * 1000:.1f} ms")
+    print(f"查重键集合:                 {key_set_time * 1000:.1f} ms（{key_set_count} 条重复）")
+    print(f"完整导入（查重并写入）:      {import_time * 1000:.1f} ms  {message}")
+
+
+if __name__ == "__main__":
+    main()
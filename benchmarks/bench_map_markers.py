@@ -0,0 +1,113 @@
+"""地图标记上传基准测试
+
+对比逐个 runJavaScript 调用 addFoodMarker 与一次调用 applyMarkerDiff 上传全部标记的耗时：
+    python benchmarks/bench_map_markers.py [标记数]
+
+页面中的 addFoodMarker 只记录参数、不创建地图覆盖物，测得的是生成脚本、
+进程间传递和解析脚本的开销，从开始发送到页面处理完最后一个标记为止。
+
+没有显示环境时可设置 QT_QPA_PLATFORM=offscreen 运行。
+"""
+import json
+import sys
+import time
+
+from common import timed
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWebEngineWidgets import QWebEnginePage
+
+from ui.map_widget import marker_data
+
+# 与 map.html 接口相同的测试页面
+STUB_HTML = """
+<html><body><script>
+var markers = [];
+function addFoodMarker(lng, lat, name, rating, id, address, reason, city, food_type) {
+    markers.push(id);
+}
+function applyMarkerDiff(removedIds, changed) {
+    for (var i = 0; i < changed.length; i++) {
+        addFoodMarker.apply(null, changed[i]);
+    }
+}
+</script></body></html>
+"""
+
+
+def make_items(count):
+    return [
+        {"id": i, "name": f"测试店铺{i}", "city": "北京", "rating": 5 + i % 6,
+         "address": f"测试地址{i}号", "reason": "好吃 \"推荐\" 的'招牌菜'", "food_type": "中餐",
+         "latitude": 39.9 + i * 0.0001, "longitude": 116.4 + i * 0.0001}
+        for i in range(count)
+    ]
+
+
+def legacy_marker_js(item):
+    """旧做法：手工转义引号，每个标记生成一段 addFoodMarker 调用"""
+    reason = (item.get('reason', '') or '').replace('"', '\\"').replace("'", "\\'")
+    name = item['name'].replace('"', '\\"').replace("'", "\\'")
+    address = (item.get('address') or '未知').replace('"', '\\"').replace("'", "\\'")
+    city = (item.get('city') or '未知').replace('"', '\\"').replace("'", "\\'")
+    return f"""addFoodMarker(
+        {item['longitude']},
+        {item['latitude']},
+        "{name}",
+        {item['rating']},
+        {item['id']},
+        "{address}",
+        "{reason}",
+        "{city}",
+        "{item['food_type']}"
+    );"""
+
+
+def batched_js(items):
+    """地图实际发送的批次：所有标记序列化为一个紧凑的JSON数组"""
+    data = json.dumps([marker_data(item) for item in items], ensure_ascii=False, separators=(",", ":"))
+    return f"applyMarkerDiff([], {data});"
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    app = QApplication(sys.argv)
+    items = make_items(count)
+
+    page = QWebEnginePage()
+    loaded = []
+    page.loadFinished.connect(loaded.append)
+    page.setHtml(STUB_HTML)
+    while not loaded:
+        app.processEvents()
+        time.sleep(0.001)
+
+    def wait_markers():
+        """页面按顺序执行脚本，最后一次调用返回时之前的标记都已处理"""
+        result = []
+        page.runJavaScript("var n = markers.length; markers = []; n;", result.append)
+        while not result:
+            app.processEvents()
+            time.sleep(0.0005)
+        assert result[0] == count, result[0]
+
+    def run_legacy():
+        for item in items:
+            page.runJavaScript(legacy_marker_js(item))
+        wait_markers()
+
+    def run_batched():
+        page.runJavaScript(batched_js(items))
+        wait_markers()
+
+    legacy_size = sum(len(legacy_marker_js(item).encode("utf-8")) for item in items)
+    batched_size = len(batched_js(items).encode("utf-8"))
+    print(f"{count} 个标记")
+    for name, run, size in (("逐个调用 addFoodMarker", run_legacy, legacy_size),
+                            ("一次调用 applyMarkerDiff", run_batched, batched_size)):
+        elapsed, _ = timed(run, repeat=3)
+        print(f"  {name}: {elapsed * 1000:8.1f} ms，脚本 {size / 1024:7.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
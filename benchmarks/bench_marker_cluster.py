@@ -0,0 +1,56 @@
+"""地图聚合基准测试
+
+在全国范围随机生成美食点，给出聚合索引的建立耗时，以及各缩放级别下
+查询视野内聚合结果的耗时和需要绘制的覆盖物数量（不聚合时每个点一个标记加一个范围圆）：
+    python benchmarks/bench_marker_cluster.py [记录数]
+"""
+import random
+import sys
+
+from common import timed
+
+from data.marker_cluster import MarkerClusterIndex
+
+# 缩放级别 -> 视野范围 (最小纬度, 最小经度, 最大纬度, 最大经度)
+VIEWPORTS = [
+    (5, (18.0, 73.0, 54.0, 135.0)),     # 全国
+    (8, (36.0, 112.0, 44.0, 121.0)),    # 华北
+    (12, (39.7, 116.1, 40.1, 116.7)),   # 北京市区
+    (16, (39.90, 116.38, 39.93, 116.43)),
+    (18, (39.905, 116.40, 39.912, 116.41)),  # 超过最大聚合级别，逐个显示
+]
+
+
+def make_items(count):
+    """大部分点集中在几个城市附近，其余散布在全国"""
+    rng = random.Random(0)
+    cities = [(39.9, 116.4), (31.2, 121.5), (23.1, 113.3), (30.6, 104.1), (30.3, 120.2)]
+    items = []
+    for i in range(count):
+        if rng.random() < 0.8:
+            lat, lng = rng.choice(cities)
+            lat, lng = rng.gauss(lat, 0.15), rng.gauss(lng, 0.15)
+        else:
+            lat, lng = rng.uniform(20, 45), rng.uniform(100, 122)
+        items.append({"id": i, "latitude": lat, "longitude": lng})
+    return items
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    items = make_items(count)
+
+    build_time, index = timed(lambda: MarkerClusterIndex(items))
+    print(f"{count} 个美食点，建立聚合索引 {build_time * 1000:.0f} ms")
+
+    for zoom, bounds in VIEWPORTS:
+        min_lat, min_lng, max_lat, max_lng = bounds
+        visible = sum(1 for item in items
+                      if min_lat <= item["latitude"] <= max_lat and min_lng <= item["longitude"] <= max_lng)
+        query_time, (points, clusters) = timed(lambda: index.clusters(zoom, bounds), repeat=10)
+        print(f"  缩放 {zoom:2d}: 查询 {query_time * 1000:6.2f} ms，"
+              f"绘制 {len(points) * 2 + len(clusters):6d} 个覆盖物（不聚合 {visible * 2:6d} 个）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""拼音检索基准测试
+
+生成随机中文店名，对比拼音索引上的前缀查找与逐条计算拼音匹配的耗时，
+并给出列表按拼音检索读取第一页（200条，按创建时间排序）的耗时：
+    python benchmarks/bench_pinyin_search.py [记录数]
+
+很短的前缀（如单个字母）匹配大部分记录，第一页的耗时取决于匹配的条数。
+"""
+import random
+import sqlite3
+import sys
+
+from common import create_temp_db, timed
+
+from data.food_manager import FoodManager, FoodQuery
+from data.pinyin import index_food_pinyin, matches_pinyin, prefix_range
+
+# 生成店名用的常见字
+NAME_CHARS = "金谷园饺子馆老北京炸酱面川味小吃麻辣烫火锅烤鸭海底捞四季民福东来顺全聚德西贝莜面村南门涮肉牛肉拉面鸡公煲黄焖米饭湘菜粤菜茶餐厅烧腊"
+
+# 模拟逐字输入的检索词
+QUERIES = ["j", "jg", "jgy", "jin", "jingu", "jinguyuan", "hg", "huoguo", "nrlm"]
+
+
+def populate_names(db_path, count):
+    rng = random.Random(0)
+    names = ["".join(rng.choice(NAME_CHARS) for _ in range(rng.randint(3, 8))) for _ in range(count)]
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.executemany(
+        "INSERT INTO food_items (id, collection_id, name, city, rating) VALUES (?, 1, ?, '北京', 8)",
+        [(food_id, name) for food_id, name in enumerate(names, 1)]
+    )
+    index_food_pinyin(cursor, enumerate(names, 1))
+    conn.commit()
+    conn.close()
+    return names
+
+
+def index_lookup(conn, text, limit=200):
+    low, high = prefix_range(text)
+    return conn.execute("""
+        SELECT food_id FROM food_items_pinyin WHERE full >= ? AND full < ?
+        UNION ALL SELECT food_id FROM food_items_pinyin WHERE initials >= ? AND initials < ?
+        LIMIT ?
+    """, (low, high, low, high, limit)).fetchall()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    db_path = create_temp_db()
+    names = populate_names(db_path, count)
+    conn = sqlite3.connect(db_path)
+    food_manager = FoodManager(db_path, use_pool=True)
+
+    def first_page(text):
+        # 不使用缓存，测量数据库查询本身
+        food_manager.cache.invalidate()
+        return food_manager.query_food_items(FoodQuery().collection(1).text(text).limit(200))
+
+    print(f"{count} 条随机店名，检索词 {QUERIES}")
+    for text in QUERIES:
+        index_time, rows = timed(lambda: index_lookup(conn, text), repeat=20)
+        page_time, _ = timed(lambda: first_page(text), repeat=5)
+        scan_time, _ = timed(lambda: [name for name in names if matches_pinyin(name, text)][:200])
+        print(f"  {text:10s} 索引前缀查找 {index_time * 1000:7.3f} ms ({len(rows):3d} 条)  "
+              f"列表第一页 {page_time * 1000:7.1f} ms  逐条匹配 {scan_time * 1000:7.1f} ms")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
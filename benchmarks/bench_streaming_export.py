@@ -0,0 +1,93 @@
+"""流式导出内存基准测试
+
+使用 tracemalloc 测量导出地图集合时的内存峰值，并与一次性构建完整列表再 json.dump 的旧做法对比：
+    python benchmarks/bench_streaming_export.py [美食条数] [每条照片数] [照片KB]
+
+流式导出的峰值超过单张照片大小的固定倍数时以非零状态退出，可作为内存上界检查。
+"""
+import base64
+import json
+import os
+import sys
+import tracemalloc
+
+from common import create_temp_db, populate, timed
+
+from data.food_manager import FoodManager
+
+# 允许的峰值：若干张照片大小再加固定开销，与集合大小无关
+PEAK_PHOTO_FACTOR = 4
+PEAK_OVERHEAD = 2 * 1024 * 1024
+
+
+def legacy_export(food_manager, collection_id, file_path):
+    """旧做法：先把全部记录和照片的base64放进内存，再一次性写出"""
+    food_items = food_manager.get_food_items_by_collection(collection_id)
+    for item in food_items:
+        item["photos"] = [
+            {"id": photo_id, "data": base64.b64encode(food_manager.get_photo(photo_id)).decode("utf-8")}
+            for photo_id in item.pop("photo_ids", [])
+        ]
+
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump({"metadata": {"version": "2.0"}, "food_items": food_items}, f, ensure_ascii=False, indent=2)
+
+
+def measure_peak(func):
+    """执行函数并返回 (耗时秒数, 内存峰值字节数)"""
+    tracemalloc.start()
+    try:
+        elapsed, _ = timed(func)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def check_format(file_path):
+    """确认流式输出与 json.dump(..., indent=2) 的结果逐字节一致"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    return json.dumps(json.loads(text), ensure_ascii=False, indent=2) == text
+
+
+def main():
+    item_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    photos_per_item = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    photo_size = (int(sys.argv[3]) if len(sys.argv) > 3 else 256) * 1024
+
+    db_path = create_temp_db()
+    populate(db_path, item_count=item_count, photos_per_item=photos_per_item,
+             photo_size=photo_size, distinct_photos=True)
+
+    food_manager = FoodManager(db_path, use_pool=True, photo_backend="blob")
+    collection_id = food_manager.personal_collection_id
+    out_dir = os.path.dirname(db_path)
+
+    total_mb = item_count * photos_per_item * photo_size / 1024 / 1024
+    print(f"{item_count} 条美食记录，{item_count * photos_per_item} 张照片，共 {total_mb:.1f} MB")
+
+    stream_path = os.path.join(out_dir, "stream.json")
+    stream_time, stream_peak = measure_peak(
+        lambda: food_manager.export_collection(collection_id, stream_path))
+
+    legacy_path = os.path.join(out_dir, "legacy.json")
+    legacy_time, legacy_peak = measure_peak(
+        lambda: legacy_export(food_manager, collection_id, legacy_path))
+
+    print(f"流式导出:   {stream_time:.2f} s，内存峰值 {stream_peak / 1024 / 1024:.2f} MB")
+    print(f"一次性导出: {legacy_time:.2f} s，内存峰值 {legacy_peak / 1024 / 1024:.2f} MB")
+
+    format_ok = check_format(stream_path)
+    print(f"输出格式与 json.dump(indent=2) 一致: {format_ok}")
+
+    limit = PEAK_PHOTO_FACTOR * photo_size + PEAK_OVERHEAD
+    if not format_ok or stream_peak > limit:
+        print(f"失败: 流式导出内存峰值超过上界 {limit / 1024 / 1024:.2f} MB 或格式不一致")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
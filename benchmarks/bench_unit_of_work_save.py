@@ -0,0 +1,117 @@
+"""编辑保存基准测试
+
+模拟一次修改字段、删除10张照片并添加10张新照片的编辑，
+对比逐步调用 update_food_item / delete_photo / add_photo 与 save_food_item 单事务保存：
+    python benchmarks/bench_unit_of_work_save.py [照片数] [照片大小KB]
+
+提交次数通过连接的 trace 回调统计；段文件的 fsync 通过包装 os.fsync 统计。
+SQLite 自身的 fsync 次数取决于日志模式，回滚日志模式下每次提交都要落盘数次，
+WAL + synchronous=NORMAL 下提交不落盘，只在检查点时落盘。
+"""
+import os
+import sys
+
+from common import create_temp_db, populate, timed
+
+from data.food_manager import FoodManager
+from data.photo_store import get_photo_store
+
+
+class SaveCounter:
+    """统计一次保存中的提交次数和 os.fsync 调用次数"""
+
+    def __init__(self, food_manager):
+        self.commits = 0
+        self.fsyncs = 0
+        self._food_manager = food_manager
+        self._get_connection = food_manager.get_connection
+        self._fsync = os.fsync
+
+    def _trace(self, statement):
+        if statement.lstrip().upper().startswith("COMMIT"):
+            self.commits += 1
+
+    def __enter__(self):
+        def get_connection(readonly=False):
+            conn = self._get_connection(readonly)
+            conn.set_trace_callback(self._trace)
+            return conn
+
+        def fsync(fd):
+            self.fsyncs += 1
+            self._fsync(fd)
+
+        self._food_manager.get_connection = get_connection
+        os.fsync = fsync
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        del self._food_manager.get_connection
+        os.fsync = self._fsync
+
+
+def food_data(index):
+    return {
+        "name": f"修改后的店铺{index}",
+        "city": "北京",
+        "rating": 8,
+        "reason": "修改后的推荐理由",
+        "address": f"测试地址{index}号",
+        "latitude": 39.9,
+        "longitude": 116.4,
+        "food_type": "中餐",
+        "collection_id": None,
+        "photos": []
+    }
+
+
+def legacy_save(food_manager, food_id, photo_ids, new_photos):
+    """旧做法：每一步各自提交"""
+    food_manager.update_food_item(food_id, food_data(food_id))
+    for photo_id in photo_ids:
+        food_manager.delete_photo(photo_id)
+    for photo_data in new_photos:
+        food_manager.add_photo(food_id, photo_data)
+
+
+def unit_of_work_save(food_manager, food_id, photo_ids, new_photos):
+    """新做法：全部变更在一个事务中提交"""
+    return food_manager.save_food_item(food_id, food_data(food_id), delete_photo_ids=photo_ids, new_photos=new_photos)
+
+
+def bench(backend, use_pool, photo_count, photo_size):
+    """返回 [(名称, 耗时秒数, 提交次数, fsync次数), ...]"""
+    db_path = create_temp_db()
+    photo_store = get_photo_store(db_path, backend)
+    populate(db_path, item_count=2, photos_per_item=photo_count, photo_size=photo_size,
+             distinct_photos=True, photo_store=photo_store)
+    photo_store.sync()
+
+    food_manager = FoodManager(db_path, use_pool=use_pool, photo_backend=backend)
+    # 测试照片是随机数据，不生成缩略图，后台线程也不会干扰计时
+    food_manager.schedule_thumbnails = lambda food_id: None
+    results = []
+    for food_id, name, save in ((1, "逐步提交", legacy_save), (2, "单事务保存", unit_of_work_save)):
+        photo_ids = [photo_id for photo_id, _ in food_manager.get_photos(food_id)]
+        new_photos = [os.urandom(photo_size) for _ in range(photo_count)]
+        with SaveCounter(food_manager) as counter:
+            elapsed, _ = timed(lambda: save(food_manager, food_id, photo_ids, new_photos))
+        assert len(food_manager.get_photos(food_id)) == photo_count
+        results.append((name, elapsed, counter.commits, counter.fsyncs))
+    return results
+
+
+def main():
+    photo_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    photo_size = (int(sys.argv[2]) if len(sys.argv) > 2 else 200) * 1024
+
+    print(f"编辑一条记录：修改字段，删除 {photo_count} 张照片，添加 {photo_count} 张 {photo_size // 1024} KB 照片")
+    for backend in ("blob", "pack"):
+        for use_pool, mode in ((False, "回滚日志，每次新建连接"), (True, "WAL，连接池")):
+            print(f"\n照片后端 {backend}，{mode}")
+            for name, elapsed, commits, fsyncs in bench(backend, use_pool, photo_count, photo_size):
+                print(f"  {name}: {elapsed * 1000:8.1f} ms  提交 {commits:3d} 次  段文件 fsync {fsyncs:3d} 次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""基准测试公共工具：创建临时数据库并填充测试数据"""
+import os
+import sys
+import sqlite3
+import tempfile
+import datetime
+import time
+
+# 允许以 python benchmarks/xxx.py 方式直接运行
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from data.database import initialize_database
+from data.dedup import dedup_key
+from data.photo_store import BlobPhotoStore
+from data.pinyin import index_food_pinyin
+
+
+def create_temp_db():
+    """在临时目录中创建空数据库，返回数据库路径"""
+    temp_dir = tempfile.mkdtemp(prefix="ftm_bench_")
+    db_path = os.path.join(temp_dir, "food_map.db")
+    
+    initialize_database(db_path)
+    return db_path
+
+
+def populate(db_path, item_count=100, photos_per_item=2, photo_size=20 * 1024, collection_id=1,
+             distinct_photos=False, photo_store=None):
+    """批量写入测试美食记录和照片
+
+    照片按内容去重存储，distinct_photos=True 时每张照片内容都不同。
+    """
+    conn = sqlite3.connect(db_path)
+    now = datetime.datetime.now()
+    photo = os.urandom(photo_size)
+    photo_store = photo_store or BlobPhotoStore()
+    
+    for i in range(item_count):
+        cursor = conn.execute("""
+            INSERT INTO food_items
+            (collection_id, name, city, rating, reason, address, latitude, longitude, food_type, created_at, dedup_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            collection_id,
+            f"测试店铺{i}",
+            "北京" if i % 2 else "上海",
+            5 + i % 6,
+            "好吃",
+            f"测试地址{i}号",
+            39.9 + i * 0.001,
+            116.4 + i * 0.001,
+            "中餐",
+            (now - datetime.timedelta(seconds=i)).isoformat(),
+            dedup_key(f"测试店铺{i}", f"测试地址{i}号")
+        ))
+        food_id = cursor.lastrowid
+        index_food_pinyin(conn.cursor(), [(food_id, f"测试店铺{i}")])
+        for _ in range(photos_per_item):
+            photo_store.put(conn.cursor(), food_id, os.urandom(photo_size) if distinct_photos else photo)
+    
+    conn.commit()
+    conn.close()
+
+
+def timed(func, repeat=1):
+    """执行函数并返回 (平均耗时秒数, 最后一次返回值)"""
+    result = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
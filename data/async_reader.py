@@ -0,0 +1,49 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncReader:
+    """后台读取线程池
+
+    读操作在线程池中执行并返回 Future，界面线程提交后立即返回。
+    每个请求带有一个键（如 "collection"），同一个键的新请求会取代旧请求：
+    尚未开始的旧请求直接取消，已经在执行的旧请求无法中断，结果由 is_latest 判断后丢弃。
+    """
+
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="food-reader")
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, func, *args, **kwargs):
+        """在线程池中执行 func(*args, **kwargs)，返回 Future，并取消同一个键尚未开始的旧请求"""
+        with self._lock:
+            previous = self._latest.get(key)
+            future = self._executor.submit(func, *args, **kwargs)
+            self._latest[key] = future
+
+        if previous is not None:
+            previous.cancel()
+        return future
+
+    def is_latest(self, key, future):
+        """future 是否仍是该键最新的请求，过期请求的结果不应再使用"""
+        with self._lock:
+            return self._latest.get(key) is future
+
+
+# 按数据库路径共享读取线程池
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+def get_async_reader(db_path, max_workers=4):
+    """获取指定数据库的共享读取线程池"""
+    key = os.path.abspath(db_path)
+    with _readers_lock:
+        reader = _readers.get(key)
+        if reader is None:
+            reader = AsyncReader(max_workers)
+            _readers[key] = reader
+        return reader
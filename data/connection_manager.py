@@ -0,0 +1,213 @@
+import sqlite3
+import os
+import queue
+import threading
+
+
+class PooledConnection:
+    """连接池中的连接代理
+
+    调用 close() 时不会真正关闭底层连接，而是将其归还给连接池，
+    因此 FoodManager 中现有的 try/finally conn.close() 写法无需改动。
+    """
+
+    def __init__(self, conn, release):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_release", release)
+        object.__setattr__(self, "row_factory", None)
+        object.__setattr__(self, "_closed", False)
+
+    def cursor(self):
+        # 行工厂只作用于本次借出，避免影响连接的其他使用者
+        cursor = self._conn.cursor()
+        cursor.row_factory = self.row_factory
+        return cursor
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        """归还连接到连接池"""
+        if not self._closed:
+            object.__setattr__(self, "_closed", True)
+            self._release(self._conn)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name == "row_factory":
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+
+class ConnectionManager:
+    """SQLite连接管理器
+
+    维护一个长期存在的写连接和一个只读连接池：
+    - 数据库使用WAL日志模式，读写互不阻塞
+    - synchronous=NORMAL，WAL模式下仍能保证数据一致性，同时减少fsync
+    - busy_timeout 避免并发访问时立即报 "database is locked"
+    - 连接长期复用，sqlite3 内置的预编译语句缓存才能真正命中
+    """
+
+    def __init__(self, db_path, pool_size=4, busy_timeout=5000, cached_statements=256,
+                 synchronous="NORMAL"):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self.synchronous = synchronous
+
+        # 写连接：同一时间只允许一个使用者，同一线程可重入
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._writer_depth = 0
+
+        # 只读连接池
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
+
+        self._closed = False
+
+    def _configure(self, conn):
+        """为新建连接设置PRAGMA"""
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA temp_store = MEMORY")
+
+    def _open_writer(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout / 1000,
+            cached_statements=self.cached_statements,
+            check_same_thread=False
+        )
+        # WAL模式会持久化到数据库文件中，只需在写连接上设置
+        conn.execute("PRAGMA journal_mode = WAL")
+        self._configure(conn)
+        return conn
+
+    def _open_reader(self):
+        uri = "file:" + os.path.abspath(self.db_path).replace("\\", "/") + "?mode=ro"
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            timeout=self.busy_timeout / 1000,
+            cached_statements=self.cached_statements,
+            check_same_thread=False
+        )
+        self._configure(conn)
+        return conn
+
+    def get_writer(self):
+        """借出写连接"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("连接管理器已关闭")
+
+        self._writer_lock.acquire()
+        try:
+            if self._writer is None:
+                self._writer = self._open_writer()
+            self._writer_depth += 1
+        except Exception:
+            self._writer_lock.release()
+            raise
+        return PooledConnection(self._writer, self._release_writer)
+
+    def _release_writer(self, conn):
+        try:
+            self._writer_depth -= 1
+            if self._writer_depth == 0 and conn.in_transaction:
+                # 使用者未提交的事务一律回滚，保证下一个使用者拿到干净的连接
+                conn.rollback()
+        finally:
+            self._writer_lock.release()
+
+    def get_reader(self):
+        """借出只读连接，连接池为空且未达上限时新建连接"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("连接管理器已关闭")
+
+        # 写连接首次创建时才会把数据库切换为WAL模式，先确保这一步已完成
+        if self._writer is None:
+            self.get_writer().close()
+
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._reader_lock:
+                can_open = self._reader_count < self.pool_size
+                if can_open:
+                    self._reader_count += 1
+            if can_open:
+                try:
+                    conn = self._open_reader()
+                except Exception:
+                    with self._reader_lock:
+                        self._reader_count -= 1
+                    raise
+            else:
+                conn = self._readers.get()
+
+        return PooledConnection(conn, self._release_reader)
+
+    def _release_reader(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            conn.close()
+        else:
+            self._readers.put(conn)
+
+    def close(self):
+        """关闭所有连接"""
+        self._closed = True
+
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# 按数据库路径共享连接管理器，多个FoodManager实例使用同一个写连接
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_connection_manager(db_path, pool_size=4):
+    """获取指定数据库的共享连接管理器"""
+    key = os.path.abspath(db_path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None or manager._closed:
+            manager = ConnectionManager(db_path, pool_size=pool_size)
+            _managers[key] = manager
+        return manager
+
+
+def close_all_connection_managers():
+    """关闭所有共享的连接管理器，通常在应用退出时调用"""
+    with _managers_lock:
+        for manager in _managers.values():
+            manager.close()
+        _managers.clear()
@@ -2,157 +2,390 @@ import sqlite3
 import os
 import datetime
 
-def get_connection():
-    """获取数据库连接"""
+from data.dedup import dedup_key
+from data.photo_store import deduplicate_photos
+from data.pinyin import index_food_pinyin
+
+def get_db_path():
+    """获取默认数据库文件路径"""
     # 确保数据目录存在
     data_dir = os.path.dirname(os.path.abspath(__file__))
     os.makedirs(data_dir, exist_ok=True)
-    
-    # 数据库文件路径
-    db_path = os.path.join(data_dir, "food_map.db")
-    
+
+    return os.path.join(data_dir, "food_map.db")
+
+def get_connection(db_path=None):
+    """获取数据库连接"""
     # 创建连接
-    conn = sqlite3.connect(db_path)
-    
+    conn = sqlite3.connect(db_path or get_db_path())
+
     return conn
 
-def initialize_database():
+def _get_columns(cursor, table):
+    """获取表的列名列表"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [column[1] for column in cursor.fetchall()]
+
+def _table_exists(cursor, table):
+    """检查表是否存在"""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
+    return cursor.fetchone() is not None
+
+def _migration_base_schema(cursor):
+    """创建基础表结构并写入默认数据"""
+    # 创建食品集合表
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS map_collections (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        is_personal INTEGER DEFAULT 0
+    )
+    """)
+
+    # 创建默认的个人集合
+    cursor.execute("SELECT id FROM map_collections WHERE is_personal = 1 LIMIT 1")
+    if cursor.fetchone() is None:
+        cursor.execute("""
+        INSERT INTO map_collections (name, description, is_personal)
+        VALUES ('我的美食地图', '个人美食收藏', 1)
+        """)
+
+    # 创建食品记录表
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS food_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        city TEXT NOT NULL,
+        address TEXT,
+        latitude REAL,
+        longitude REAL,
+        rating REAL,
+        reason TEXT,
+        collection_id INTEGER,
+        food_type TEXT,
+        is_imported INTEGER DEFAULT 0,
+        created_at TEXT,
+        FOREIGN KEY (collection_id) REFERENCES map_collections(id)
+    )
+    """)
+
+    # 创建照片表
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS food_photos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        food_id INTEGER,
+        photo_data BLOB,
+        FOREIGN KEY (food_id) REFERENCES food_items(id)
+    )
+    """)
+
+    # 创建城市表
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS cities (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL
+    )
+    """)
+
+    # 初始添加一些常用城市
+    cities = ["北京", "上海", "广州", "深圳", "成都", "杭州"]
+    cursor.executemany("INSERT OR IGNORE INTO cities (name) VALUES (?)", [(city,) for city in cities])
+
+def _migration_food_item_columns(cursor):
+    """为旧版 food_items 表补齐 is_imported 和 created_at 列"""
+    column_names = _get_columns(cursor, "food_items")
+
+    # 直接添加列，无需复制整张表
+    if "is_imported" not in column_names:
+        cursor.execute("ALTER TABLE food_items ADD COLUMN is_imported INTEGER DEFAULT 0")
+
+    if "created_at" not in column_names:
+        cursor.execute("ALTER TABLE food_items ADD COLUMN created_at TEXT")
+
+    # 旧数据没有创建时间，使用迁移时间填充
+    cursor.execute("""
+    UPDATE food_items SET created_at = ?
+    WHERE created_at IS NULL
+    """, (datetime.datetime.now().isoformat(),))
+
+def _migration_merge_legacy_photos(cursor):
+    """将旧版 photos 表中的照片合并到 food_photos 表"""
+    if not _table_exists(cursor, "photos"):
+        return
+
+    cursor.execute("""
+    INSERT INTO food_photos (food_id, photo_data)
+    SELECT food_item_id, photo_data FROM photos
+    ORDER BY id
+    """)
+    cursor.execute("DROP TABLE photos")
+
+def _migration_indexes(cursor):
+    """为常用查询路径创建索引"""
+    # 按集合加载并按创建时间排序
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_food_items_collection_created ON food_items(collection_id, created_at)")
+    # 按城市、评分筛选
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_food_items_city ON food_items(city)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_food_items_rating ON food_items(rating)")
+    # 导入时按名称和地址查重
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_food_items_name_address ON food_items(name, address)")
+    # 按美食项查询照片ID（索引隐含rowid，查询照片ID无需回表）
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_food_photos_food_id ON food_photos(food_id)")
+
+    # 更新查询规划器的统计信息
+    cursor.execute("ANALYZE")
+
+def _migration_content_addressed_photos(cursor):
+    """照片改为按内容哈希去重存储，并由触发器维护引用计数"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS photo_blobs (
+        hash TEXT PRIMARY KEY,
+        data BLOB,
+        size INTEGER NOT NULL,
+        ref_count INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+    if "photo_hash" not in _get_columns(cursor, "food_photos"):
+        cursor.execute("ALTER TABLE food_photos ADD COLUMN photo_hash TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_food_photos_hash ON food_photos(photo_hash)")
+
+    # 一次性去重已有照片
+    photo_count, unique_count, saved_bytes = deduplicate_photos(cursor)
+    if photo_count:
+        print(f"照片去重完成: {photo_count} 张照片保存为 {unique_count} 份，节省 {saved_bytes / 1024 / 1024:.2f} MB ({saved_bytes} 字节)")
+
+    # 新增引用时计数加一；删除引用时计数减一，最后一条引用删除时同时删除照片数据
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_food_photos_ref_insert
+    AFTER INSERT ON food_photos
+    WHEN NEW.photo_hash IS NOT NULL
+    BEGIN
+        UPDATE photo_blobs SET ref_count = ref_count + 1 WHERE hash = NEW.photo_hash;
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_food_photos_ref_delete
+    AFTER DELETE ON food_photos
+    WHEN OLD.photo_hash IS NOT NULL
+    BEGIN
+        UPDATE photo_blobs SET ref_count = ref_count - 1 WHERE hash = OLD.photo_hash;
+        DELETE FROM photo_blobs WHERE hash = OLD.photo_hash AND ref_count <= 0;
+    END
+    """)
+
+    # 释放去重后空出的页面
+    return saved_bytes > 0
+
+def _migration_photo_pack_columns(cursor):
+    """为 photo_blobs 添加段文件位置列，支持照片保存在数据库外"""
+    column_names = _get_columns(cursor, "photo_blobs")
+
+    if "pack_segment" not in column_names:
+        cursor.execute("ALTER TABLE photo_blobs ADD COLUMN pack_segment INTEGER")
+    if "pack_offset" not in column_names:
+        cursor.execute("ALTER TABLE photo_blobs ADD COLUMN pack_offset INTEGER")
+
+    # 压缩段文件时按段查询仍被引用的照片
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_photo_blobs_pack_segment ON photo_blobs(pack_segment)")
+
+def _migration_photo_thumbnails(cursor):
+    """创建按照片内容哈希保存的多尺寸缩略图表"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS photo_thumbnails (
+        photo_hash TEXT NOT NULL,
+        variant TEXT NOT NULL,
+        data BLOB NOT NULL,
+        PRIMARY KEY (photo_hash, variant)
+    ) WITHOUT ROWID
+    """)
+
+    # 照片数据被删除时同时删除其缩略图
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_photo_blobs_thumbnails_delete
+    AFTER DELETE ON photo_blobs
+    BEGIN
+        DELETE FROM photo_thumbnails WHERE photo_hash = OLD.hash;
+    END
+    """)
+
+def _migration_dedup_key(cursor):
+    """为美食记录添加规范化的查重键，并对导入记录建立唯一索引"""
+    if "dedup_key" not in _get_columns(cursor, "food_items"):
+        cursor.execute("ALTER TABLE food_items ADD COLUMN dedup_key TEXT")
+
+    # 回填查重键；已有的重复导入记录只保留最早一条的键，其余置空
+    cursor.execute("SELECT id, name, address, is_imported FROM food_items ORDER BY id")
+    imported_keys = set()
+    updates = []
+    for food_id, name, address, is_imported in cursor.fetchall():
+        key = dedup_key(name, address)
+        if is_imported:
+            if key in imported_keys:
+                key = None
+            else:
+                imported_keys.add(key)
+        updates.append((key, food_id))
+    cursor.executemany("UPDATE food_items SET dedup_key = ? WHERE id = ?", updates)
+
+    # 导入的记录不允许重复，由存储层保证；个人记录不受限制
+    cursor.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_food_items_import_dedup
+    ON food_items(dedup_key) WHERE is_imported = 1
+    """)
+    # 查重改为在内存中比对查重键，不再需要按名称和地址逐条查询
+    cursor.execute("DROP INDEX IF EXISTS idx_food_items_name_address")
+
+def _migration_sort_indexes(cursor):
+    """为集合内按评分、名称排序和键集分页创建索引"""
+    # 按创建时间排序已有 idx_food_items_collection_created，索引隐含rowid，可作为同值时的次序
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_food_items_collection_rating ON food_items(collection_id, rating)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_food_items_collection_name ON food_items(collection_id, name)")
+    cursor.execute("ANALYZE")
+
+def _migration_full_text_search(cursor):
+    """为名称、地址、推荐理由和菜系创建全文索引，并由触发器与 food_items 保持同步"""
+    # trigram 分词按连续三个字符建立索引，中文不需要分词也能按子串检索
+    cursor.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS food_items_fts USING fts5(
+        name, address, reason, food_type,
+        content='food_items', content_rowid='id', tokenize='trigram'
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_food_items_fts_insert
+    AFTER INSERT ON food_items
+    BEGIN
+        INSERT INTO food_items_fts(rowid, name, address, reason, food_type)
+        VALUES (NEW.id, NEW.name, NEW.address, NEW.reason, NEW.food_type);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_food_items_fts_delete
+    AFTER DELETE ON food_items
+    BEGIN
+        INSERT INTO food_items_fts(food_items_fts, rowid, name, address, reason, food_type)
+        VALUES ('delete', OLD.id, OLD.name, OLD.address, OLD.reason, OLD.food_type);
+    END
+    """)
+    # 只有被索引的列变化时才更新索引
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_food_items_fts_update
+    AFTER UPDATE OF name, address, reason, food_type ON food_items
+    BEGIN
+        INSERT INTO food_items_fts(food_items_fts, rowid, name, address, reason, food_type)
+        VALUES ('delete', OLD.id, OLD.name, OLD.address, OLD.reason, OLD.food_type);
+        INSERT INTO food_items_fts(rowid, name, address, reason, food_type)
+        VALUES (NEW.id, NEW.name, NEW.address, NEW.reason, NEW.food_type);
+    END
+    """)
+
+    # 为已有记录建立索引
+    cursor.execute("INSERT INTO food_items_fts(food_items_fts) VALUES ('rebuild')")
+
+def _migration_pinyin_index(cursor):
+    """创建美食名称的全拼和首字母索引，按拼音前缀检索"""
+    # 每条记录从名称的每个音节开始各保存一行，前缀查找可以匹配名称中间的部分
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS food_items_pinyin (
+        food_id INTEGER NOT NULL,
+        full TEXT NOT NULL,
+        initials TEXT NOT NULL
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_food_items_pinyin_full ON food_items_pinyin(full)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_food_items_pinyin_initials ON food_items_pinyin(initials)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_food_items_pinyin_food_id ON food_items_pinyin(food_id)")
+
+    # 拼音由程序计算，插入和修改时由 FoodManager 维护；删除记录时由触发器同时删除
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_food_items_pinyin_delete
+    AFTER DELETE ON food_items
+    BEGIN
+        DELETE FROM food_items_pinyin WHERE food_id = OLD.id;
+    END
+    """)
+
+    # 为已有记录建立索引
+    cursor.execute("SELECT id, name FROM food_items")
+    index_food_pinyin(cursor, cursor.fetchall())
+
+# 数据库迁移步骤，按版本号顺序执行；每一步都必须可重复执行，
+# 返回真值表示迁移完成后需要执行 VACUUM 回收空间
+MIGRATIONS = [
+    (1, "创建基础表结构", _migration_base_schema),
+    (2, "补齐 food_items 旧版缺失的列", _migration_food_item_columns),
+    (3, "合并旧版照片表", _migration_merge_legacy_photos),
+    (4, "创建查询索引", _migration_indexes),
+    (5, "照片按内容去重存储", _migration_content_addressed_photos),
+    (6, "照片支持段文件存储", _migration_photo_pack_columns),
+    (7, "创建照片缩略图表", _migration_photo_thumbnails),
+    (8, "美食记录查重键", _migration_dedup_key),
+    (9, "创建排序索引", _migration_sort_indexes),
+    (10, "创建全文索引", _migration_full_text_search),
+    (11, "创建拼音索引", _migration_pinyin_index),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    """读取数据库当前的结构版本号"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """依次执行尚未应用的迁移步骤，返回执行的步骤数
+
+    每一步在独立事务中执行，并与 user_version 的更新一起提交，
+    中途失败时已完成的步骤不会丢失，未完成的步骤会完整回滚。
+    """
+    current_version = get_schema_version(conn)
+    applied = 0
+    need_vacuum = False
+
+    for version, description, step in MIGRATIONS:
+        if version <= current_version:
+            continue
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            need_vacuum = step(cursor) or need_vacuum
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+
+        print(f"数据库已升级到版本 {version}: {description}")
+        applied += 1
+
+    # VACUUM 不能在事务中执行
+    if need_vacuum:
+        conn.execute("VACUUM")
+
+    return applied
+
+def initialize_database(db_path=None):
     """初始化数据库"""
+    db_path = db_path or get_db_path()
     conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        # 检查表是否已存在
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='food_items'")
-        table_exists = cursor.fetchone() is not None
-        
-        if table_exists:
-            # 检查表结构，是否需要升级
-            cursor.execute("PRAGMA table_info(food_items)")
-            columns = cursor.fetchall()
-            column_names = [column[1] for column in columns]
-            
-            # 如果需要添加新列或修改表结构
-            need_migration = False
-            
-            # 检查是否需要添加 is_imported 列
-            if "is_imported" not in column_names:
-                need_migration = True
-            
-            # 检查是否需要迁移
-            if need_migration:
-                # 创建临时表
-                cursor.execute("""
-                CREATE TABLE IF NOT EXISTS food_items_temp (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    city TEXT NOT NULL,
-                    address TEXT,
-                    latitude REAL,
-                    longitude REAL,
-                    rating REAL,
-                    reason TEXT,
-                    collection_id INTEGER,
-                    food_type TEXT,
-                    is_imported INTEGER DEFAULT 0,
-                    FOREIGN KEY (collection_id) REFERENCES map_collections(id)
-                )
-                """)
-                
-                # 列出现有的表列名
-                existing_cols = ", ".join(column_names)
-                
-                # 在老数据中，添加默认的 is_imported 值
-                if "is_imported" not in column_names:
-                    # 使用指定的列名直接插入数据
-                    cursor.execute(f"""
-                    INSERT INTO food_items_temp 
-                    (id, name, city, address, latitude, longitude, rating, reason, collection_id, food_type, is_imported)
-                    SELECT id, name, city, address, latitude, longitude, rating, reason, collection_id, food_type, 0
-                    FROM food_items
-                    """)
-                
-                # 删除旧表并重命名新表
-                cursor.execute("DROP TABLE food_items")
-                cursor.execute("ALTER TABLE food_items_temp RENAME TO food_items")
-                
-                print("食品数据表已成功升级")
-            
-        else:
-            # 创建食品集合表
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS map_collections (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                description TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                is_personal INTEGER DEFAULT 0
-            )
-            """)
-            
-            # 创建默认的个人集合
-            cursor.execute("""
-            INSERT INTO map_collections (name, description, is_personal)
-            VALUES ('我的美食地图', '个人美食收藏', 1)
-            """)
-            
-            # 创建食品记录表
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS food_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                city TEXT NOT NULL,
-                address TEXT,
-                latitude REAL,
-                longitude REAL,
-                rating REAL,
-                reason TEXT,
-                collection_id INTEGER,
-                food_type TEXT,
-                is_imported INTEGER DEFAULT 0,
-                FOREIGN KEY (collection_id) REFERENCES map_collections(id)
-            )
-            """)
-            
-            print("食品数据表已成功创建")
-        
-        # 创建照片表
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS photos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            food_item_id INTEGER,
-            photo_data BLOB,
-            FOREIGN KEY (food_item_id) REFERENCES food_items(id)
-        )
-        """)
-        
-        # 创建城市表
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS cities (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL
-        )
-        """)
-        
-        # 初始添加一些常用城市
-        cities = ["北京", "上海", "广州", "深圳", "成都", "杭州"]
-        for city in cities:
-            try:
-                cursor.execute("INSERT INTO cities (name) VALUES (?)", (city,))
-            except:
-                pass  # 忽略已存在的城市
-        
-        conn.commit()
-        
+        # 使用自动提交模式，事务由迁移步骤显式控制
+        conn = sqlite3.connect(db_path, isolation_level=None)
+
+        # 结构已是最新版本时不做任何结构检查
+        if get_schema_version(conn) < SCHEMA_VERSION:
+            migrate(conn)
+
     except Exception as e:
         print(f"初始化数据库错误: {e}")
-        if conn:
-            conn.rollback()
         raise
-    
+
     finally:
         if conn:
             conn.close()
-    
-    return "data/food_map.db" 
\ No newline at end of file
+
+    return db_path
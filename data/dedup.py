@@ -0,0 +1,158 @@
+import re
+import unicodedata
+
+# 名称和地址之间的分隔符，不会出现在正常文本中
+_KEY_SEPARATOR = "\x1f"
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """规范化文本用于查重：全角转半角、统一大小写、去掉多余空白"""
+    if text is None:
+        return ""
+    text = unicodedata.normalize("NFKC", str(text)).casefold()
+    return _SPACES.sub(" ", text).strip()
+
+
+def dedup_key(name, address):
+    """根据名称和地址生成查重键，写入 food_items.dedup_key"""
+    return normalize_text(name) + _KEY_SEPARATOR + normalize_text(address)
+
+
+# 比较名称时去掉的字符：空白、标点和括号，"金谷园(北邮店)" 与 "金谷园北邮店" 视为相同
+_NAME_NOISE = re.compile(r"[\W_]+")
+_NUMBERS = re.compile(r"\d+")
+
+
+def normalize_name(name):
+    """规范化店铺名称用于模糊匹配"""
+    return _NAME_NOISE.sub("", normalize_text(name))
+
+
+def name_numbers(name):
+    """名称中的数字；"1号店" 与 "2号店" 只差一个字符，但不是同一家店，数字不同的名称不做模糊匹配"""
+    return tuple(_NUMBERS.findall(name))
+
+
+def fuzzy_distance_limit(name):
+    """规范化名称允许的最大编辑距离：太短的名称不做模糊匹配，越长允许的差异越多"""
+    if len(name) < 3:
+        return 0
+    return max(1, min(3, len(name) // 4))
+
+
+def edit_distance(a, b):
+    """两个字符串之间的编辑距离（插入、删除、替换各计 1）
+
+    使用 Myers 位并行算法：较短字符串的每个位置占一个二进制位，
+    较长字符串的每个字符只需几次整数位运算，比逐格填表快得多。
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+
+    positions = {}
+    for i, char in enumerate(b):
+        positions[char] = positions.get(char, 0) | (1 << i)
+
+    mask = (1 << len(b)) - 1
+    last = 1 << (len(b) - 1)
+    plus, minus = mask, 0
+    distance = len(b)
+    for char in a:
+        eq = positions.get(char, 0)
+        vertical = eq | minus
+        horizontal = (((eq & plus) + plus) ^ plus) | eq
+        h_plus = minus | ~(horizontal | plus)
+        h_minus = plus & horizontal
+        if h_plus & last:
+            distance += 1
+        elif h_minus & last:
+            distance -= 1
+        h_plus = (h_plus << 1) | 1
+        h_minus <<= 1
+        plus = (h_minus | ~(vertical | h_plus)) & mask
+        minus = h_plus & vertical
+    return distance
+
+
+def _bigrams(word):
+    """首尾补上边界符后的全部相邻二字组，共 len(word) + 1 个"""
+    padded = "\x02" + word + "\x03"
+    return [padded[i:i + 2] for i in range(len(padded) - 1)]
+
+
+class NameIndex:
+    """按相邻二字组建立倒排表，查找与给定字符串编辑距离不超过 k 的字符串
+
+    一次插入、删除或替换最多破坏查询串的 2 个二字组，所以距离不超过 k 的字符串
+    一定包含查询串任意 2k + 1 个二字组中的至少一个。查找时只取其中倒排表最短的
+    2k + 1 个作为候选，再逐个计算编辑距离，不必与所有字符串比较。
+    要求 2k + 1 不超过 len(word) + 1，fuzzy_distance_limit 的结果总是满足。
+
+    字符串按 group 分组，只与同组的字符串匹配，如按名称中的数字分组。
+    每组的倒排表在第一次查找该组时才建立，只查少数几组时不必为全部字符串建表。
+    """
+
+    def __init__(self):
+        # 分组 -> [[(字符串, 值列表), ...], {字符串: 下标}, {二字组: [下标, ...]}，未建立时为 None]
+        self._groups = {}
+        self.size = 0
+
+    def add(self, word, value, group=None):
+        """添加字符串及其关联的值，同组中相同的字符串共用一项"""
+        self.size += 1
+        entries = self._groups.get(group)
+        if entries is None:
+            entries = self._groups[group] = [[], {}, None]
+        words, ids, postings = entries
+
+        entry_id = ids.get(word)
+        if entry_id is not None:
+            words[entry_id][1].append(value)
+            return
+
+        entry_id = ids[word] = len(words)
+        words.append((word, [value]))
+        if postings is not None:
+            for gram in set(_bigrams(word)):
+                postings.setdefault(gram, []).append(entry_id)
+
+    def _matches(self, word, max_distance, group):
+        """逐个产生同组中距离不超过 max_distance 的 (距离, 字符串, 值列表)，顺序不定"""
+        entries = self._groups.get(group)
+        if entries is None:
+            return
+        words, _, postings = entries
+        if postings is None:
+            postings = entries[2] = {}
+            for entry_id, (other, _) in enumerate(words):
+                for gram in set(_bigrams(other)):
+                    postings.setdefault(gram, []).append(entry_id)
+
+        candidates = sorted((postings.get(gram, ()) for gram in _bigrams(word)), key=len)
+        checked = set()
+        for entry_ids in candidates[:2 * max_distance + 1]:
+            for entry_id in entry_ids:
+                if entry_id in checked:
+                    continue
+                checked.add(entry_id)
+                other, values = words[entry_id]
+                if abs(len(other) - len(word)) > max_distance:
+                    continue
+                distance = edit_distance(word, other)
+                if distance <= max_distance:
+                    yield distance, other, values
+
+    def search(self, word, max_distance, group=None):
+        """返回 [(距离, 字符串, 值列表), ...]，按距离从近到远排序"""
+        return sorted(self._matches(word, max_distance, group), key=lambda result: (result[0], result[1]))
+
+    def find_any(self, word, max_distance, predicate, group=None):
+        """返回第一个满足 predicate(值) 的相近字符串的值，找到即停止；没有时返回 None"""
+        for _, _, values in self._matches(word, max_distance, group):
+            for value in values:
+                if predicate(value):
+                    return value
+        return None
@@ -0,0 +1,82 @@
+import os
+import threading
+from collections import OrderedDict
+
+# 缓存中最多保存的美食记录条数（集合列表按条数计，单条记录计 1）
+CACHE_MAX_ITEMS = 50000
+
+
+class FoodCache:
+    """美食记录的读穿透缓存
+
+    按键缓存集合列表 ("collection", 集合ID)、全部记录 ("all",) 和单条记录 ("item", 美食ID)，
+    超过容量时淘汰最久未使用的条目。
+
+    每次失效都会增加版本号。读取前先记下版本号，从数据库读取期间如果有写操作使缓存失效，
+    版本号已经改变，读到的旧数据不会写入缓存。
+    """
+
+    def __init__(self, max_items=CACHE_MAX_ITEMS):
+        self.max_items = max_items
+        self.version = 0
+        self._entries = OrderedDict()  # 键 -> (版本号, 值, 大小)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """返回缓存的值，未命中时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value, version, size=1):
+        """写入缓存；version 为读取数据库前记下的版本号，期间缓存已失效时不写入"""
+        with self._lock:
+            if version != self.version or size > self.max_items:
+                return False
+
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[2]
+            self._entries[key] = (version, value, size)
+            self._size += size
+
+            # 按最近使用顺序淘汰
+            while self._size > self.max_items:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+            return True
+
+    def invalidate(self, food_ids=None):
+        """写操作提交后调用：使指定记录和所有列表失效；food_ids 为 None 时清空缓存"""
+        with self._lock:
+            self.version += 1
+            if food_ids is None:
+                self._entries.clear()
+                self._size = 0
+                return
+
+            item_keys = {("item", food_id) for food_id in food_ids}
+            for key in list(self._entries):
+                # 记录所在的集合可能改变，所有列表都需要重新读取
+                if key[0] != "item" or key in item_keys:
+                    self._size -= self._entries.pop(key)[2]
+
+
+# 按数据库路径共享缓存，同一数据库的所有 FoodManager 看到相同的数据
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_food_cache(db_path):
+    """获取指定数据库的共享缓存"""
+    key = os.path.abspath(db_path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = FoodCache()
+            _caches[key] = cache
+        return cache
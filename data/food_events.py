@@ -0,0 +1,63 @@
+import os
+import threading
+from collections import namedtuple
+
+# 变更类型
+ITEM_ADDED = "item_added"
+ITEM_UPDATED = "item_updated"
+ITEM_DELETED = "item_deleted"
+COLLECTION_CHANGED = "collection_changed"
+PHOTOS_CHANGED = "photos_changed"
+
+# 美食数据变更事件；COLLECTION_CHANGED 的 collection_id 为 None 时表示可能涉及任意集合
+ChangeEvent = namedtuple("ChangeEvent", ["kind", "food_id", "collection_id"])
+
+
+class ChangeNotifier:
+    """美食数据变更通知
+
+    写操作提交后发布变更事件，订阅者在发布事件的线程中被调用，
+    需要更新界面的订阅者应自行转发到界面线程。
+    """
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """订阅变更事件，callback(ChangeEvent)"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """取消订阅"""
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def publish(self, event):
+        """依次通知所有订阅者，单个订阅者出错不影响其他订阅者"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"处理数据变更事件失败: {e}")
+
+
+# 按数据库路径共享变更通知
+_notifiers = {}
+_notifiers_lock = threading.Lock()
+
+
+def get_change_notifier(db_path):
+    """获取指定数据库的共享变更通知"""
+    key = os.path.abspath(db_path)
+    with _notifiers_lock:
+        notifier = _notifiers.get(key)
+        if notifier is None:
+            notifier = ChangeNotifier()
+            _notifiers[key] = notifier
+        return notifier
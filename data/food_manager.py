@@ -4,35 +4,365 @@ import os
 import datetime
 import csv
 import base64
+import copy
 import html
+import threading
+from concurrent.futures import Future
+
+from data.async_reader import get_async_reader
+from data.connection_manager import get_connection_manager
+from data.dedup import NameIndex, dedup_key, fuzzy_distance_limit, name_numbers, normalize_name
+from data.food_cache import get_food_cache
+from data.food_events import (ITEM_ADDED, ITEM_UPDATED, ITEM_DELETED, COLLECTION_CHANGED,
+                              PHOTOS_CHANGED, ChangeEvent, get_change_notifier)
+from data.json_stream import JsonStreamReader, write_collection, write_item_array
+from data.marker_cluster import MarkerClusterIndex
+from data.photo_store import get_photo_store
+from data.pinyin import index_food_pinyin, is_pinyin_query, matches_pinyin, prefix_range
+from data.thumbnails import FAILED_VARIANT, THUMBNAIL_SIZES, get_thumbnail_builder
+from data.write_queue import WriteCancelled, get_write_queue
+
+# 导入时每批照片数据的上限，超过后立即写入，限制内存占用
+IMPORT_BATCH_BYTES = 32 * 1024 * 1024
+
+# 查询结果可用的排序字段；前三个字段都有 (collection_id, 字段) 索引，rowid 作为同值时的次序，
+# relevance 按全文检索的相关度排序，需要同时设置 text()
+FOOD_SORT_FIELDS = ("created_at", "rating", "name", "relevance")
+
+# 全文索引使用 trigram 分词，关键字至少三个字符才能使用索引，更短的关键字逐条匹配
+FTS_MIN_LENGTH = 3
+
+# 检索结果摘要中标记关键字的首尾字符，界面显示时转换为高亮
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+
+# 查询返回的列
+FOOD_ITEM_COLUMNS = """id, collection_id, name, city, rating, reason, address,
+                       latitude, longitude, food_type, created_at"""
+
+# 全文检索匹配的列，与全文索引 food_items_fts 的列一致
+FOOD_TEXT_COLUMNS = ("name", "address", "reason", "food_type")
+
+
+def fts_phrase(text):
+    """把关键字转换为 FTS5 短语，关键字中的运算符按普通字符匹配"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+class FoodQuery:
+    """可组合的美食记录查询
+    
+    筛选、排序和分页都转换为 SQL 在数据库中执行。每个方法返回新的查询对象，原对象不变：
+        query = FoodQuery().collection(1).city("北京").min_rating(8).order_by("rating").limit(100)
+        page = food_manager.query_food_items(query)
+        next_page = food_manager.query_food_items(query.after(page[-1]))
+    
+    分页使用键集（上一页最后一条记录的排序值和ID），翻页的代价与页码无关。
+    """
+    
+    def __init__(self):
+        self.filters = ()           # ((名称, 值), ...)，按添加顺序
+        self.sort_field = "created_at"
+        self.descending = True
+        self.after_key = None       # (排序值, 美食ID)
+        self.limit_count = None
+    
+    def _with(self, **changes):
+        query = copy.copy(self)
+        query.__dict__.update(changes)
+        return query
+    
+    def _filter(self, name, value):
+        filters = tuple(f for f in self.filters if f[0] != name)
+        if value is None:
+            return self._with(filters=filters)
+        return self._with(filters=filters + ((name, value),))
+    
+    def collection(self, collection_id):
+        """只查询指定集合"""
+        return self._filter("collection", collection_id)
+    
+    def city(self, city):
+        """只查询指定城市"""
+        return self._filter("city", city)
+    
+    def min_rating(self, rating):
+        """评分不低于 rating"""
+        return self._filter("min_rating", rating)
+    
+    def food_type(self, food_type):
+        """只查询指定菜系"""
+        return self._filter("food_type", food_type)
+    
+    def text(self, text):
+        """名称、地址、推荐理由或菜系中包含 text（不区分大小写），空字符串表示不筛选
+        
+        text 全是字母时，名称的全拼或首字母以 text 开头的记录也符合条件。
+        """
+        return self._filter("text", text or None)
+    
+    def bbox(self, min_lat, min_lng, max_lat, max_lng):
+        """坐标在指定的经纬度范围内"""
+        return self._filter("bbox", (min_lat, min_lng, max_lat, max_lng))
+    
+    def created_between(self, start=None, end=None):
+        """创建时间在 [start, end) 内，参数为 datetime 或 ISO 格式字符串，None 表示不限"""
+        if isinstance(start, datetime.datetime):
+            start = start.isoformat()
+        if isinstance(end, datetime.datetime):
+            end = end.isoformat()
+        return self._filter("created", (start, end) if start or end else None)
+    
+    def order_by(self, field, descending=True):
+        """按 FOOD_SORT_FIELDS 中的字段排序，同值时按ID排序"""
+        if field not in FOOD_SORT_FIELDS:
+            raise ValueError(f"不支持的排序字段: {field}")
+        return self._with(sort_field=field, descending=descending, after_key=None)
+    
+    def after(self, food_item):
+        """从 food_item 之后开始查询，food_item 通常是上一页的最后一条记录"""
+        return self._with(after_key=self.sort_key(food_item))
+    
+    def limit(self, count):
+        """最多返回 count 条记录"""
+        return self._with(limit_count=count)
+    
+    def ranked(self):
+        """是否按相关度排序
+        
+        关键字太短无法使用全文索引，或者全是字母、还要按拼音匹配时，改为按创建时间排序。
+        """
+        text = dict(self.filters).get("text")
+        return (self.sort_field == "relevance" and text is not None and len(text) >= FTS_MIN_LENGTH
+                and not is_pinyin_query(text.lower()))
+    
+    def effective_order(self):
+        """实际的 (排序列, 是否降序)"""
+        if self.sort_field != "relevance":
+            return self.sort_field, self.descending
+        if self.ranked():
+            # FTS5 的 rank 越小越相关
+            return "match_rank", False
+        return "created_at", True
+    
+    def columns(self):
+        """查询返回的列；按相关度排序时附加相关度和摘要"""
+        if self.ranked():
+            return FOOD_ITEM_COLUMNS + ", match_rank, snippet"
+        return FOOD_ITEM_COLUMNS
+    
+    def sort_key(self, food_item):
+        """记录在排序中的位置"""
+        return (food_item[self.effective_order()[0]], food_item["id"])
+    
+    def cache_key(self):
+        return (self.filters, self.sort_field, self.descending, self.after_key, self.limit_count)
+    
+    def filter_clause(self, paged=True):
+        """返回 (紧跟 FROM food_items 的子句, 参数)，包括全文检索的联接和 WHERE 条件
+        
+        paged=False 时不包含分页条件，用于统计总数。
+        """
+        join = ""
+        conditions = []
+        params = []
+        if self.ranked():
+            # 按相关度排序时联接全文检索结果，取得相关度和摘要
+            join = """JOIN (
+                SELECT rowid AS match_id, rank AS match_rank,
+                       snippet(food_items_fts, -1, ?, ?, '…', 12) AS snippet
+                FROM food_items_fts WHERE food_items_fts MATCH ?
+            ) AS matched ON matched.match_id = food_items.id"""
+            params.extend((SNIPPET_START, SNIPPET_END, fts_phrase(dict(self.filters)["text"])))
+        
+        for name, value in self.filters:
+            if name == "collection":
+                # 有检索关键字时不使用集合索引，由匹配的ID集合逐条定位，匹配较少时不必扫描整个集合
+                conditions.append("+collection_id = ?" if "text" in dict(self.filters) else "collection_id = ?")
+                params.append(value)
+            elif name == "city":
+                conditions.append("city = ?")
+                params.append(value)
+            elif name == "min_rating":
+                conditions.append("rating >= ?")
+                params.append(value)
+            elif name == "food_type":
+                conditions.append("food_type = ?")
+                params.append(value)
+            elif name == "text":
+                if self.ranked():
+                    continue
+                # 能用索引的来源合并为一个ID集合，只有太短的关键字需要逐条匹配
+                sources = []
+                if len(value) >= FTS_MIN_LENGTH:
+                    sources.append("SELECT rowid FROM food_items_fts WHERE food_items_fts MATCH ?")
+                    params.append(fts_phrase(value))
+                else:
+                    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                    sources.append("SELECT id FROM food_items WHERE " +
+                                   " OR ".join(f"{column} LIKE ? ESCAPE '\\'" for column in FOOD_TEXT_COLUMNS))
+                    params.extend([f"%{escaped}%"] * len(FOOD_TEXT_COLUMNS))
+                
+                if is_pinyin_query(value.lower()):
+                    # 全拼和首字母分别按前缀在索引上查找范围
+                    low, high = prefix_range(value.lower())
+                    sources.append("SELECT food_id FROM food_items_pinyin WHERE full >= ? AND full < ?")
+                    sources.append("SELECT food_id FROM food_items_pinyin WHERE initials >= ? AND initials < ?")
+                    params.extend((low, high, low, high))
+                conditions.append(f"id IN ({' UNION ALL '.join(sources)})")
+            elif name == "bbox":
+                conditions.append("latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?")
+                params.extend((value[0], value[2], value[1], value[3]))
+            elif name == "created":
+                if value[0]:
+                    conditions.append("created_at >= ?")
+                    params.append(value[0])
+                if value[1]:
+                    conditions.append("created_at < ?")
+                    params.append(value[1])
+        
+        if paged and self.after_key is not None:
+            # 行值比较可以直接使用 (字段, rowid) 索引定位
+            field, descending = self.effective_order()
+            conditions.append(f"({field}, id) {'<' if descending else '>'} (?, ?)")
+            params.extend(self.after_key)
+        
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        return f"{join} {where}".strip(), tuple(params)
+    
+    def order_clause(self):
+        """返回 ORDER BY 和 LIMIT 子句"""
+        field, descending = self.effective_order()
+        direction = "DESC" if descending else "ASC"
+        clause = f"ORDER BY {field} {direction}, id {direction}"
+        if self.limit_count is not None:
+            clause += f" LIMIT {int(self.limit_count)}"
+        return clause
+    
+    def matches(self, food_item):
+        """在内存中判断记录是否符合筛选条件（不含分页），与 SQL 的结果一致"""
+        for name, value in self.filters:
+            if name == "collection" and food_item.get("collection_id") != value:
+                return False
+            if name == "city" and food_item["city"] != value:
+                return False
+            if name == "min_rating" and food_item["rating"] < value:
+                return False
+            if name == "food_type" and food_item.get("food_type") != value:
+                return False
+            if name == "text" and not any(value.lower() in (food_item.get(column) or "").lower()
+                                          for column in FOOD_TEXT_COLUMNS):
+                if not (is_pinyin_query(value.lower()) and matches_pinyin(food_item["name"], value)):
+                    return False
+            if name == "bbox":
+                min_lat, min_lng, max_lat, max_lng = value
+                if not (min_lat <= food_item["latitude"] <= max_lat and min_lng <= food_item["longitude"] <= max_lng):
+                    return False
+            if name == "created":
+                created_at = food_item.get("created_at") or ""
+                if (value[0] and created_at < value[0]) or (value[1] and created_at >= value[1]):
+                    return False
+        return True
+
 
 class FoodManager:
-    def __init__(self, db_path="data/food_map.db"):
+    def __init__(self, db_path="data/food_map.db", use_pool=False, pool_size=4, photo_backend=None):
         self.db_path = db_path
         
+        # 可选的连接池：长期复用写连接和只读连接，并启用WAL模式
+        self.connection_manager = get_connection_manager(db_path, pool_size) if use_pool else None
+        
+        # 照片按内容哈希去重存储；后端为 blob（数据库内联）或 pack（段文件），默认读取配置
+        self.photo_store = get_photo_store(db_path, photo_backend)
+        
+        # 缩略图在后台线程中生成，界面直接读取预生成的缩略图
+        self.thumbnail_builder = get_thumbnail_builder(db_path, self.photo_store)
+        
+        # 界面的写操作提交到后台写线程，相隔很近的写操作合并提交
+        self.write_queue = get_write_queue(db_path, self.get_connection, self.photo_store)
+        
+        # 段文件存储在后台定期压缩，压缩通过写入队列独占执行
+        if self.photo_store.backend == "pack":
+            self.photo_store.start_background_compaction(self.compact_photos)
+        
+        # 美食记录的读穿透缓存，写操作提交后失效
+        self.cache = get_food_cache(db_path)
+        
+        # 写操作提交后发布变更事件，界面据此只更新变化的部分
+        self.notifier = get_change_notifier(db_path)
+        
+        # 界面的读操作在后台线程池中执行，快速切换时旧请求被取消
+        self.async_reader = get_async_reader(db_path, pool_size)
+        
         # 获取或创建默认的个人集合ID
         self.personal_collection_id = self.get_personal_collection_id()
     
-    def get_connection(self):
+    def get_connection(self, readonly=False):
+        """获取数据库连接
+        
+        启用连接池时返回池中的连接，调用 close() 即归还；
+        readonly=True 时借出只读连接，读操作不会阻塞写连接。
+        这里不等待后台写入队列，需要读到队列中修改的读操作通过 read_after_writes 执行。
+        """
+        if self.connection_manager:
+            if readonly:
+                return self.connection_manager.get_reader()
+            return self.connection_manager.get_writer()
+        
         conn = sqlite3.connect(self.db_path)
         # 启用外键约束
         conn.execute("PRAGMA foreign_keys = ON")
         return conn
     
+    def read_async(self, key, func, *args, **kwargs):
+        """在后台线程池中执行读方法 func(*args, **kwargs)，返回 Future
+        
+        同一个 key 的新请求会取代旧请求，用 async_reader.is_latest(key, future) 判断结果是否过期。
+        """
+        return self.async_reader.submit(key, func, *args, **kwargs)
+    
+    def read_after_writes(self, func, *args, **kwargs):
+        """已提交到写入队列的操作全部提交后，在后台线程中执行读操作 func(*args, **kwargs)，返回 Future
+        
+        用于导出等需要读到之前所有修改的操作，调用方不必等待写线程。
+        """
+        future = Future()
+        
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+        
+        # 屏障在写线程中完成，读操作另开线程执行，不占用写线程
+        self.write_queue.barrier().add_done_callback(
+            lambda _: threading.Thread(target=run, name="food-read-after-writes", daemon=True).start())
+        return future
+    
     def get_personal_collection_id(self):
-        """获取个人集合ID，如果不存在则创建"""
+        """获取个人集合ID，如果不存在则创建
+        
+        每次创建 FoodManager 都会调用，先用只读连接查询，只有首次运行时才借出写连接。
+        """
         conn = None
         try:
-            conn = self.get_connection()
+            conn = self.get_connection(readonly=True)
             cursor = conn.cursor()
             
             # 查询个人集合
             cursor.execute("SELECT id FROM map_collections WHERE is_personal = 1 LIMIT 1")
             result = cursor.fetchone()
+            conn.close()
+            conn = None
             
             if result:
                 return result[0]
             else:
+                conn = self.get_connection()
+                cursor = conn.cursor()
+                
                 # 创建个人集合
                 cursor.execute('''
                 INSERT INTO map_collections (name, description, is_personal, created_at)
@@ -63,8 +393,8 @@ class FoodManager:
             # 插入美食记录
             cursor.execute("""
                 INSERT INTO food_items 
-                (collection_id, name, city, rating, reason, address, latitude, longitude, food_type, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                (collection_id, name, city, rating, reason, address, latitude, longitude, food_type, created_at, dedup_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 collection_id,
                 food_data["name"],
@@ -75,19 +405,25 @@ class FoodManager:
                 food_data["latitude"],
                 food_data["longitude"],
                 food_data["food_type"],
-                datetime.datetime.now().isoformat()
+                datetime.datetime.now().isoformat(),
+                dedup_key(food_data["name"], food_data["address"])
             ))
             
             food_id = cursor.lastrowid
+            index_food_pinyin(cursor, [(food_id, food_data["name"])])
             
-            # 插入照片
+            # 插入照片，段文件在提交前统一落盘
             for photo_data in food_data["photos"]:
-                cursor.execute("""
-                    INSERT INTO food_photos (food_id, photo_data)
-                    VALUES (?, ?)
-                """, (food_id, photo_data))
+                self.photo_store.put(cursor, food_id, photo_data, sync=False)
+            self.photo_store.sync()
             
             conn.commit()
+            self._notify(ITEM_ADDED, food_id)
+            
+            # 为新照片生成缩略图
+            if food_data["photos"]:
+                self.schedule_thumbnails(food_id)
+            
             return food_id
         
         except Exception as e:
@@ -100,51 +436,103 @@ class FoodManager:
             if conn:
                 conn.close()
     
-    def get_all_food_items(self):
-        """获取所有美食记录"""
+    def _load_food_items(self, where_clause="", params=(), order_clause="ORDER BY created_at DESC",
+                         columns=FOOD_ITEM_COLUMNS):
+        """按条件加载美食记录，并批量附加照片ID列表
+        
+        照片ID通过一次集合查询取回后在内存中按 food_id 分组，
+        避免逐条记录查询 food_photos 的 N+1 问题。order_clause 可以带 LIMIT。
+        """
         conn = None
         try:
-            conn = self.get_connection()
+            conn = self.get_connection(readonly=True)
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
-            cursor.execute("""
-                SELECT id, name, city, rating, reason, address, 
-                       latitude, longitude, food_type, created_at
+            cursor.execute(f"""
+                SELECT {columns}
                 FROM food_items
-                ORDER BY created_at DESC
-            """)
+                {where_clause}
+                {order_clause}
+            """, params)
             
-            food_items = []
-            for row in cursor.fetchall():
-                item = dict(row)
-                
-                # 获取照片ID列表
-                cursor.execute("""
-                    SELECT id FROM food_photos
-                    WHERE food_id = ?
-                """, (item["id"],))
-                
-                photo_ids = [photo_id[0] for photo_id in cursor.fetchall()]
-                item["photo_ids"] = photo_ids
-                
-                food_items.append(item)
+            food_items = [dict(row) for row in cursor.fetchall()]
+            if not food_items:
+                return food_items
+            
+            # 一次取回这些记录的全部照片ID
+            cursor.execute(f"""
+                SELECT food_id, id FROM food_photos
+                WHERE food_id IN (SELECT id FROM food_items {where_clause} {order_clause})
+                ORDER BY food_id, id
+            """, params)
+            
+            photo_ids = {}
+            for food_id, photo_id in cursor.fetchall():
+                photo_ids.setdefault(food_id, []).append(photo_id)
+            
+            for item in food_items:
+                item["photo_ids"] = photo_ids.get(item["id"], [])
             
             return food_items
         
-        except Exception as e:
-            print(f"Error getting food items: {e}")
-            return []
-        
         finally:
             if conn:
                 conn.close()
     
-    def get_food_item(self, food_id):
-        """根据ID获取单个美食项"""
+    def _cached(self, key, load, size=len):
+        """读穿透缓存：命中时直接返回，未命中时调用 load() 从数据库读取并写入缓存"""
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+        
+        # 读取前记下版本号，读取期间有写操作时不写入缓存
+        version = self.cache.version
+        value = load()
+        if value is not None:
+            self.cache.put(key, value, version, size(value))
+        return value
+    
+    def _notify(self, kind, food_id=None, collection_id=None):
+        """写操作提交后使缓存失效，并发布变更事件"""
+        if kind == COLLECTION_CHANGED:
+            self.cache.invalidate()
+        else:
+            self.cache.invalidate([food_id])
+        self.notifier.publish(ChangeEvent(kind, food_id, collection_id))
+    
+    def _notify_when_written(self, future, kind, food_id=None, collection_id=None, thumbnails=False):
+        """后台写操作提交后发布变更，food_id 为空时使用写操作的结果
+        
+        操作失败或取消时修改已回滚，不发布变更。thumbnails=True 时为新照片生成缩略图。
+        """
+        if future.cancelled() or future.exception() is not None:
+            return
+        
+        if food_id is None and kind != COLLECTION_CHANGED:
+            food_id = future.result()
+        self._notify(kind, food_id, collection_id)
+        
+        if thumbnails:
+            self.schedule_thumbnails(food_id)
+    
+    def get_all_food_items(self):
+        """获取所有美食记录，优先读取缓存
+        
+        返回的列表可以修改，其中的记录字典与缓存共享，不要修改。
+        """
+        try:
+            return list(self._cached(("all",), self._load_food_items))
+        
+        except Exception as e:
+            print(f"Error getting food items: {e}")
+            return []
+    
+    def _load_food_item(self, food_id):
+        """从数据库读取单个美食项，不存在时返回 None"""
         conn = None
         try:
-            conn = self.get_connection()
+            conn = self.get_connection(readonly=True)
             conn.row_factory = sqlite3.Row  # 使查询结果可以通过列名访问
             cursor = conn.cursor()
             
@@ -164,30 +552,28 @@ class FoodManager:
             
             return None
         
-        except Exception as e:
-            print(f"Error getting food item: {e}")
-            return None
-        
         finally:
             if conn:
                 conn.close()
     
+    def get_food_item(self, food_id):
+        """根据ID获取单个美食项，优先读取缓存"""
+        try:
+            food_item = self._cached(("item", food_id), lambda: self._load_food_item(food_id), size=lambda item: 1)
+            return dict(food_item) if food_item else None
+        
+        except Exception as e:
+            print(f"Error getting food item: {e}")
+            return None
+    
     def get_photo(self, photo_id):
         """获取指定ID的照片数据"""
         conn = None
         try:
-            conn = self.get_connection()
+            conn = self.get_connection(readonly=True)
             cursor = conn.cursor()
             
-            cursor.execute("""
-                SELECT photo_data FROM food_photos
-                WHERE id = ?
-            """, (photo_id,))
-            
-            row = cursor.fetchone()
-            if row:
-                return row[0]
-            return None
+            return self.photo_store.get(cursor, photo_id)
         
         except Exception as e:
             print(f"Error getting photo {photo_id}: {e}")
@@ -204,13 +590,10 @@ class FoodManager:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            # 先删除与该美食点关联的所有照片
-            cursor.execute("DELETE FROM photos WHERE food_item_id = ?", (food_id,))
-            
-            # 然后删除美食点记录
-            cursor.execute("DELETE FROM food_items WHERE id = ?", (food_id,))
+            self._delete_food_item(cursor, food_id)
             
             conn.commit()
+            self._notify(ITEM_DELETED, food_id)
             return True
         
         except Exception as e:
@@ -223,6 +606,21 @@ class FoodManager:
             if conn:
                 conn.close()
     
+    def _delete_food_item(self, cursor, food_id):
+        """在调用方的事务中删除美食记录及其照片，返回 True"""
+        # 先删除与该美食点关联的所有照片
+        cursor.execute("DELETE FROM food_photos WHERE food_id = ?", (food_id,))
+        
+        # 然后删除美食点记录
+        cursor.execute("DELETE FROM food_items WHERE id = ?", (food_id,))
+        return True
+    
+    def enqueue_delete_food_item(self, food_id):
+        """在后台写线程中删除美食记录及其照片，返回 Future"""
+        future = self.write_queue.submit(self._delete_food_item, food_id)
+        future.add_done_callback(lambda f: self._notify_when_written(f, ITEM_DELETED, food_id))
+        return future
+    
     def update_food_item(self, food_id, food_data):
         """更新美食记录"""
         conn = None
@@ -235,7 +633,7 @@ class FoodManager:
                 UPDATE food_items 
                 SET name = ?, city = ?, rating = ?, reason = ?, 
                     address = ?, latitude = ?, longitude = ?, 
-                    food_type = ?, collection_id = ?
+                    food_type = ?, collection_id = ?, dedup_key = ?
                 WHERE id = ?
             """, (
                 food_data["name"],
@@ -247,10 +645,13 @@ class FoodManager:
                 food_data["longitude"],
                 food_data["food_type"],
                 food_data.get("collection_id", self.personal_collection_id),
+                dedup_key(food_data["name"], food_data["address"]),
                 food_id
             ))
+            index_food_pinyin(cursor, [(food_id, food_data["name"])])
             
             conn.commit()
+            self._notify(ITEM_UPDATED, food_id)
             return True
         
         except Exception as e:
@@ -263,126 +664,268 @@ class FoodManager:
             if conn:
                 conn.close()
     
-    def get_food_by_city(self, city):
-        """获取指定城市的所有美食记录"""
+    def _save_food_item(self, cursor, food_id, food_data, delete_photo_ids=(), new_photos=(),
+                        progress_callback=None, cancel_check=None):
+        """在调用方的事务中保存美食记录及其照片变更，返回美食ID；取消时抛出 WriteCancelled"""
+        if food_id is None:
+            # 插入美食记录
+            cursor.execute("""
+                INSERT INTO food_items 
+                (collection_id, name, city, rating, reason, address, latitude, longitude, food_type, created_at, dedup_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                self.personal_collection_id,
+                food_data["name"],
+                food_data["city"],
+                food_data["rating"],
+                food_data["reason"],
+                food_data["address"],
+                food_data["latitude"],
+                food_data["longitude"],
+                food_data["food_type"],
+                datetime.datetime.now().isoformat(),
+                dedup_key(food_data["name"], food_data["address"])
+            ))
+            
+            food_id = cursor.lastrowid
+        else:
+            # 更新美食记录
+            cursor.execute("""
+                UPDATE food_items 
+                SET name = ?, city = ?, rating = ?, reason = ?, 
+                    address = ?, latitude = ?, longitude = ?, 
+                    food_type = ?, collection_id = ?, dedup_key = ?
+                WHERE id = ?
+            """, (
+                food_data["name"],
+                food_data["city"],
+                food_data["rating"],
+                food_data["reason"],
+                food_data["address"],
+                food_data["latitude"],
+                food_data["longitude"],
+                food_data["food_type"],
+                food_data.get("collection_id") or self.personal_collection_id,
+                dedup_key(food_data["name"], food_data["address"]),
+                food_id
+            ))
+        
+        # 名称的拼音索引随记录一起保存
+        index_food_pinyin(cursor, [(food_id, food_data["name"])])
+        
+        # 删除照片，只删除属于该美食项的照片
+        cursor.executemany("DELETE FROM food_photos WHERE id = ? AND food_id = ?",
+                           [(photo_id, food_id) for photo_id in delete_photo_ids])
+        
+        # 添加照片，段文件由调用方在提交前统一落盘
+        added = 0
+        for photo_data in new_photos:
+            if cancel_check and cancel_check():
+                raise WriteCancelled()
+            
+            self.photo_store.put(cursor, food_id, photo_data, sync=False)
+            added += 1
+            if progress_callback:
+                progress_callback(added)
+        
+        if cancel_check and cancel_check():
+            raise WriteCancelled()
+        
+        return food_id
+    
+    def save_food_item(self, food_id, food_data, delete_photo_ids=(), new_photos=(),
+                       progress_callback=None, cancel_check=None):
+        """在一个事务中保存美食记录及其照片变更，返回美食ID；失败或取消时全部回滚并返回 None
+        
+        food_id 为 None 时新增记录（加入个人集合），否则更新字段。
+        delete_photo_ids 中的照片被删除，new_photos 中的照片数据被添加；
+        new_photos 可以是逐张生成照片的迭代器，写入一张再取下一张。
+        整个保存只提交一次，段文件中的新照片也只在提交前落盘一次。
+        
+        progress_callback(已添加照片数) 在每张照片写入后调用；cancel_check() 返回真值时放弃保存。
+        """
         conn = None
         try:
             conn = self.get_connection()
-            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
-            cursor.execute("""
-                SELECT id, name, city, rating, reason, address, 
-                       latitude, longitude, created_at
-                FROM food_items
-                WHERE city = ?
-                ORDER BY rating DESC
-            """, (city,))
+            conn.execute("BEGIN TRANSACTION")
             
-            food_items = []
-            for row in cursor.fetchall():
-                food_items.append(dict(row))
+            is_new = food_id is None
+            food_id = self._save_food_item(cursor, food_id, food_data, delete_photo_ids, new_photos,
+                                           progress_callback, cancel_check)
             
-            return food_items
+            self.photo_store.sync()
+            conn.commit()
+            self._notify(ITEM_ADDED if is_new else ITEM_UPDATED, food_id)
+            
+            # 为新照片生成缩略图
+            self.schedule_thumbnails(food_id)
+            
+            return food_id
+        
+        except WriteCancelled:
+            conn.rollback()
+            return None
         
         except Exception as e:
-            print(f"Error getting food items for city {city}: {e}")
-            return []
+            print(f"Error saving food item: {e}")
+            if conn:
+                conn.rollback()
+            return None
         
         finally:
             if conn:
                 conn.close()
     
-    def get_food_by_rating(self, min_rating):
-        """获取评分不低于指定值的所有美食记录"""
+    def enqueue_save_food_item(self, food_id, food_data, delete_photo_ids=(), new_photos=(),
+                               progress_callback=None, cancel_check=None):
+        """在后台写线程中保存美食记录，参数同 save_food_item
+        
+        返回 Future，结果为美食ID；取消时以 WriteCancelled 结束，失败时以对应异常结束。
+        new_photos、progress_callback 和 cancel_check 都在写线程的事务中调用，
+        new_photos 应只产生处理好的照片数据，图片的解码和编码在提交前完成，不要占用写线程。
+        """
+        future = self.write_queue.submit(self._save_food_item, food_id, food_data, delete_photo_ids,
+                                         new_photos, progress_callback, cancel_check)
+        kind = ITEM_ADDED if food_id is None else ITEM_UPDATED
+        future.add_done_callback(lambda f: self._notify_when_written(f, kind, food_id, thumbnails=True))
+        return future
+    
+    def query_food_items(self, query):
+        """执行 FoodQuery，返回符合条件的一页美食记录，优先读取缓存
+        
+        返回的列表可以修改，其中的记录字典与缓存共享，不要修改。
+        """
+        try:
+            filter_clause, params = query.filter_clause()
+            return list(self._cached(("query",) + query.cache_key(),
+                                     lambda: self._load_food_items(filter_clause, params, query.order_clause(),
+                                                                   query.columns())))
+        
+        except Exception as e:
+            print(f"Error querying food items: {e}")
+            return []
+    
+    def count_food_items(self, query):
+        """统计符合 FoodQuery 筛选条件的记录总数（不受分页影响）"""
+        filter_clause, params = query.filter_clause(paged=False)
         conn = None
         try:
-            conn = self.get_connection()
-            conn.row_factory = sqlite3.Row
+            conn = self.get_connection(readonly=True)
             cursor = conn.cursor()
             
-            cursor.execute("""
-                SELECT id, name, city, rating, reason, address, 
-                       latitude, longitude, created_at
-                FROM food_items
-                WHERE rating >= ?
-                ORDER BY rating DESC
-            """, (min_rating,))
-            
-            food_items = []
-            for row in cursor.fetchall():
-                food_items.append(dict(row))
-            
-            return food_items
+            cursor.execute(f"SELECT COUNT(*) FROM food_items {filter_clause}", params)
+            return cursor.fetchone()[0]
         
         except Exception as e:
-            print(f"Error getting food items with rating >= {min_rating}: {e}")
-            return []
+            print(f"Error counting food items: {e}")
+            return 0
         
         finally:
             if conn:
                 conn.close()
     
-    def export_data(self, file_path):
-        """导出美食数据到文件"""
+    def _load_name_index(self):
+        """读取所有美食名称，按规范化名称建立二字组索引，值为 (美食ID, 集合ID, 名称, 城市)"""
         conn = None
         try:
-            conn = self.get_connection()
-            conn.row_factory = sqlite3.Row
+            conn = self.get_connection(readonly=True)
             cursor = conn.cursor()
             
-            # 获取所有美食记录
-            cursor.execute("""
-                SELECT id, name, city, rating, reason, address, 
-                       latitude, longitude, food_type, created_at
-                FROM food_items
-                ORDER BY created_at DESC
-            """)
-            
-            food_items = []
-            for row in cursor.fetchall():
-                food_item = dict(row)
-                
-                # 获取照片数据
-                cursor.execute("""
-                    SELECT id, photo_data FROM food_photos
-                    WHERE food_id = ?
-                """, (food_item["id"],))
-                
-                photos = []
-                for photo_row in cursor.fetchall():
-                    # 将二进制照片数据转换为base64编码
-                    photo_data = photo_row[1]
-                    photo_base64 = base64.b64encode(photo_data).decode('utf-8')
-                    photos.append({
-                        "id": photo_row[0],
-                        "data": photo_base64
-                    })
-                
-                food_item["photos"] = photos
-                food_items.append(food_item)
+            cursor.execute("SELECT id, collection_id, name, city FROM food_items")
+            name_index = NameIndex()
+            for food_id, collection_id, name, city in cursor.fetchall():
+                word = normalize_name(name)
+                name_index.add(word, (food_id, collection_id, name, city), group=name_numbers(word))
+            return name_index
+        
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_name_index(self):
+        """美食名称的编辑距离索引，按名称中的数字分组，优先读取缓存；返回的索引与缓存共享，不要修改"""
+        return self._cached(("names",), self._load_name_index, size=lambda name_index: name_index.size)
+    
+    def get_cluster_index(self, query):
+        """query 所选记录的地图聚合索引，优先读取缓存；数据修改后随缓存一起失效"""
+        return self._cached(("clusters",) + query.cache_key(),
+                            lambda: MarkerClusterIndex(self.query_food_items(query)),
+                            size=lambda cluster_index: cluster_index.size)
+    
+    def suggest_food_names(self, text, collection_id=None, limit=5):
+        """"您是不是要找"：返回与 text 编辑距离相近的美食名称，按相近程度排序"""
+        word = normalize_name(text)
+        max_distance = fuzzy_distance_limit(word)
+        if not max_distance:
+            return []
+        
+        try:
+            names = []
+            for _, _, values in self.get_name_index().search(word, max_distance, group=name_numbers(word)):
+                for _, item_collection_id, name, _ in values:
+                    if collection_id is not None and item_collection_id != collection_id:
+                        continue
+                    if name not in names:
+                        names.append(name)
+            return names[:limit]
+        
+        except Exception as e:
+            print(f"Error suggesting food names: {e}")
+            return []
+    
+    def get_food_by_city(self, city):
+        """获取指定城市的所有美食记录"""
+        return self.query_food_items(FoodQuery().city(city).order_by("rating"))
+    
+    def get_food_by_rating(self, min_rating):
+        """获取评分不低于指定值的所有美食记录"""
+        return self.query_food_items(FoodQuery().min_rating(min_rating).order_by("rating"))
+    
+    def _iter_export_items(self, conn, where_clause="", params=()):
+        """逐条生成导出用的美食记录，返回 (字段字典, 照片迭代器) 的生成器
+        
+        记录从游标逐行读取，照片数据分块读取，导出过程中内存里最多只有一张照片的一个数据块。
+        """
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute(f"""
+            SELECT id, name, city, rating, reason, address, 
+                   latitude, longitude, food_type, created_at
+            FROM food_items
+            {where_clause}
+            ORDER BY created_at DESC
+        """, params)
+        
+        photo_cursor = conn.cursor()
+        for row in cursor:
+            locations = self.photo_store.get_locations_by_food(photo_cursor, row["id"])
+            photos = ((photo_id, self.photo_store.iter_chunks(conn, location))
+                      for photo_id, location in locations)
+            yield dict(row), photos
+    
+    def export_data(self, file_path):
+        """导出美食数据到文件；要包含写入队列中尚未提交的修改时通过 read_after_writes 调用"""
+        conn = None
+        try:
+            conn = self.get_connection(readonly=True)
             
             # 根据文件扩展名选择导出格式
-            if file_path.endswith(".json"):
-                with open(file_path, "w", encoding="utf-8") as f:
-                    json.dump(food_items, f, ensure_ascii=False, indent=2)
-            
-            elif file_path.endswith(".csv"):
+            if file_path.endswith(".csv"):
                 # CSV格式不适合导出照片数据，只导出基本信息
                 with open(file_path, "w", encoding="utf-8", newline="") as f:
-                    if food_items:
-                        # 获取字段名（排除照片字段）
-                        fieldnames = [key for key in food_items[0].keys() if key != 'photos']
-                        writer = csv.DictWriter(f, fieldnames=fieldnames)
-                        writer.writeheader()
-                        for item in food_items:
-                            row_data = {key: item[key] for key in fieldnames}
-                            writer.writerow(row_data)
+                    writer = None
+                    for item, _ in self._iter_export_items(conn):
+                        if writer is None:
+                            writer = csv.DictWriter(f, fieldnames=list(item.keys()))
+                            writer.writeheader()
+                        writer.writerow(item)
             
             else:
-                # 默认使用JSON格式
+                # 默认使用JSON格式，逐条写出
                 with open(file_path, "w", encoding="utf-8") as f:
-                    json.dump(food_items, f, ensure_ascii=False, indent=2)
+                    write_item_array(f, self._iter_export_items(conn), 0)
             
             return True
         
@@ -396,109 +939,241 @@ class FoodManager:
     
     def get_personal_food_items(self):
         """获取用户自己的美食数据（非导入的）"""
-        conn = None
         try:
-            conn = self.get_connection()
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT id, name, city, rating, reason, address, 
-                       latitude, longitude, food_type, created_at
-                FROM food_items
-                WHERE is_imported = 0
-                ORDER BY created_at DESC
-            """)
-            
-            food_items = []
-            for row in cursor.fetchall():
-                item = dict(row)
-                
-                # 获取照片ID列表
-                cursor.execute("""
-                    SELECT id FROM food_photos
-                    WHERE food_id = ?
-                """, (item["id"],))
-                
-                photo_ids = [photo_id[0] for photo_id in cursor.fetchall()]
-                item["photo_ids"] = photo_ids
-                
-                food_items.append(item)
-            
-            return food_items
+            return self._load_food_items("WHERE is_imported = 0")
         
         except Exception as e:
             print(f"Error getting personal food items: {e}")
             return []
-        
-        finally:
-            if conn:
-                conn.close()
     
     def get_imported_food_items(self):
         """获取导入的美食数据"""
-        conn = None
         try:
-            conn = self.get_connection()
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT id, name, city, rating, reason, address, 
-                       latitude, longitude, food_type, created_at
-                FROM food_items
-                WHERE is_imported = 1
-                ORDER BY created_at DESC
-            """)
-            
-            food_items = []
-            for row in cursor.fetchall():
-                item = dict(row)
-                
-                # 获取照片ID列表
-                cursor.execute("""
-                    SELECT id FROM food_photos
-                    WHERE food_id = ?
-                """, (item["id"],))
-                
-                photo_ids = [photo_id[0] for photo_id in cursor.fetchall()]
-                item["photo_ids"] = photo_ids
-                
-                food_items.append(item)
-            
-            return food_items
+            return self._load_food_items("WHERE is_imported = 1")
         
         except Exception as e:
             print(f"Error getting imported food items: {e}")
             return []
+    
+    def _insert_food_batch(self, cursor, batch):
+        """批量写入美食记录及其照片，batch 为 [(字段元组, [照片数据, ...]), ...]，返回实际写入的条数
+        
+        查重键冲突的记录由唯一索引和 INSERT OR IGNORE 在存储层跳过，其照片也不会写入。
+        """
+        # 在写事务中预先分配连续的ID，照片可以直接引用，无需逐条获取 lastrowid
+        cursor.execute("""
+            SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'food_items'), 0),
+                       COALESCE((SELECT MAX(id) FROM food_items), 0))
+        """)
+        first_id = cursor.fetchone()[0] + 1
+        last_id = first_id + len(batch) - 1
+        
+        rows = []
+        for offset, (row, _) in enumerate(batch):
+            rows.append((first_id + offset,) + row)
+        
+        cursor.executemany("""
+            INSERT OR IGNORE INTO food_items 
+            (id, collection_id, name, city, rating, reason, address, latitude, longitude, food_type, is_imported, created_at, dedup_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        
+        # 只为实际写入的记录保存照片
+        cursor.execute("SELECT id FROM food_items WHERE id BETWEEN ? AND ?", (first_id, last_id))
+        inserted_ids = {row[0] for row in cursor.fetchall()}
+        index_food_pinyin(cursor, [(row[0], row[2]) for row in rows if row[0] in inserted_ids])
+        
+        photos = []
+        for offset, (_, item_photos) in enumerate(batch):
+            food_id = first_id + offset
+            if food_id in inserted_ids:
+                photos.extend((food_id, photo_data) for photo_data in item_photos)
+        
+        self.photo_store.put_many(cursor, photos)
+        return len(inserted_ids)
+    
+    def _update_imported_batch(self, cursor, updates):
+        """用导入文件中的新内容批量更新已导入的记录，返回内容有变化的条数"""
+        cursor.executemany("""
+            UPDATE food_items 
+            SET city = ?, rating = ?, reason = ?, latitude = ?, longitude = ?, food_type = ?
+            WHERE id = ? AND (city IS NOT ? OR rating IS NOT ? OR reason IS NOT ?
+                              OR latitude IS NOT ? OR longitude IS NOT ? OR food_type IS NOT ?)
+        """, [values + (food_id,) + values for food_id, values in updates])
+        
+        return cursor.rowcount
+    
+    def _import_food_items(self, cursor, reader, collection_id, is_imported, deduplicate=False, name_index=None,
+                           batch_size=200, progress_callback=None, cancel_check=None):
+        """从增量解析器逐条读取美食记录并分批写入数据库
+        
+        返回 (统计, 元数据, 是否已取消)，统计包含 inserted、updated、skipped 三项条数，
+        以及 similar：名称相近、可能重复的 [(新记录名称, 相近的名称), ...]，事务由调用方提交或回滚。
+        
+        deduplicate=True 时先一次性读出已有记录的查重键，之后在内存中比对：
+        与个人记录或本文件中前面的记录重复的跳过，与已导入记录重复的用新内容更新。
+        
+        名称相近的判断按编辑距离查找同一城市、名称中数字相同的记录，找到一条即停止，
+        只与本文件中前面的记录比较，传入 name_index 时还与其中的已有记录比较；相近的记录仍然写入，只在结果中提示。
+        name_index 应在开始写事务前取得，建立索引时不占用写锁。
+        
+        progress_callback(已处理条数, 已读取字节数, 文件总字节数) 在每条记录后调用；
+        cancel_check() 返回真值时停止导入。
+        """
+        metadata = {}
+        stats = {"inserted": 0, "updated": 0, "skipped": 0, "similar": []}
+        batch = []
+        updates = []
+        batch_bytes = 0
+        
+        existing = {}
+        seen = set()
+        if deduplicate:
+            cursor.execute("SELECT dedup_key, id, is_imported FROM food_items WHERE dedup_key IS NOT NULL")
+            for key, food_id, imported in cursor.fetchall():
+                # 同一个键同时有个人记录和导入记录时，以个人记录为准
+                if key not in existing or not imported:
+                    existing[key] = (food_id, imported)
+        
+        # 名称索引：已有记录的来自缓存，不能修改；本文件中的记录单独建一个
+        name_indexes = [name_index] if name_index is not None else []
+        file_names = NameIndex()
+        name_indexes.append(file_names)
+        
+        def flush():
+            if batch:
+                inserted = self._insert_food_batch(cursor, batch)
+                stats["inserted"] += inserted
+                stats["skipped"] += len(batch) - inserted
+            if updates:
+                updated = self._update_imported_batch(cursor, updates)
+                stats["updated"] += updated
+                stats["skipped"] += len(updates) - updated
+        
+        for kind, item in reader.iter_food_items():
+            if cancel_check and cancel_check():
+                return stats, metadata, True
+            
+            if kind == "metadata":
+                metadata = item if isinstance(item, dict) else {}
+                continue
+            
+            # 确保item是字典
+            if not isinstance(item, dict):
+                print(f"跳过非字典项: {item}")
+                continue
+            
+            try:
+                name = item.get('name', '未知店铺')
+                address = item.get('address', '未知地址')
+                row = (
+                    collection_id,
+                    name,
+                    item.get('city', '未知城市'),
+                    float(item.get('rating', 5)),
+                    item.get('reason', ''),
+                    address,
+                    float(item.get('latitude', 0)),
+                    float(item.get('longitude', 0)),
+                    item.get('food_type', '其他'),
+                    is_imported,
+                    item.get('created_at', datetime.datetime.now().isoformat()),
+                    dedup_key(name, address)
+                )
+                if row[1] is None or row[2] is None:
+                    raise ValueError("缺少名称或城市")
+            except (TypeError, ValueError) as item_error:
+                print(f"导入食品项时出错: {item_error}")
+                continue
+            
+            if deduplicate:
+                key = row[-1]
+                if key in seen:
+                    stats["skipped"] += 1
+                    continue
+                seen.add(key)
+                
+                if key in existing:
+                    food_id, imported = existing[key]
+                    if imported:
+                        # city, rating, reason, latitude, longitude, food_type
+                        updates.append((food_id, (row[2], row[3], row[4], row[6], row[7], row[8])))
+                    else:
+                        stats["skipped"] += 1
+                    continue
+            
+            word = normalize_name(row[1])
+            similar_name = self._find_similar_name(name_indexes, word, row[2])
+            if similar_name is not None:
+                stats["similar"].append((row[1], similar_name))
+            file_names.add(word, (None, collection_id, row[1], row[2]), group=name_numbers(word))
+            
+            # 照片在解析时已从base64解码为字节
+            photos = []
+            for photo in item.get('photos') or []:
+                if isinstance(photo, dict) and 'data' in photo:
+                    if isinstance(photo['data'], bytes):
+                        photos.append(photo['data'])
+                    else:
+                        print("处理照片时出错: 照片数据不是有效的base64")
+            
+            batch.append((row, photos))
+            batch_bytes += sum(len(photo_data) for photo_data in photos)
+            
+            # 达到条数或照片总量上限时写入一批
+            if len(batch) + len(updates) >= batch_size or batch_bytes >= IMPORT_BATCH_BYTES:
+                flush()
+                batch = []
+                updates = []
+                batch_bytes = 0
+            
+            if progress_callback:
+                processed = stats["inserted"] + stats["updated"] + stats["skipped"] + len(batch) + len(updates)
+                progress_callback(processed, reader.bytes_read, reader.total_bytes)
+        
+        flush()
+        
+        if progress_callback:
+            processed = stats["inserted"] + stats["updated"] + stats["skipped"]
+            progress_callback(processed, reader.bytes_read, reader.total_bytes)
+        
+        return stats, metadata, False
+    
+    def _find_similar_name(self, name_indexes, word, city):
+        """在名称索引中查找与规范化名称 word 相近、数字相同的同城记录，返回其名称，没有时返回 None"""
+        max_distance = fuzzy_distance_limit(word)
+        if not max_distance:
+            return None
         
-        finally:
-            if conn:
-                conn.close()
+        group = name_numbers(word)
+        for name_index in name_indexes:
+            value = name_index.find_any(word, max_distance, lambda value: value[3] == city, group=group)
+            if value is not None:
+                return value[2]
+        return None
     
-    def import_data(self, file_path):
-        """从文件导入美食数据"""
+    def _similar_message(self, similar):
+        """导入结果中关于名称相近记录的提示"""
+        if not similar:
+            return ""
+        examples = "；".join(f"{name} / {other_name}" for name, other_name in similar[:3])
+        return f"\n其中 {len(similar)} 条与其他记录名称相近，可能重复，请检查（如 {examples}）"
+    
+    def import_data(self, file_path, batch_size=200, progress_callback=None, cancel_check=None):
+        """从文件导入美食数据
+        
+        文件按块增量解析，美食记录逐条读取后分批写入，整个导入在一个事务中完成。
+        """
         if not os.path.exists(file_path):
             return False, "文件不存在"
         
+        if not file_path.endswith('.json'):
+            return False, "不支持的文件格式，请使用.json文件"
+        
+        conn = None
         try:
-            # 读取导入文件
-            with open(file_path, 'r', encoding='utf-8') as f:
-                if file_path.endswith('.json'):
-                    try:
-                        food_data = json.load(f)
-                        
-                        # 检查是否是我们的格式
-                        if isinstance(food_data, dict) and 'food_items' in food_data:
-                            # 新格式，包含元数据
-                            food_items = food_data['food_items']
-                        else:
-                            # 老格式或直接的数组
-                            food_items = food_data if isinstance(food_data, list) else [food_data]
-                    except json.JSONDecodeError:
-                        return False, "JSON 格式错误，无法解析文件"
-                else:
-                    return False, "不支持的文件格式，请使用.json文件"
+            # 已有记录的名称索引在事务外读取
+            name_index = self.get_name_index()
             
             # 连接数据库
             conn = self.get_connection()
@@ -507,71 +1182,31 @@ class FoodManager:
             # 开始事务
             conn.execute("BEGIN TRANSACTION")
             
-            successful_imports = 0
+            with open(file_path, 'rb') as f:
+                reader = JsonStreamReader(f)
+                stats, _, cancelled = self._import_food_items(
+                    cursor, reader, None, 1, deduplicate=True, name_index=name_index, batch_size=batch_size,
+                    progress_callback=progress_callback, cancel_check=cancel_check)
             
-            for item in food_items:
-                try:
-                    # 确保item是字典
-                    if not isinstance(item, dict):
-                        print(f"跳过非字典项: {item}")
-                        continue
-                    
-                    # 检查是否已存在相同名称和地址的记录
-                    cursor.execute("""
-                        SELECT id FROM food_items 
-                        WHERE name = ? AND address = ?
-                    """, (item.get('name', ''), item.get('address', '')))
-                    
-                    existing_id = cursor.fetchone()
-                    
-                    if existing_id:
-                        # 跳过已存在的记录
-                        continue
-                    
-                    # 插入新记录，标记为导入的数据
-                    cursor.execute("""
-                        INSERT INTO food_items 
-                        (name, city, rating, reason, address, latitude, longitude, food_type, is_imported, created_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
-                    """, (
-                        item.get('name', '未知店铺'),
-                        item.get('city', '未知城市'),
-                        float(item.get('rating', 5)),
-                        item.get('reason', ''),
-                        item.get('address', '未知地址'),
-                        float(item.get('latitude', 0)),
-                        float(item.get('longitude', 0)),
-                        item.get('food_type', '其他'),
-                        item.get('created_at', datetime.datetime.now().isoformat())
-                    ))
-                    
-                    # 获取新插入记录的ID
-                    food_id = cursor.lastrowid
-                    
-                    # 处理照片
-                    if 'photos' in item and item['photos']:
-                        for photo in item['photos']:
-                            try:
-                                if isinstance(photo, dict) and 'data' in photo:
-                                    # 将base64编码的照片数据转换回二进制
-                                    photo_data = base64.b64decode(photo['data'])
-                                    
-                                    cursor.execute("""
-                                        INSERT INTO food_photos (food_id, photo_data)
-                                        VALUES (?, ?)
-                                    """, (food_id, photo_data))
-                            except Exception as photo_error:
-                                print(f"处理照片时出错: {photo_error}")
-                    
-                    successful_imports += 1
-                    
-                except Exception as item_error:
-                    print(f"导入食品项时出错: {item_error}")
+            if cancelled:
+                conn.rollback()
+                return False, "导入已取消"
             
             # 提交事务
             conn.commit()
+            self._notify(COLLECTION_CHANGED)
             
-            return True, f"成功导入 {successful_imports} 条美食记录"
+            # 在后台为导入的照片生成缩略图
+            self.thumbnail_builder.enqueue_missing()
+            
+            return True, (f"成功导入 {stats['inserted']} 条美食记录，"
+                          f"更新 {stats['updated']} 条，跳过重复 {stats['skipped']} 条"
+                          + self._similar_message(stats["similar"]))
+        
+        except ValueError as e:
+            if conn:
+                conn.rollback()
+            return False, f"JSON 格式错误，无法解析文件: {str(e)}"
         
         except Exception as e:
             if conn:
@@ -586,7 +1221,7 @@ class FoodManager:
         """获取所有地图集合"""
         conn = None
         try:
-            conn = self.get_connection()
+            conn = self.get_connection(readonly=True)
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
@@ -611,52 +1246,27 @@ class FoodManager:
                 conn.close()
     
     def get_food_items_by_collection(self, collection_id):
-        """获取指定集合的所有美食记录"""
-        conn = None
+        """获取指定集合的所有美食记录，优先读取缓存
+        
+        返回的列表可以修改，其中的记录字典与缓存共享，不要修改。
+        """
         try:
-            conn = self.get_connection()
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT id, name, city, rating, reason, address, 
-                       latitude, longitude, food_type, created_at
-                FROM food_items
-                WHERE collection_id = ?
-                ORDER BY created_at DESC
-            """, (collection_id,))
-            
-            food_items = []
-            for row in cursor.fetchall():
-                item = dict(row)
-                
-                # 获取照片ID列表
-                cursor.execute("""
-                    SELECT id FROM food_photos
-                    WHERE food_id = ?
-                """, (item["id"],))
-                
-                photo_ids = [photo_id[0] for photo_id in cursor.fetchall()]
-                item["photo_ids"] = photo_ids
-                
-                food_items.append(item)
-            
-            return food_items
+            return list(self._cached(("collection", collection_id),
+                                     lambda: self._load_food_items("WHERE collection_id = ?", (collection_id,))))
         
         except Exception as e:
             print(f"Error getting food items for collection {collection_id}: {e}")
             return []
-        
-        finally:
-            if conn:
-                conn.close()
     
     def export_collection(self, collection_id, file_path):
-        """导出地图集合到文件"""
+        """导出地图集合到文件
+        
+        先写元数据，再逐条写出美食记录，照片分块编码为base64，内存占用与集合大小无关。
+        要包含写入队列中尚未提交的修改时通过 read_after_writes 调用。
+        """
         conn = None
         try:
-            conn = self.get_connection()
-            conn.row_factory = sqlite3.Row
+            conn = self.get_connection(readonly=True)
             cursor = conn.cursor()
             
             # 获取集合信息
@@ -666,44 +1276,19 @@ class FoodManager:
                 WHERE id = ?
             """, (collection_id,))
             
-            collection = dict(cursor.fetchone())
-            
-            # 获取美食项
-            food_items = self.get_food_items_by_collection(collection_id)
-            
-            # 为每个食品项处理照片
-            for item in food_items:
-                # 获取照片数据
-                photo_ids = item.pop("photo_ids", [])
-                photos = []
-                
-                for photo_id in photo_ids:
-                    photo_data = self.get_photo(photo_id)
-                    if photo_data:
-                        # 将二进制照片数据转换为base64编码
-                        photo_base64 = base64.b64encode(photo_data).decode('utf-8')
-                        photos.append({
-                            "id": photo_id,
-                            "data": photo_base64
-                        })
-                
-                item["photos"] = photos
+            name, description, created_at = cursor.fetchone()
             
-            # 创建导出数据
-            export_data = {
-                "metadata": {
-                    "name": collection["name"],
-                    "description": collection["description"],
-                    "created_at": collection["created_at"],
-                    "export_time": datetime.datetime.now().isoformat(),
-                    "version": "2.0"
-                },
-                "food_items": food_items
+            metadata = {
+                "name": name,
+                "description": description,
+                "created_at": created_at,
+                "export_time": datetime.datetime.now().isoformat(),
+                "version": "2.0"
             }
             
             # 导出为JSON
             with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(export_data, f, ensure_ascii=False, indent=2)
+                write_collection(f, metadata, self._iter_export_items(conn, "WHERE collection_id = ?", (collection_id,)))
             
             return True
         
@@ -715,22 +1300,20 @@ class FoodManager:
             if conn:
                 conn.close()
     
-    def import_collection(self, file_path, name=None):
-        """从文件导入新的地图集合"""
+    def import_collection(self, file_path, name=None, batch_size=200, progress_callback=None, cancel_check=None):
+        """从文件导入新的地图集合
+        
+        文件按块增量解析，美食记录逐条读取后分批写入，整个导入在一个事务中完成。
+        progress_callback 和 cancel_check 的含义见 _import_food_items。
+        """
         if not os.path.exists(file_path):
             return False, "文件不存在"
         
+        if not file_path.endswith('.json'):
+            return False, "不支持的文件格式，请使用.json文件"
+        
+        conn = None
         try:
-            # 读取导入文件
-            with open(file_path, 'r', encoding='utf-8') as f:
-                if file_path.endswith('.json'):
-                    try:
-                        data = json.load(f)
-                    except json.JSONDecodeError:
-                        return False, "JSON 格式错误，无法解析文件"
-                else:
-                    return False, "不支持的文件格式，请使用.json文件"
-            
             # 连接数据库
             conn = self.get_connection()
             cursor = conn.cursor()
@@ -738,18 +1321,14 @@ class FoodManager:
             # 开始事务
             conn.execute("BEGIN TRANSACTION")
             
-            # 获取导入数据的元数据
-            metadata = data.get("metadata", {})
-            collection_name = name or metadata.get("name", os.path.basename(file_path))
-            collection_desc = metadata.get("description", "导入的美食地图")
-            
-            # 创建新的地图集合
+            # 创建新的地图集合；元数据读到后再更新名称和描述
+            collection_name = name or os.path.basename(file_path)
             cursor.execute("""
                 INSERT INTO map_collections (name, description, is_personal, created_at)
                 VALUES (?, ?, ?, ?)
             """, (
                 collection_name,
-                collection_desc,
+                "导入的美食地图",
                 0,  # 非个人集合
                 datetime.datetime.now().isoformat()
             ))
@@ -757,55 +1336,38 @@ class FoodManager:
             collection_id = cursor.lastrowid
             
             # 导入美食项
-            food_items = data.get("food_items", [])
-            successful_imports = 0
+            with open(file_path, 'rb') as f:
+                reader = JsonStreamReader(f)
+                stats, metadata, cancelled = self._import_food_items(
+                    cursor, reader, collection_id, 0, batch_size=batch_size,
+                    progress_callback=progress_callback, cancel_check=cancel_check)
             
-            for item in food_items:
-                try:
-                    # 插入美食记录
-                    cursor.execute("""
-                        INSERT INTO food_items 
-                        (collection_id, name, city, rating, reason, address, latitude, longitude, food_type, created_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        collection_id,
-                        item.get("name", "未知店铺"),
-                        item.get("city", "未知城市"),
-                        float(item.get("rating", 5)),
-                        item.get("reason", ""),
-                        item.get("address", "未知地址"),
-                        float(item.get("latitude", 0)),
-                        float(item.get("longitude", 0)),
-                        item.get("food_type", "其他"),
-                        item.get("created_at", datetime.datetime.now().isoformat())
-                    ))
-                    
-                    food_id = cursor.lastrowid
-                    
-                    # 处理照片
-                    if "photos" in item and item["photos"]:
-                        for photo in item["photos"]:
-                            try:
-                                if isinstance(photo, dict) and "data" in photo:
-                                    # 将base64编码的照片数据转换回二进制
-                                    photo_data = base64.b64decode(photo["data"])
-                                    
-                                    cursor.execute("""
-                                        INSERT INTO food_photos (food_id, photo_data)
-                                        VALUES (?, ?)
-                                    """, (food_id, photo_data))
-                            except Exception as photo_error:
-                                print(f"处理照片时出错: {photo_error}")
-                    
-                    successful_imports += 1
-                    
-                except Exception as item_error:
-                    print(f"导入食品项时出错: {item_error}")
+            if cancelled:
+                conn.rollback()
+                return False, "导入已取消"
+            
+            # 获取导入数据的元数据
+            if metadata:
+                collection_name = name or metadata.get("name", collection_name)
+                cursor.execute("""
+                    UPDATE map_collections SET name = ?, description = ?
+                    WHERE id = ?
+                """, (collection_name, metadata.get("description", "导入的美食地图"), collection_id))
             
             # 提交事务
             conn.commit()
+            self._notify(COLLECTION_CHANGED, collection_id=collection_id)
+            
+            # 在后台为导入的照片生成缩略图
+            self.thumbnail_builder.enqueue_missing()
             
-            return True, f"成功导入地图集合 '{collection_name}' 包含 {successful_imports} 条美食记录"
+            return True, (f"成功导入地图集合 '{collection_name}' 包含 {stats['inserted']} 条美食记录"
+                          + self._similar_message(stats["similar"]))
+        
+        except ValueError as e:
+            if conn:
+                conn.rollback()
+            return False, f"JSON 格式错误，无法解析文件: {str(e)}"
         
         except Exception as e:
             if conn:
@@ -823,9 +1385,9 @@ class FoodManager:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            # 删除地图集合（由于外键约束，关联的美食记录和照片会自动删除）
-            cursor.execute("DELETE FROM map_collections WHERE id = ?", (collection_id,))
+            self._delete_collection(cursor, collection_id)
             conn.commit()
+            self._notify(COLLECTION_CHANGED, collection_id=collection_id)
             
             return True
         
@@ -839,6 +1401,35 @@ class FoodManager:
             if conn:
                 conn.close()
     
+    def _delete_collection(self, cursor, collection_id):
+        """在调用方的事务中删除地图集合及其所有美食记录，返回 True"""
+        # 依次删除照片引用、美食记录和地图集合；照片数据在最后一条引用删除时才会删除
+        cursor.execute("""
+            DELETE FROM food_photos
+            WHERE food_id IN (SELECT id FROM food_items WHERE collection_id = ?)
+        """, (collection_id,))
+        cursor.execute("DELETE FROM food_items WHERE collection_id = ?", (collection_id,))
+        cursor.execute("DELETE FROM map_collections WHERE id = ?", (collection_id,))
+        return True
+    
+    def _create_collection(self, cursor, name, description, is_personal=True):
+        """在调用方的事务中创建地图集合，返回集合ID"""
+        cursor.execute("""
+            INSERT INTO map_collections (name, description, is_personal, created_at)
+            VALUES (?, ?, ?, ?)
+        """, (name, description, 1 if is_personal else 0, datetime.datetime.now().isoformat()))
+        return cursor.lastrowid
+    
+    def enqueue_create_collection(self, name, description):
+        """在后台写线程中创建个人地图集合，返回 Future，结果为集合ID"""
+        return self.write_queue.submit(self._create_collection, name, description)
+    
+    def enqueue_delete_collection(self, collection_id):
+        """在后台写线程中删除地图集合及其所有美食记录，返回 Future"""
+        future = self.write_queue.submit(self._delete_collection, collection_id)
+        future.add_done_callback(lambda f: self._notify_when_written(f, COLLECTION_CHANGED, collection_id=collection_id))
+        return future
+    
     def delete_photo(self, photo_id):
         """删除指定的照片"""
         conn = None
@@ -846,9 +1437,9 @@ class FoodManager:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            # 删除照片
-            cursor.execute("DELETE FROM photos WHERE id = ?", (photo_id,))
+            food_id = self._delete_photo(cursor, photo_id)
             conn.commit()
+            self._notify(PHOTOS_CHANGED, food_id)
             
             return True
         
@@ -862,9 +1453,146 @@ class FoodManager:
             if conn:
                 conn.close()
     
+    def _delete_photo(self, cursor, photo_id):
+        """在调用方的事务中删除照片，返回照片所属的美食ID"""
+        cursor.execute("SELECT food_id FROM food_photos WHERE id = ?", (photo_id,))
+        result = cursor.fetchone()
+        
+        cursor.execute("DELETE FROM food_photos WHERE id = ?", (photo_id,))
+        return result[0] if result else None
+    
+    def enqueue_delete_photo(self, photo_id):
+        """在后台写线程中删除照片，返回 Future，结果为照片所属的美食ID"""
+        future = self.write_queue.submit(self._delete_photo, photo_id)
+        future.add_done_callback(lambda f: self._notify_when_written(f, PHOTOS_CHANGED))
+        return future
+    
+    def compact_photos(self):
+        """压缩照片段文件，返回回收的字节数
+        
+        压缩提交到写入队列独占执行，并持有写连接，期间没有其他写事务，
+        段文件中未被已提交记录引用的字节一定是无效数据。在写线程之外调用，等待压缩完成。
+        """
+        return self.write_queue.submit_exclusive(self._compact_photos).result()
+    
+    def _compact_photos(self):
+        conn = None
+        try:
+            conn = self.get_connection()
+            return self.photo_store.compact(conn)
+        
+        finally:
+            if conn:
+                conn.close()
+    
     def get_photos(self, food_id):
-        """获取指定美食项的照片（作为get_photo的别名）"""
-        return self.get_photo(food_id)
+        """获取指定美食项的所有照片，返回 [(照片ID, 照片数据), ...]"""
+        conn = None
+        try:
+            conn = self.get_connection(readonly=True)
+            cursor = conn.cursor()
+            
+            return self.photo_store.get_by_food(cursor, food_id)
+        
+        except Exception as e:
+            print(f"Error getting photos for food item {food_id}: {e}")
+            return []
+        
+        finally:
+            if conn:
+                conn.close()
+    
+    def schedule_thumbnails(self, food_id):
+        """将美食项中缺少缩略图的照片加入后台生成队列，已标记无法解码的照片除外"""
+        conn = None
+        try:
+            conn = self.get_connection(readonly=True)
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT DISTINCT p.photo_hash FROM food_photos p
+                WHERE p.food_id = ? AND p.photo_hash IS NOT NULL
+                AND (SELECT COUNT(*) FROM photo_thumbnails t WHERE t.photo_hash = p.photo_hash) < ?
+                AND NOT EXISTS (SELECT 1 FROM photo_thumbnails t
+                                WHERE t.photo_hash = p.photo_hash AND t.variant = ?)
+            """, (food_id, len(THUMBNAIL_SIZES), FAILED_VARIANT))
+            
+            digests = [row[0] for row in cursor.fetchall()]
+            if digests:
+                self.thumbnail_builder.enqueue(digests)
+        
+        except Exception as e:
+            print(f"Error scheduling thumbnails for food item {food_id}: {e}")
+        
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_thumbnails(self, food_id, variant="detail"):
+        """获取美食项所有照片的缩略图，返回 [(照片ID, 图片数据), ...]
+        
+        缩略图尚未生成的照片返回原图，并加入后台生成队列。
+        """
+        conn = None
+        try:
+            conn = self.get_connection(readonly=True)
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT p.id, p.photo_hash, t.data FROM food_photos p
+                LEFT JOIN photo_thumbnails t ON t.photo_hash = p.photo_hash AND t.variant = ?
+                WHERE p.food_id = ?
+                ORDER BY p.id
+            """, (variant, food_id))
+            
+            photos = []
+            missing = []
+            for photo_id, digest, thumbnail in cursor.fetchall():
+                if thumbnail is None:
+                    thumbnail = self.photo_store.get(cursor, photo_id)
+                    missing.append(digest)
+                if thumbnail is not None:
+                    photos.append((photo_id, thumbnail))
+            
+            if missing:
+                self.thumbnail_builder.enqueue(missing)
+            
+            return photos
+        
+        except Exception as e:
+            print(f"Error getting thumbnails for food item {food_id}: {e}")
+            return []
+        
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_photo_thumbnail(self, photo_id, variant="blog"):
+        """获取指定照片的缩略图，尚未生成时返回原图"""
+        conn = None
+        try:
+            conn = self.get_connection(readonly=True)
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT t.data FROM food_photos p
+                JOIN photo_thumbnails t ON t.photo_hash = p.photo_hash AND t.variant = ?
+                WHERE p.id = ?
+            """, (variant, photo_id))
+            
+            result = cursor.fetchone()
+            if result:
+                return result[0]
+            
+            return self.photo_store.get(cursor, photo_id)
+        
+        except Exception as e:
+            print(f"Error getting thumbnail for photo {photo_id}: {e}")
+            return None
+        
+        finally:
+            if conn:
+                conn.close()
     
     def add_photo(self, food_id, photo_data):
         """为指定的美食项添加照片"""
@@ -874,13 +1602,15 @@ class FoodManager:
             cursor = conn.cursor()
             
             # 插入照片数据
-            cursor.execute("""
-                INSERT INTO photos (food_item_id, photo_data)
-                VALUES (?, ?)
-            """, (food_id, photo_data))
+            photo_id = self.photo_store.put(cursor, food_id, photo_data)
             
             conn.commit()
-            return cursor.lastrowid
+            self._notify(PHOTOS_CHANGED, food_id)
+            
+            # 为新照片生成缩略图
+            self.schedule_thumbnails(food_id)
+            
+            return photo_id
         
         except Exception as e:
             print(f"Error adding photo: {e}")
@@ -892,11 +1622,17 @@ class FoodManager:
             if conn:
                 conn.close()
     
+    def enqueue_add_photo(self, food_id, photo_data):
+        """在后台写线程中为美食项添加照片，返回 Future，结果为照片ID"""
+        future = self.write_queue.submit(self.photo_store.put, food_id, photo_data, sync=False)
+        future.add_done_callback(lambda f: self._notify_when_written(f, PHOTOS_CHANGED, food_id, thumbnails=True))
+        return future
+    
     def export_blog(self, collection_id, file_path):
-        """导出地图集合到博客HTML文件"""
+        """导出地图集合到博客HTML文件；要包含写入队列中尚未提交的修改时通过 read_after_writes 调用"""
         conn = None
         try:
-            conn = self.get_connection()
+            conn = self.get_connection(readonly=True)
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
@@ -909,8 +1645,8 @@ class FoodManager:
             
             collection = dict(cursor.fetchone())
             
-            # 获取美食项
-            food_items = self.get_food_items_by_collection(collection_id)
+            # 获取美食项；读到的记录与缓存共享，复制后再加入照片，不修改缓存中的记录
+            food_items = [dict(item) for item in self.get_food_items_by_collection(collection_id)]
             
             # 为每个食品项处理照片
             for item in food_items:
@@ -919,7 +1655,8 @@ class FoodManager:
                 photos = []
                 
                 for photo_id in photo_ids:
-                    photo_data = self.get_photo(photo_id)
+                    # 博客中使用预生成的博客尺寸图片，减小HTML文件体积
+                    photo_data = self.get_photo_thumbnail(photo_id, "blog")
                     if photo_data:
                         # 将二进制照片数据转换为base64编码
                         photo_base64 = base64.b64encode(photo_data).decode('utf-8')
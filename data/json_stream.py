@@ -0,0 +1,359 @@
+import base64
+import binascii
+import codecs
+import io
+import json
+import os
+import re
+
+# 导出文件缩进，与原先 json.dump(..., indent=2) 的输出保持一致
+INDENT = "  "
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _write_indented(f, text, level):
+    """将多行JSON文本按层级缩进后写入（首行不缩进）"""
+    f.write(text.replace("\n", "\n" + INDENT * level))
+
+
+def write_base64(f, chunks):
+    """将二进制数据块逐块编码为base64字符串写入文件
+
+    chunks 中除最后一块外，每块长度都必须是3的倍数，保证分块编码结果与整体编码一致。
+    """
+    f.write('"')
+    remainder = b""
+    for chunk in chunks:
+        if remainder:
+            chunk = remainder + bytes(chunk)
+        cut = len(chunk) - len(chunk) % 3
+        if cut:
+            f.write(base64.b64encode(chunk[:cut]).decode("ascii"))
+        remainder = bytes(chunk[cut:])
+    if remainder:
+        f.write(base64.b64encode(remainder).decode("ascii"))
+    f.write('"')
+
+
+def write_food_item(f, item, photos, level):
+    """流式写出一条美食记录
+
+    item 为不含照片的字段字典，photos 为 [(照片ID, 数据块迭代器), ...] 的可迭代对象，
+    每张照片在写出后即被释放。
+    """
+    pad = INDENT * level
+    f.write("{")
+    for key, value in item.items():
+        f.write(f"\n{pad}{INDENT}{_dumps(key)}: ")
+        _write_indented(f, json.dumps(value, ensure_ascii=False, indent=2), level + 1)
+        f.write(",")
+
+    f.write(f'\n{pad}{INDENT}"photos": [')
+    first = True
+    for photo_id, chunks in photos:
+        f.write("\n" if first else ",\n")
+        first = False
+        f.write(f"{pad}{INDENT * 2}{{\n")
+        f.write(f'{pad}{INDENT * 3}"id": {_dumps(photo_id)},\n')
+        f.write(f'{pad}{INDENT * 3}"data": ')
+        write_base64(f, chunks)
+        f.write(f"\n{pad}{INDENT * 2}}}")
+    if not first:
+        f.write(f"\n{pad}{INDENT}")
+    f.write("]")
+
+    f.write(f"\n{pad}}}")
+
+
+def write_item_array(f, items, level):
+    """流式写出美食记录数组，items 为 (字段字典, 照片迭代器) 的可迭代对象，返回写出的条数"""
+    pad = INDENT * level
+    count = 0
+    f.write("[")
+    for item, photos in items:
+        f.write("\n" if count == 0 else ",\n")
+        f.write(pad + INDENT)
+        write_food_item(f, item, photos, level + 1)
+        count += 1
+    if count:
+        f.write(f"\n{pad}")
+    f.write("]")
+    return count
+
+
+def write_collection(f, metadata, items):
+    """流式写出 v2.0 格式的地图集合：先写元数据，再逐条写美食记录，返回写出的条数"""
+    f.write("{\n")
+    f.write(f'{INDENT}"metadata": ')
+    _write_indented(f, json.dumps(metadata, ensure_ascii=False, indent=2), 1)
+    f.write(f',\n{INDENT}"food_items": ')
+    count = write_item_array(f, items, 1)
+    f.write("\n}")
+    return count
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?")
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class JsonStreamReader:
+    """增量JSON解析器
+
+    从二进制文件中按块读取并解析，导入文件中的美食记录逐条生成，
+    照片的base64字符串边读取边解码，不需要把整个文件或整段base64文本读入内存。
+    """
+
+    def __init__(self, f, chunk_size=64 * 1024):
+        self._file = f
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+
+        # 文件总大小，用于计算导入进度；无法获取时为 None
+        try:
+            self.total_bytes = os.fstat(f.fileno()).st_size
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            self.total_bytes = None
+
+    def _fill(self):
+        """读取下一块数据，文件结束时返回 False"""
+        if self._eof:
+            return False
+
+        data = self._file.read(self.chunk_size)
+        self.bytes_read += len(data)
+        if not data:
+            self._eof = True
+        text = self._decoder.decode(data, final=self._eof)
+
+        # 丢弃已解析的部分
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return bool(text) or not self._eof
+
+    def _ensure(self, count):
+        """确保缓冲区中至少还有 count 个未解析字符（文件结束时可能不足）"""
+        while len(self._buffer) - self._pos < count and self._fill():
+            pass
+
+    def _peek(self):
+        """跳过空白并返回下一个字符，文件结束时返回空字符串"""
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f"位置 {self.bytes_read} 附近应为 '{char}'")
+        self._pos += 1
+
+    def _iter_string(self):
+        """逐段生成字符串内容（已处理转义），调用前需已读过开头的引号"""
+        while True:
+            if self._pos >= len(self._buffer) and not self._fill():
+                raise ValueError("字符串未结束")
+
+            quote = self._buffer.find('"', self._pos)
+            backslash = self._buffer.find("\\", self._pos, quote if quote != -1 else len(self._buffer))
+
+            if backslash != -1:
+                if backslash > self._pos:
+                    yield self._buffer[self._pos:backslash]
+                self._pos = backslash
+                yield self._read_escape()
+            elif quote != -1:
+                if quote > self._pos:
+                    yield self._buffer[self._pos:quote]
+                self._pos = quote + 1
+                return
+            else:
+                yield self._buffer[self._pos:]
+                self._pos = len(self._buffer)
+
+    def _read_escape(self):
+        """解析一个转义序列，返回对应的字符"""
+        self._ensure(12)
+        char = self._buffer[self._pos + 1:self._pos + 2]
+        if char in _ESCAPES:
+            self._pos += 2
+            return _ESCAPES[char]
+        if char != "u":
+            raise ValueError("无效的转义字符")
+
+        # \uXXXX，代理对需要连同下一个转义一起解码
+        length = 6
+        if 0xD800 <= int(self._buffer[self._pos + 2:self._pos + 6], 16) < 0xDC00:
+            length = 12
+        text = self._buffer[self._pos:self._pos + length]
+        self._pos += length
+        return json.loads(f'"{text}"')
+
+    def _read_string(self):
+        self._expect('"')
+        return "".join(self._iter_string())
+
+    def _read_scalar(self):
+        """解析数字、true、false 或 null"""
+        self._ensure(64)
+        for literal, value in (("true", True), ("false", False), ("null", None)):
+            if self._buffer.startswith(literal, self._pos):
+                self._pos += len(literal)
+                return value
+
+        match = _NUMBER.match(self._buffer, self._pos)
+        # 数字恰好在缓冲区末尾时可能还没读完
+        while match and match.end() == len(self._buffer) and self._fill():
+            match = _NUMBER.match(self._buffer, self._pos)
+        if not match:
+            raise ValueError(f"位置 {self.bytes_read} 附近有无法识别的值")
+
+        self._pos = match.end()
+        return json.loads(match.group())
+
+    def iter_object(self):
+        """逐个生成对象的键；每次取得键后调用方必须读取对应的值"""
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+
+        while True:
+            key = self._read_string()
+            self._expect(":")
+            yield key
+
+            char = self._peek()
+            self._pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError("对象中缺少 ',' 或 '}'")
+
+    def iter_array(self):
+        """逐个生成数组元素的序号；每次取得序号后调用方必须读取对应的值"""
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+
+        index = 0
+        while True:
+            yield index
+            index += 1
+
+            char = self._peek()
+            self._pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError("数组中缺少 ',' 或 ']'")
+
+    def read_value(self):
+        """解析任意JSON值"""
+        char = self._peek()
+        if char == "{":
+            return {key: self.read_value() for key in self.iter_object()}
+        if char == "[":
+            return [self.read_value() for _ in self.iter_array()]
+        if char == '"':
+            return self._read_string()
+        return self._read_scalar()
+
+    def read_base64(self):
+        """边读取边解码base64字符串，返回解码后的字节；内容无效时返回 None"""
+        self._expect('"')
+        data = bytearray()
+        pending = ""
+        valid = True
+
+        for piece in self._iter_string():
+            if not valid:
+                continue
+            # 兼容带换行的base64文本
+            pending += "".join(piece.split())
+            cut = len(pending) - len(pending) % 4
+            try:
+                data += base64.b64decode(pending[:cut], validate=True)
+            except (binascii.Error, ValueError):
+                valid = False
+            pending = pending[cut:]
+
+        if valid and pending:
+            try:
+                data += base64.b64decode(pending + "=" * (-len(pending) % 4), validate=True)
+            except (binascii.Error, ValueError):
+                valid = False
+
+        return bytes(data) if valid else None
+
+    def read_photos(self):
+        """解析照片数组，照片的 data 字段直接解码为字节"""
+        if self._peek() != "[":
+            return self.read_value()
+
+        photos = []
+        for _ in self.iter_array():
+            if self._peek() != "{":
+                photos.append(self.read_value())
+                continue
+
+            photo = {}
+            for key in self.iter_object():
+                if key == "data" and self._peek() == '"':
+                    photo[key] = self.read_base64()
+                else:
+                    photo[key] = self.read_value()
+            photos.append(photo)
+        return photos
+
+    def read_food_item(self):
+        """解析一条美食记录，照片数据解码为字节"""
+        if self._peek() != "{":
+            return self.read_value()
+
+        item = {}
+        for key in self.iter_object():
+            item[key] = self.read_photos() if key == "photos" else self.read_value()
+        return item
+
+    def iter_food_items(self):
+        """逐条生成导入文件中的内容，返回 ("metadata", 元数据) 或 ("item", 美食记录)
+
+        支持 v2.0 格式 {"metadata": ..., "food_items": [...]}、美食记录数组以及单条美食记录。
+        """
+        char = self._peek()
+        if char == "[":
+            for _ in self.iter_array():
+                yield "item", self.read_food_item()
+            return
+
+        if char != "{":
+            raise ValueError("顶层应为对象或数组")
+
+        fields = {}
+        has_items = False
+        for key in self.iter_object():
+            if key == "food_items" and self._peek() == "[":
+                has_items = True
+                for _ in self.iter_array():
+                    yield "item", self.read_food_item()
+            elif key == "metadata":
+                yield "metadata", self.read_value()
+            elif key == "photos":
+                fields[key] = self.read_photos()
+            else:
+                fields[key] = self.read_value()
+
+        # 不含 food_items 的对象视为单条美食记录
+        if not has_items:
+            yield "item", fields
@@ -0,0 +1,135 @@
+import math
+
+# 地图瓦片边长（像素），缩放级别 z 时整个世界宽 TILE_SIZE * 2**z 像素
+TILE_SIZE = 256
+
+# 聚合网格的边长（像素）：同一格内的点合并为一个聚合点，每放大一级每格分为 2x2
+CLUSTER_CELL_SIZE = 64
+
+# 聚合的缩放级别范围；超过 MAX_CLUSTER_ZOOM 时不再聚合，逐个显示
+MIN_CLUSTER_ZOOM = 3
+MAX_CLUSTER_ZOOM = 16
+
+_CELL_SHIFT = int(math.log2(TILE_SIZE // CLUSTER_CELL_SIZE))
+
+
+def project(lat, lng):
+    """经纬度转换为 Web 墨卡托平面坐标，x、y 均在 [0, 1] 内"""
+    x = (lng + 180.0) / 360.0
+    sin = math.sin(math.radians(max(-85.0, min(85.0, lat))))
+    y = 0.5 - 0.25 * math.log((1 + sin) / (1 - sin)) / math.pi
+    return min(max(x, 0.0), 1.0), min(max(y, 0.0), 1.0)
+
+
+def _grid_size(zoom):
+    """缩放级别 zoom 时每个方向的网格数"""
+    return 1 << (zoom + _CELL_SHIFT)
+
+
+class MarkerClusterIndex:
+    """按缩放级别预先聚合的美食点索引
+
+    每个缩放级别把墨卡托平面划分为 CLUSTER_CELL_SIZE 像素的网格，格内的点合并为一个聚合点。
+    上一级的网格恰好由下一级的 2x2 个网格组成，所以从最细的级别开始逐级合并，
+    建索引的代价为 O(记录数 x 级别数)；查询时按视野算出网格范围，只查找范围内的网格，
+    耗时取决于视野大小，与记录总数无关。
+    """
+
+    def __init__(self, food_items):
+        self.size = 0
+        # 最细级别每格中的点 {(格x, 格y): [(x, y, 记录), ...]}，超过 MAX_CLUSTER_ZOOM 时按坐标筛选
+        self.cell_points = {}
+        # 缩放级别 -> {(格x, 格y): [数量, 纬度之和, 经度之和, 单个记录或 None, 展开级别]}
+        self.levels = {}
+
+        cells = {}
+        grid = _grid_size(MAX_CLUSTER_ZOOM)
+        for item in food_items:
+            lat, lng = item.get('latitude'), item.get('longitude')
+            if lat is None or lng is None:
+                continue
+            x, y = project(lat, lng)
+            self.size += 1
+            key = (min(int(x * grid), grid - 1), min(int(y * grid), grid - 1))
+            self.cell_points.setdefault(key, []).append((x, y, item))
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = [1, lat, lng, item, MAX_CLUSTER_ZOOM + 1]
+            else:
+                cell[0] += 1
+                cell[1] += lat
+                cell[2] += lng
+                cell[3] = None
+        self.levels[MAX_CLUSTER_ZOOM] = cells
+
+        for zoom in range(MAX_CLUSTER_ZOOM - 1, MIN_CLUSTER_ZOOM - 1, -1):
+            parents = {}
+            for (cx, cy), child in self.levels[zoom + 1].items():
+                key = (cx >> 1, cy >> 1)
+                parent = parents.get(key)
+                if parent is None:
+                    # 只有一个子格时，点击后要一直放大到子格分开的级别
+                    parents[key] = [child[0], child[1], child[2], child[3], child[4]]
+                else:
+                    parent[0] += child[0]
+                    parent[1] += child[1]
+                    parent[2] += child[2]
+                    parent[3] = None
+                    parent[4] = zoom + 1
+            self.levels[zoom] = parents
+
+    def clusters(self, zoom, bounds):
+        """返回视野内的 (单个美食点列表, 聚合点列表)
+
+        bounds 为 (最小纬度, 最小经度, 最大纬度, 最大经度)。聚合点为
+        {"key", "count", "lat", "lng", "zoom"}，lat/lng 为格内各点的平均位置，
+        zoom 为点击后需要放大到的级别。
+        """
+        min_lat, min_lng, max_lat, max_lng = bounds
+        x0, y1 = project(min_lat, min_lng)
+        x1, y0 = project(max_lat, max_lng)
+        if int(zoom) > MAX_CLUSTER_ZOOM:
+            points = []
+            for _, cell in self._cells_in_range(self.cell_points, MAX_CLUSTER_ZOOM, x0, y0, x1, y1):
+                points.extend(item for x, y, item in cell if x0 <= x <= x1 and y0 <= y <= y1)
+            return points, []
+
+        zoom = max(MIN_CLUSTER_ZOOM, int(zoom))
+        points = []
+        clusters = []
+        for (cx, cy), (count, sum_lat, sum_lng, item, expansion_zoom) in self._cells_in_range(
+                self.levels[zoom], zoom, x0, y0, x1, y1):
+            if item is not None:
+                points.append(item)
+            else:
+                clusters.append({
+                    "key": f"{zoom}/{cx}/{cy}",
+                    "count": count,
+                    "lat": sum_lat / count,
+                    "lng": sum_lng / count,
+                    "zoom": expansion_zoom,
+                })
+        return points, clusters
+
+    def _cells_in_range(self, cells, zoom, x0, y0, x1, y1):
+        """逐个产生墨卡托坐标范围内有点的网格 ((格x, 格y), 网格)
+
+        按范围逐格查找；范围内的网格数多于有点的网格数时（如视野远大于数据范围），改为遍历有点的网格。
+        """
+        grid = _grid_size(zoom)
+        x0, x1 = max(0, int(x0 * grid)), min(grid - 1, int(x1 * grid))
+        y0, y1 = max(0, int(y0 * grid)), min(grid - 1, int(y1 * grid))
+        if x0 > x1 or y0 > y1:
+            return
+
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(cells):
+            for key, cell in cells.items():
+                if x0 <= key[0] <= x1 and y0 <= key[1] <= y1:
+                    yield key, cell
+            return
+
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is not None:
+                    yield (cx, cy), cell
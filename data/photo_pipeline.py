@@ -0,0 +1,102 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+# 保存到数据库的照片最大尺寸
+MAX_PHOTO_SIZE = (800, 800)
+
+
+def prepare_photo(path, max_size=MAX_PHOTO_SIZE):
+    """读取照片文件，缩放到最大尺寸以内并重新编码为JPEG，返回JPEG字节
+
+    在子进程中执行；JPEG 通过 draft() 在解码阶段直接按 1/2、1/4、1/8 缩小，
+    手机拍摄的大图不必完整解码。
+    """
+    from PIL import Image
+
+    with Image.open(path) as img:
+        # 按最终尺寸请求缩小解码，draft 保证解码结果不小于请求的尺寸
+        scale = min(max_size[0] / img.width, max_size[1] / img.height, 1)
+        img.draft("RGB", (max(1, int(img.width * scale) + 1), max(1, int(img.height * scale) + 1)))
+
+        img = img.convert('RGB')
+        img.thumbnail(max_size, Image.LANCZOS)
+
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG")
+        return buffer.getvalue()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_photo_pool():
+    """获取共享的照片处理进程池，首次使用时创建"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = max(1, (os.cpu_count() or 2) - 1)
+            # 界面进程中已有Qt线程，使用 spawn 启动子进程更安全
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(shutdown_photo_pool)
+        return _pool
+
+
+def shutdown_photo_pool():
+    """关闭照片处理进程池"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def iter_prepared_photos(paths, max_in_flight=None):
+    """在进程池中并行处理照片，按原顺序逐张返回 (路径, JPEG字节, 错误)
+
+    同时处理中的照片数量有上限，调用方取走一张才提交下一张，
+    内存中不会同时保存全部处理结果。提前结束迭代时取消尚未开始的任务。
+    """
+    pool = get_photo_pool()
+    max_in_flight = max_in_flight or pool._max_workers * 2
+
+    remaining = iter(paths)
+    pending = deque()
+
+    def submit_next():
+        for path in remaining:
+            try:
+                future = pool.submit(prepare_photo, path)
+            except BrokenProcessPool:
+                future = None
+            pending.append((path, future))
+            return
+
+    try:
+        for _ in range(max_in_flight):
+            submit_next()
+
+        while pending:
+            path, future = pending.popleft()
+            submit_next()
+
+            try:
+                try:
+                    photo_data = future.result() if future else prepare_photo(path)
+                except BrokenProcessPool:
+                    # 进程池不可用时退回当前线程处理
+                    photo_data = prepare_photo(path)
+            except Exception as e:
+                yield path, None, e
+            else:
+                yield path, photo_data, None
+    finally:
+        for _, future in pending:
+            if future:
+                future.cancel()
@@ -0,0 +1,604 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# 照片存储后端：blob 为数据库内联存储，pack 为数据库外的追加写段文件
+PHOTO_BACKENDS = ("blob", "pack")
+DEFAULT_PHOTO_BACKEND = "blob"
+
+# 照片存储配置单独保存，不与 config.json 中的API密钥互相覆盖
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "photo_store.json")
+
+# 查询照片数据时需要的列，内联数据和段文件位置二选一
+_BLOB_COLUMNS = "b.data, b.pack_segment, b.pack_offset, b.size"
+
+
+def photo_hash(photo_data):
+    """计算照片内容的SHA-256哈希，作为照片数据的唯一标识"""
+    return hashlib.sha256(photo_data).hexdigest()
+
+
+def load_photo_backend():
+    """从配置文件读取照片存储后端"""
+    try:
+        if os.path.exists(CONFIG_PATH):
+            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                backend = json.load(f).get("PHOTO_BACKEND", DEFAULT_PHOTO_BACKEND)
+            if backend in PHOTO_BACKENDS:
+                return backend
+    except Exception as e:
+        print(f"读取照片存储配置失败: {e}")
+
+    return DEFAULT_PHOTO_BACKEND
+
+
+def save_photo_backend(backend):
+    """将照片存储后端写入配置文件，保留其他配置项"""
+    config = {}
+    if os.path.exists(CONFIG_PATH):
+        with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+    config["PHOTO_BACKEND"] = backend
+
+    with open(CONFIG_PATH, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+
+class PackSegments:
+    """照片段文件
+
+    照片字节依次追加写入 segment_000001.pack 这样的段文件，
+    超过 max_segment_size 后切换到新段。已写入的字节不会被修改，
+    读取时通过 mmap 直接返回 memoryview，不产生额外拷贝。
+    """
+
+    SEGMENT_PATTERN = re.compile(r"^segment_(\d{6})\.pack$")
+
+    def __init__(self, pack_dir, max_segment_size=64 * 1024 * 1024, fsync=True):
+        self.pack_dir = pack_dir
+        self.max_segment_size = max_segment_size
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._maps = {}
+        # 压缩后不再被引用、等待删除的段
+        self._retired = set()
+        # 已写入但尚未 fsync 的段，由 sync() 统一落盘
+        self._unsynced = set()
+
+        segments = self.list_segments()
+        self.active_segment = segments[-1] if segments else 1
+
+    def segment_path(self, segment):
+        return os.path.join(self.pack_dir, f"segment_{segment:06d}.pack")
+
+    def list_segments(self):
+        """列出已有的段编号"""
+        if not os.path.isdir(self.pack_dir):
+            return []
+
+        segments = []
+        for name in os.listdir(self.pack_dir):
+            match = self.SEGMENT_PATTERN.match(name)
+            if match:
+                segments.append(int(match.group(1)))
+        return sorted(segments)
+
+    def append(self, photo_data, sync=True):
+        """追加写入照片字节，返回 (段编号, 偏移量)
+
+        sync=False 时暂不 fsync，调用方需在提交数据库事务前调用 sync()，
+        批量写入多张照片时每个段只需落盘一次。
+        """
+        with self._lock:
+            os.makedirs(self.pack_dir, exist_ok=True)
+
+            path = self.segment_path(self.active_segment)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size > 0 and size + len(photo_data) > self.max_segment_size:
+                self.active_segment += 1
+                path = self.segment_path(self.active_segment)
+
+            with open(path, "ab") as f:
+                offset = f.tell()
+                f.write(photo_data)
+                f.flush()
+                # 数据库提交引用之前，照片字节必须已经落盘
+                if self.fsync:
+                    if sync:
+                        os.fsync(f.fileno())
+                    else:
+                        self._unsynced.add(path)
+
+            return self.active_segment, offset
+
+    def sync(self):
+        """将延迟落盘的段文件 fsync 到磁盘"""
+        with self._lock:
+            paths, self._unsynced = self._unsynced, set()
+
+        for path in paths:
+            with open(path, "rb+") as f:
+                os.fsync(f.fileno())
+
+    def read(self, segment, offset, size):
+        """读取照片字节，返回指向内存映射的 memoryview"""
+        end = offset + size
+        with self._lock:
+            mapped = self._maps.get(segment)
+            # 活动段会继续增长，超出已映射范围时重新映射
+            if mapped is None or len(mapped) < end:
+                with open(self.segment_path(segment), "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[segment] = mapped
+
+        return memoryview(mapped)[offset:end]
+
+    def retire(self, segment):
+        """标记段已不再被引用，文件留到下次 remove_retired() 时再删除
+
+        压缩前已查到旧位置的读操作在这段时间内仍能打开旧段。
+        """
+        with self._lock:
+            # 不主动关闭映射，仍在使用的 memoryview 保持有效
+            self._maps.pop(segment, None)
+            self._retired.add(segment)
+
+    def is_retired(self, segment):
+        with self._lock:
+            return segment in self._retired
+
+    def remove_retired(self):
+        """删除已标记的段文件，返回删除的段编号列表
+
+        标记之后又被读取（重新映射）过的段说明仍有读操作使用旧位置，留到下次再删除。
+        """
+        removed = []
+        with self._lock:
+            for segment in sorted(self._retired):
+                if self._maps.pop(segment, None) is not None:
+                    continue
+                try:
+                    os.remove(self.segment_path(segment))
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                self._retired.discard(segment)
+                removed.append(segment)
+        return removed
+
+    def remove(self, segment):
+        """删除段文件；仍被占用时保留，等待下次压缩再删除"""
+        with self._lock:
+            # 不主动关闭映射，仍在使用的 memoryview 保持有效
+            self._maps.pop(segment, None)
+            try:
+                os.remove(self.segment_path(segment))
+                return True
+            except OSError:
+                return False
+
+
+class BlobPhotoStore:
+    """按内容寻址的照片存储
+
+    照片字节按SHA-256哈希保存在 photo_blobs 表中，相同内容只存一份；
+    food_photos 只记录美食项与哈希的对应关系。引用计数由数据库触发器维护，
+    删除最后一条引用时照片数据随之删除。
+
+    新照片内联保存在数据库中。提供 pack_dir 时也能读取已迁移到段文件的照片。
+    """
+
+    backend = "blob"
+
+    def __init__(self, pack_dir=None):
+        self.segments = PackSegments(pack_dir) if pack_dir else None
+
+    def put(self, cursor, food_id, photo_data, sync=True):
+        """为美食项保存一张照片，返回照片ID
+
+        sync=False 时照片字节的落盘推迟到 sync()，调用方必须在提交事务前调用。
+        """
+        digest = photo_hash(photo_data)
+
+        # 相同内容已存在时不重复保存，只增加一条引用
+        cursor.execute("SELECT 1 FROM photo_blobs WHERE hash = ?", (digest,))
+        if cursor.fetchone() is None:
+            self._insert_blobs(cursor, [(digest, photo_data)], sync)
+
+        cursor.execute("""
+            INSERT INTO food_photos (food_id, photo_hash)
+            VALUES (?, ?)
+        """, (food_id, digest))
+
+        return cursor.lastrowid
+
+    def put_many(self, cursor, photos):
+        """批量保存照片，photos 为 [(美食ID, 照片数据), ...]"""
+        blobs = {}
+        refs = []
+        for food_id, photo_data in photos:
+            digest = photo_hash(photo_data)
+            blobs.setdefault(digest, photo_data)
+            refs.append((food_id, digest))
+
+        if not refs:
+            return
+
+        # 分批查询已存在的照片，避免超出SQL参数数量限制
+        digests = list(blobs)
+        existing = set()
+        for start in range(0, len(digests), 500):
+            chunk = digests[start:start + 500]
+            cursor.execute(f"SELECT hash FROM photo_blobs WHERE hash IN ({','.join('?' * len(chunk))})", chunk)
+            existing.update(row[0] for row in cursor.fetchall())
+
+        self._insert_blobs(cursor, [(digest, photo_data) for digest, photo_data in blobs.items()
+                                    if digest not in existing], sync=False)
+        self.sync()
+
+        cursor.executemany("""
+            INSERT INTO food_photos (food_id, photo_hash)
+            VALUES (?, ?)
+        """, refs)
+
+    def sync(self):
+        """将延迟写入的照片字节落盘；内联存储的照片随数据库事务提交，无需处理"""
+        if self.segments:
+            self.segments.sync()
+
+    def _insert_blobs(self, cursor, blobs, sync=True):
+        cursor.executemany("""
+            INSERT OR IGNORE INTO photo_blobs (hash, data, size, ref_count)
+            VALUES (?, ?, ?, 0)
+        """, [(digest, photo_data, len(photo_data)) for digest, photo_data in blobs])
+
+    def _load(self, data, segment, offset, size):
+        """根据 photo_blobs 中的记录取出照片数据"""
+        if data is not None:
+            return data
+        if segment is not None and self.segments:
+            return self.segments.read(segment, offset, size)
+        return None
+
+    def get_view(self, cursor, photo_id):
+        """获取照片数据；保存在段文件中的照片返回零拷贝的 memoryview"""
+        cursor.execute(f"""
+            SELECT {_BLOB_COLUMNS} FROM food_photos p
+            JOIN photo_blobs b ON b.hash = p.photo_hash
+            WHERE p.id = ?
+        """, (photo_id,))
+
+        row = cursor.fetchone()
+        return self._load(*row) if row else None
+
+    def get(self, cursor, photo_id):
+        """获取指定照片ID的照片数据"""
+        photo_data = self.get_view(cursor, photo_id)
+        return bytes(photo_data) if isinstance(photo_data, memoryview) else photo_data
+
+    def get_by_hash(self, cursor, digest):
+        """按内容哈希获取照片数据"""
+        cursor.execute(f"""
+            SELECT {_BLOB_COLUMNS} FROM photo_blobs b
+            WHERE b.hash = ?
+        """, (digest,))
+
+        row = cursor.fetchone()
+        return self._load(*row) if row else None
+
+    def get_locations_by_food(self, cursor, food_id):
+        """获取美食项所有照片的存储位置，返回 [(照片ID, 位置), ...]，位置供 iter_chunks 使用"""
+        cursor.execute("""
+            SELECT p.id, b.rowid, b.data IS NOT NULL, b.pack_segment, b.pack_offset, b.size
+            FROM food_photos p
+            JOIN photo_blobs b ON b.hash = p.photo_hash
+            WHERE p.food_id = ?
+            ORDER BY p.id
+        """, (food_id,))
+
+        return [(row[0], tuple(row[1:])) for row in cursor.fetchall()]
+
+    def iter_chunks(self, conn, location, chunk_size=192 * 1024):
+        """按块读取一张照片的数据，不把整张照片读入内存"""
+        rowid, inline, segment, offset, size = location
+
+        if inline:
+            # 使用增量BLOB读取直接从数据库页面分块读取
+            if hasattr(conn, "blobopen"):
+                with conn.blobopen("photo_blobs", "data", rowid, readonly=True) as blob:
+                    while True:
+                        chunk = blob.read(chunk_size)
+                        if not chunk:
+                            break
+                        yield chunk
+                return
+
+            row = conn.execute("SELECT data FROM photo_blobs WHERE rowid = ?", (rowid,)).fetchone()
+            view = memoryview(row[0]) if row else memoryview(b"")
+        elif segment is not None and self.segments:
+            view = self.segments.read(segment, offset, size)
+        else:
+            return
+
+        # 段文件通过 mmap 读取，切片不会复制数据
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+
+    def get_by_food(self, cursor, food_id):
+        """获取美食项的所有照片，返回 [(照片ID, 照片数据), ...]"""
+        cursor.execute(f"""
+            SELECT p.id, {_BLOB_COLUMNS} FROM food_photos p
+            JOIN photo_blobs b ON b.hash = p.photo_hash
+            WHERE p.food_id = ?
+            ORDER BY p.id
+        """, (food_id,))
+
+        photos = []
+        for row in cursor.fetchall():
+            photo_data = self._load(*row[1:])
+            if photo_data is not None:
+                photos.append((row[0], bytes(photo_data)))
+        return photos
+
+
+class PackPhotoStore(BlobPhotoStore):
+    """段文件照片存储
+
+    照片字节追加写入数据库外的段文件，photo_blobs 只保存段编号和偏移量，
+    数据库文件保持精简，元数据查询不再受大量BLOB页面影响。
+    删除照片只会在段文件中留下无效字节，由后台压缩回收。
+    """
+
+    backend = "pack"
+
+    def __init__(self, pack_dir):
+        super().__init__(pack_dir)
+        self._compaction_thread = None
+        self._stop_event = threading.Event()
+
+    def _insert_blobs(self, cursor, blobs, sync=True):
+        rows = []
+        for digest, photo_data in blobs:
+            segment, offset = self.segments.append(photo_data, sync)
+            rows.append((digest, len(photo_data), segment, offset))
+
+        cursor.executemany("""
+            INSERT OR IGNORE INTO photo_blobs (hash, data, size, ref_count, pack_segment, pack_offset)
+            VALUES (?, NULL, ?, 0, ?, ?)
+        """, rows)
+
+    def compact(self, conn, min_live_ratio=0.5, grace_seconds=300):
+        """压缩段文件，返回回收的字节数
+
+        段中尚未提交的照片不会出现在 photo_blobs 中，会被当作无效数据，所以每个段都在
+        BEGIN IMMEDIATE 事务中检查：取得写锁时之前开始的写事务都已提交或回滚。
+        FoodManager 还通过写入队列独占执行压缩，不会与队列中的写操作交替进行。
+
+        有效数据比例低于 min_live_ratio 的段会把仍被引用的照片搬到活动段，
+        旧段先标记为待删除，下次压缩时才删除文件，正在读取旧位置的读操作不受影响。
+        最近 grace_seconds 秒内修改过的段和活动段不参与压缩。
+        """
+        reclaimed = 0
+        now = time.time()
+
+        # 删除上次压缩标记的段
+        self.segments.remove_retired()
+
+        for segment in self.segments.list_segments():
+            if segment >= self.segments.active_segment or self.segments.is_retired(segment):
+                continue
+
+            path = self.segments.segment_path(segment)
+            try:
+                file_size = os.path.getsize(path)
+                if now - os.path.getmtime(path) < grace_seconds:
+                    continue
+            except OSError:
+                continue
+
+            # 先取得数据库写锁，之前开始的写事务都已提交或回滚，段中的有效数据都能查到
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute("""
+                    SELECT hash, pack_offset, size FROM photo_blobs
+                    WHERE pack_segment = ?
+                """, (segment,)).fetchall()
+                live_bytes = sum(row[2] for row in rows)
+
+                if live_bytes and live_bytes >= file_size * min_live_ratio:
+                    conn.rollback()
+                    continue
+
+                for digest, offset, size in rows:
+                    new_segment, new_offset = self.segments.append(self.segments.read(segment, offset, size))
+                    conn.execute("""
+                        UPDATE photo_blobs SET pack_segment = ?, pack_offset = ?
+                        WHERE hash = ? AND pack_segment = ?
+                    """, (new_segment, new_offset, digest, segment))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            self.segments.retire(segment)
+            reclaimed += file_size - live_bytes
+
+        return reclaimed
+
+    def start_background_compaction(self, compact, interval=600):
+        """启动后台压缩线程，每隔 interval 秒调用 compact()，返回值为回收的字节数
+
+        compact 负责在没有其他写事务时执行 self.compact()，如提交到写入队列独占执行。
+        """
+        if self._compaction_thread is not None:
+            return
+
+        def run():
+            while not self._stop_event.wait(interval):
+                try:
+                    reclaimed = compact()
+                    if reclaimed:
+                        print(f"照片段文件压缩完成，回收 {reclaimed} 字节")
+                except Exception as e:
+                    print(f"照片段文件压缩失败: {e}")
+
+        self._compaction_thread = threading.Thread(target=run, name="photo-pack-compaction", daemon=True)
+        self._compaction_thread.start()
+
+    def stop_background_compaction(self):
+        self._stop_event.set()
+
+
+def get_pack_dir(db_path):
+    """照片段文件目录，与数据库文件放在同一目录下"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "photo_packs")
+
+
+# 按数据库路径共享照片存储，保证同一个段文件只有一个写入者
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_photo_store(db_path, backend=None):
+    """获取指定数据库的共享照片存储"""
+    backend = backend or load_photo_backend()
+    if backend not in PHOTO_BACKENDS:
+        raise ValueError(f"未知的照片存储后端: {backend}")
+
+    key = (backend, os.path.abspath(db_path))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            if backend == "pack":
+                store = PackPhotoStore(get_pack_dir(db_path))
+            else:
+                store = BlobPhotoStore(get_pack_dir(db_path))
+            _stores[key] = store
+        return store
+
+
+def deduplicate_photos(cursor):
+    """将 food_photos 中内联保存的照片迁移到按内容寻址的存储
+
+    逐张处理，不会一次性把所有照片读入内存。
+    返回 (照片数, 去重后保存的份数, 节省的字节数)。
+    """
+    cursor.execute("SELECT id FROM food_photos WHERE photo_hash IS NULL AND photo_data IS NOT NULL")
+    photo_ids = [row[0] for row in cursor.fetchall()]
+
+    original_bytes = 0
+    stored_bytes = 0
+    for photo_id in photo_ids:
+        cursor.execute("SELECT photo_data FROM food_photos WHERE id = ?", (photo_id,))
+        photo_data = cursor.fetchone()[0]
+        digest = photo_hash(photo_data)
+        original_bytes += len(photo_data)
+
+        cursor.execute("""
+            INSERT OR IGNORE INTO photo_blobs (hash, data, size, ref_count)
+            VALUES (?, ?, ?, 0)
+        """, (digest, photo_data, len(photo_data)))
+        if cursor.rowcount > 0:
+            stored_bytes += len(photo_data)
+        cursor.execute("""
+            UPDATE food_photos SET photo_hash = ?, photo_data = NULL
+            WHERE id = ?
+        """, (digest, photo_id))
+
+    # 根据实际引用重新计算引用计数
+    cursor.execute("""
+        UPDATE photo_blobs SET ref_count = (
+            SELECT COUNT(*) FROM food_photos WHERE food_photos.photo_hash = photo_blobs.hash
+        )
+    """)
+
+    cursor.execute("SELECT COUNT(*) FROM photo_blobs")
+    unique_count = cursor.fetchone()[0]
+
+    return len(photo_ids), unique_count, original_bytes - stored_bytes
+
+
+def migrate_photo_backend(db_path, backend, batch_size=100):
+    """在内联存储和段文件存储之间迁移全部照片，返回迁移的照片数
+
+    逐张迁移并分批提交，中途中断后重新运行会从剩余的照片继续。
+    """
+    if backend not in PHOTO_BACKENDS:
+        raise ValueError(f"未知的照片存储后端: {backend}")
+
+    pack_dir = get_pack_dir(db_path)
+    store = PackPhotoStore(pack_dir)
+    conn = sqlite3.connect(db_path, timeout=30)
+    moved = 0
+
+    try:
+        if backend == "pack":
+            hashes = [row[0] for row in conn.execute("SELECT hash FROM photo_blobs WHERE data IS NOT NULL")]
+        else:
+            hashes = [row[0] for row in conn.execute("SELECT hash FROM photo_blobs WHERE data IS NULL AND pack_segment IS NOT NULL")]
+
+        for digest in hashes:
+            if backend == "pack":
+                photo_data = conn.execute("SELECT data FROM photo_blobs WHERE hash = ?", (digest,)).fetchone()[0]
+                segment, offset = store.segments.append(photo_data)
+                conn.execute("""
+                    UPDATE photo_blobs SET data = NULL, pack_segment = ?, pack_offset = ?
+                    WHERE hash = ?
+                """, (segment, offset, digest))
+            else:
+                segment, offset, size = conn.execute("""
+                    SELECT pack_segment, pack_offset, size FROM photo_blobs WHERE hash = ?
+                """, (digest,)).fetchone()
+                conn.execute("""
+                    UPDATE photo_blobs SET data = ?, pack_segment = NULL, pack_offset = NULL
+                    WHERE hash = ?
+                """, (bytes(store.segments.read(segment, offset, size)), digest))
+
+            moved += 1
+            if moved % batch_size == 0:
+                conn.commit()
+
+        conn.commit()
+
+        if backend == "pack":
+            # 照片已移出数据库，回收数据库文件空间
+            conn.execute("VACUUM")
+        else:
+            # 段文件中已没有被引用的照片
+            for segment in store.segments.list_segments():
+                store.segments.remove(segment)
+
+    finally:
+        conn.close()
+
+    return moved
+
+
+def main():
+    """命令行迁移工具：python -m data.photo_store pack|blob [数据库路径]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="在数据库内联存储和段文件存储之间迁移照片")
+    parser.add_argument("backend", choices=PHOTO_BACKENDS, help="目标存储后端")
+    parser.add_argument("db_path", nargs="?", default="data/food_map.db", help="数据库文件路径")
+    args = parser.parse_args()
+
+    # 确保 photo_blobs 表已包含段文件位置列
+    from data.database import initialize_database
+    initialize_database(args.db_path)
+
+    moved = migrate_photo_backend(args.db_path, args.backend)
+    save_photo_backend(args.backend)
+    print(f"已迁移 {moved} 张照片到 {args.backend} 存储，配置已更新")
+
+
+if __name__ == "__main__":
+    main()
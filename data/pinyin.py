@@ -0,0 +1,92 @@
+import os
+import re
+import threading
+import unicodedata
+
+# 随程序发布的汉字拼音表，不需要联网
+PINYIN_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pinyin_table.txt")
+
+# 每条索引键保存的最大长度，更长的输入只按前缀匹配这一段
+PINYIN_KEY_LENGTH = 32
+
+# 可以按拼音检索的输入：只包含字母和数字，至少有一个字母；
+# 单个字母几乎匹配所有记录，至少两个字符才按拼音检索
+_PINYIN_QUERY = re.compile(r"^(?=.*[a-z])[a-z0-9]{2,}$")
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def _load_table():
+    """首次使用时读取拼音表，返回 汉字 -> 拼音"""
+    global _table
+    with _table_lock:
+        if _table is None:
+            table = {}
+            with open(PINYIN_TABLE_PATH, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip() or line.startswith("#"):
+                        continue
+                    syllable, chars = line.split()
+                    for char in chars:
+                        table[char] = syllable
+            _table = table
+    return _table
+
+
+def syllables(text):
+    """把文本拆分为拼音音节：汉字转为拼音，字母和数字逐个保留，其余字符忽略"""
+    table = _load_table()
+    result = []
+    for char in unicodedata.normalize("NFKC", text or "").lower():
+        syllable = table.get(char)
+        if syllable:
+            result.append(syllable)
+        elif char.isascii() and char.isalnum():
+            result.append(char)
+    return result
+
+
+def pinyin_keys(name):
+    """生成名称的拼音索引键 [(全拼, 首字母), ...]
+
+    从每个音节开始各生成一条，按前缀查找时也能匹配名称中间的部分，
+    例如 "金谷园饺子馆" 可以用 jgy、jinguyuan、jz、jiaozi 找到。
+    """
+    parts = syllables(name)
+    keys = []
+    for start in range(len(parts)):
+        full = "".join(parts[start:])[:PINYIN_KEY_LENGTH]
+        initials = "".join(part[0] for part in parts[start:])[:PINYIN_KEY_LENGTH]
+        if (full, initials) not in keys:
+            keys.append((full, initials))
+    return keys
+
+
+def is_pinyin_query(text):
+    """输入是否可以按拼音检索"""
+    return bool(_PINYIN_QUERY.match(text or ""))
+
+
+def prefix_range(prefix):
+    """前缀查找的范围 [prefix, 上界)，可以直接使用拼音列上的索引"""
+    prefix = prefix[:PINYIN_KEY_LENGTH]
+    # 拼音键只包含小写字母和数字，"{" 排在 "z" 之后
+    return prefix, prefix + "{"
+
+
+def matches_pinyin(name, text):
+    """在内存中判断名称的全拼或首字母是否有以 text 开头的索引键"""
+    text = text.lower()[:PINYIN_KEY_LENGTH]
+    return any(full.startswith(text) or initials.startswith(text) for full, initials in pinyin_keys(name))
+
+
+def index_food_pinyin(cursor, food_items):
+    """重建这些美食记录的拼音索引，food_items 为 [(美食ID, 名称), ...]"""
+    food_items = list(food_items)
+    cursor.executemany("DELETE FROM food_items_pinyin WHERE food_id = ?",
+                       [(food_id,) for food_id, _ in food_items])
+    cursor.executemany(
+        "INSERT INTO food_items_pinyin (food_id, full, initials) VALUES (?, ?, ?)",
+        [(food_id, full, initials) for food_id, name in food_items for full, initials in pinyin_keys(name)]
+    )
@@ -0,0 +1,196 @@
+import os
+import queue
+import sqlite3
+import threading
+from io import BytesIO
+
+# 预生成的缩略图规格：名称 -> (最大宽度, 最大高度)
+THUMBNAIL_SIZES = {
+    "small": (120, 90),    # 编辑对话框的照片预览
+    "detail": (200, 150),  # 美食详情面板
+    "blog": (480, 360),    # 导出博客中的照片
+}
+
+# 无法解码的照片记录一行此规格、数据为空的缩略图作为失败标记，之后不再重试；
+# 照片数据删除时随其他缩略图一起删除
+FAILED_VARIANT = "failed"
+
+
+def make_thumbnail(photo_data, size, quality=85):
+    """按最大尺寸等比例缩放照片，返回JPEG字节"""
+    from PIL import Image
+
+    img = Image.open(BytesIO(photo_data))
+    # JPEG 可以在解码时直接按 1/2、1/4、1/8 缩小，省去大部分解码工作
+    img.draft("RGB", size)
+    img = img.convert("RGB")
+    img.thumbnail(size, Image.LANCZOS)
+
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def build_thumbnails(conn, photo_store, digest):
+    """为一张照片生成全部规格的缩略图并写入数据库，返回生成的数量
+
+    照片无法解码时写入失败标记并返回 0，已标记失败的照片直接跳过。
+    """
+    if conn.execute("""
+        SELECT 1 FROM photo_thumbnails WHERE photo_hash = ? AND variant = ?
+    """, (digest, FAILED_VARIANT)).fetchone():
+        return 0
+
+    photo_data = photo_store.get_by_hash(conn.cursor(), digest)
+    if photo_data is None:
+        return 0
+
+    rows = []
+    try:
+        for variant, size in THUMBNAIL_SIZES.items():
+            rows.append((digest, variant, make_thumbnail(bytes(photo_data), size)))
+    except Exception as e:
+        print(f"生成缩略图失败 {digest}: {e}，之后不再重试")
+        rows = [(digest, FAILED_VARIANT, b"")]
+
+    conn.executemany("""
+        INSERT OR REPLACE INTO photo_thumbnails (photo_hash, variant, data)
+        VALUES (?, ?, ?)
+    """, rows)
+    return 0 if rows[0][1] == FAILED_VARIANT else len(rows)
+
+
+def find_missing_thumbnails(conn):
+    """查找缺少缩略图的照片哈希，已标记失败的照片除外"""
+    return [row[0] for row in conn.execute("""
+        SELECT b.hash FROM photo_blobs b
+        WHERE (SELECT COUNT(*) FROM photo_thumbnails t WHERE t.photo_hash = b.hash) < ?
+        AND NOT EXISTS (SELECT 1 FROM photo_thumbnails t WHERE t.photo_hash = b.hash AND t.variant = ?)
+    """, (len(THUMBNAIL_SIZES), FAILED_VARIANT))]
+
+
+def backfill_thumbnails(db_path, photo_store, batch_size=50):
+    """为已有照片补齐缩略图，返回处理的照片数"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    processed = 0
+    try:
+        for digest in find_missing_thumbnails(conn):
+            try:
+                if not build_thumbnails(conn, photo_store, digest):
+                    continue
+            except Exception as e:
+                print(f"生成缩略图失败 {digest}: {e}")
+                continue
+
+            processed += 1
+            if processed % batch_size == 0:
+                conn.commit()
+
+        conn.commit()
+    finally:
+        conn.close()
+
+    return processed
+
+
+class ThumbnailBuilder:
+    """后台缩略图生成线程
+
+    新照片保存后把内容哈希放入队列，由后台线程解码和缩放，
+    界面线程只读取已经生成好的缩略图。
+    """
+
+    def __init__(self, db_path, photo_store):
+        self.db_path = db_path
+        self.photo_store = photo_store
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, digests):
+        """将需要生成缩略图的照片哈希加入队列"""
+        self._put(list(digests))
+
+    def enqueue_missing(self):
+        """在后台补齐所有缺少缩略图的照片"""
+        self._put([None])
+
+    def _put(self, digests):
+        # 入队和线程退出的判断在同一把锁下进行，线程退出时不会遗漏刚加入的任务
+        with self._lock:
+            for digest in digests:
+                self._queue.put(digest)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="thumbnail-builder", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            while True:
+                try:
+                    digest = self._queue.get(timeout=5)
+                except queue.Empty:
+                    # 队列空闲时退出线程，有新任务时再启动
+                    with self._lock:
+                        if self._queue.empty():
+                            self._thread = None
+                            return
+                    continue
+
+                try:
+                    digests = find_missing_thumbnails(conn) if digest is None else [digest]
+                except Exception as e:
+                    print(f"查找缺少缩略图的照片失败: {e}")
+                    continue
+
+                # 每张照片单独提交，出错时只回滚它自己；无法解码的照片提交的是失败标记
+                for item in digests:
+                    try:
+                        build_thumbnails(conn, self.photo_store, item)
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        print(f"生成缩略图失败 {item}: {e}")
+        finally:
+            conn.close()
+            # 异常退出时也要清除线程记录，之后的任务会启动新线程
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+
+# 按数据库路径共享缩略图生成线程
+_builders = {}
+_builders_lock = threading.Lock()
+
+
+def get_thumbnail_builder(db_path, photo_store):
+    """获取指定数据库的共享缩略图生成器"""
+    key = os.path.abspath(db_path)
+    with _builders_lock:
+        builder = _builders.get(key)
+        if builder is None:
+            builder = ThumbnailBuilder(db_path, photo_store)
+            _builders[key] = builder
+        return builder
+
+
+def main():
+    """命令行补齐缩略图：python -m data.thumbnails [数据库路径]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="为已有照片生成缩略图")
+    parser.add_argument("db_path", nargs="?", default="data/food_map.db", help="数据库文件路径")
+    args = parser.parse_args()
+
+    from data.database import initialize_database
+    from data.photo_store import get_photo_store
+    initialize_database(args.db_path)
+
+    processed = backfill_thumbnails(args.db_path, get_photo_store(args.db_path))
+    print(f"已为 {processed} 张照片生成缩略图")
+
+
+if __name__ == "__main__":
+    main()
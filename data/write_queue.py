@@ -0,0 +1,190 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class WriteCancelled(Exception):
+    """写操作被调用方取消，该操作的修改全部回滚"""
+
+
+class WriteQueue:
+    """后台写入队列
+
+    专用写线程按提交顺序执行写操作，界面线程提交后立即返回，不会等待磁盘。
+    相隔很近的操作合并到同一个事务中只提交一次（组提交），
+    每个操作在各自的保存点中执行，失败时只回滚该操作本身。
+    操作的 Future 在事务提交后才完成，完成回调中读取数据库一定能读到修改。
+    """
+
+    def __init__(self, get_connection, photo_store, commit_delay=0.005, max_batch=100):
+        self._get_connection = get_connection
+        self.photo_store = photo_store
+        # 收到第一个操作后再等待的秒数，期间到达的操作一起提交
+        self.commit_delay = commit_delay
+        self.max_batch = max_batch
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+
+    def submit(self, operation, *args, **kwargs):
+        """提交写操作 operation(cursor, *args, **kwargs)，返回 Future，结果为操作的返回值"""
+        return self._put(operation, args, kwargs, False)
+
+    def submit_exclusive(self, func, *args, **kwargs):
+        """提交自行管理连接和事务的写操作 func(*args, **kwargs)，单独执行，不与其他操作合并"""
+        return self._put(func, args, kwargs, True)
+
+    def barrier(self):
+        """返回 Future，此前提交的写操作全部提交或回滚后完成；不阻塞调用方"""
+        return self.submit(_barrier)
+
+    def flush(self, timeout=None):
+        """等待已提交的写操作全部完成，返回是否在超时前完成"""
+        # 写线程中的操作等待自己会死锁
+        if threading.current_thread() is self._thread:
+            return False
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def _put(self, func, args, kwargs, exclusive):
+        future = Future()
+        with self._lock:
+            self._pending += 1
+            self._queue.put((future, func, args, kwargs, exclusive))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+                self._thread.start()
+        return future
+
+    def _done(self, count):
+        with self._idle:
+            self._pending -= count
+            if self._pending == 0:
+                self._idle.notify_all()
+
+    def _run(self):
+        task = None
+        while True:
+            if task is None:
+                try:
+                    task = self._queue.get(timeout=5)
+                except queue.Empty:
+                    # 队列空闲时退出线程，有新操作时再启动
+                    with self._lock:
+                        if self._queue.empty():
+                            self._thread = None
+                            return
+                    continue
+
+            if task[4]:
+                self._run_exclusive(task)
+                task = None
+                continue
+
+            # 收集紧接着到达的操作，独占操作留到本批提交之后执行
+            batch = [task]
+            task = None
+            deadline = time.monotonic() + self.commit_delay
+            while len(batch) < self.max_batch:
+                try:
+                    next_task = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if next_task[4]:
+                    task = next_task
+                    break
+                batch.append(next_task)
+
+            self._run_batch(batch)
+
+    def _run_exclusive(self, task):
+        future, func, args, kwargs, _ = task
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            self._done(1)
+
+    def _run_batch(self, batch):
+        results = []
+        conn = None
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+
+            conn.execute("BEGIN TRANSACTION")
+            for future, operation, args, kwargs, _ in batch:
+                # 已被调用方取消的操作直接跳过
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                cursor.execute("SAVEPOINT write_queue_operation")
+                try:
+                    result = operation(cursor, *args, **kwargs)
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO write_queue_operation")
+                    cursor.execute("RELEASE write_queue_operation")
+                    if not isinstance(e, WriteCancelled):
+                        print(f"写操作失败: {e}")
+                    results.append((future, None, e))
+                else:
+                    cursor.execute("RELEASE write_queue_operation")
+                    results.append((future, result, None))
+
+            # 段文件中的新照片在提交前统一落盘
+            self.photo_store.sync()
+            conn.commit()
+
+        except Exception as e:
+            print(f"批量写入失败: {e}")
+            if conn:
+                conn.rollback()
+            # 整批回滚，本批中尚未取消的操作全部失败
+            results = []
+            for future, _, _, _, _ in batch:
+                if not future.done() and (future.running() or future.set_running_or_notify_cancel()):
+                    results.append((future, None, e))
+
+        finally:
+            if conn:
+                conn.close()
+
+        try:
+            for future, result, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+        finally:
+            self._done(len(batch))
+
+
+def _barrier(cursor):
+    """barrier() 提交的空操作，随所在批次一起提交"""
+    return None
+
+
+# 按数据库路径共享写入队列，所有写操作经由同一个写线程
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_write_queue(db_path, get_connection, photo_store):
+    """获取指定数据库的共享写入队列"""
+    key = os.path.abspath(db_path)
+    with _queues_lock:
+        write_queue = _queues.get(key)
+        if write_queue is None:
+            write_queue = WriteQueue(get_connection, photo_store)
+            _queues[key] = write_queue
+        return write_queue
@@ -5,6 +5,7 @@ from PyQt5.QtGui import QFont, QFontDatabase, QIcon
 from ui.main_window import MainWindow
 from ui.api_key_dialog import ApiKeyDialog
 from data.database import initialize_database
+from data.connection_manager import close_all_connection_managers
 from config.api_keys import PLACE_SEARCH_AK, MAP_DISPLAY_AK
 
 def main():
@@ -48,7 +49,12 @@ def main():
     window.show()
     
     # 运行应用程序
-    return app.exec_()
+    exit_code = app.exec_()
+    
+    # 关闭连接池中的长期连接，确保WAL检查点写回数据库文件
+    close_all_connection_managers()
+    
+    return exit_code
 
 if __name__ == "__main__":
     sys.exit(main()) 
\ No newline at end of file
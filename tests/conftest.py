@@ -0,0 +1,17 @@
+"""测试公共设置：把项目根目录加入导入路径，并提供已初始化的临时数据库"""
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from data.database import initialize_database
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """已执行全部迁移的临时数据库路径"""
+    return initialize_database(str(tmp_path / "food_map.db"))
@@ -0,0 +1,72 @@
+"""迁移引擎：版本号、幂等性、失败回滚，以及从中间版本升级后的结构与新建数据库一致"""
+import sqlite3
+
+import pytest
+
+from data import database
+from data.database import MIGRATIONS, SCHEMA_VERSION, get_schema_version, initialize_database, migrate
+
+
+def schema(db_path):
+    """数据库中全部表、索引和触发器的定义"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return sorted(conn.execute("""
+            SELECT type, name, sql FROM sqlite_master
+            WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+        """).fetchall())
+    finally:
+        conn.close()
+
+
+def test_new_database_reaches_latest_version(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        assert get_schema_version(conn) == SCHEMA_VERSION
+        assert [version for version, _, _ in MIGRATIONS] == list(range(1, SCHEMA_VERSION + 1))
+    finally:
+        conn.close()
+
+
+def test_migrate_is_idempotent(db_path):
+    before = schema(db_path)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        assert migrate(conn) == 0
+        assert get_schema_version(conn) == SCHEMA_VERSION
+    finally:
+        conn.close()
+
+    initialize_database(db_path)
+    assert schema(db_path) == before
+
+
+def test_upgrade_from_intermediate_version_matches_new_database(db_path, tmp_path, monkeypatch):
+    old_path = str(tmp_path / "old.db")
+    monkeypatch.setattr(database, "MIGRATIONS", MIGRATIONS[:5])
+    conn = sqlite3.connect(old_path, isolation_level=None)
+    try:
+        assert migrate(conn) == 5
+        assert get_schema_version(conn) == 5
+    finally:
+        conn.close()
+
+    monkeypatch.setattr(database, "MIGRATIONS", MIGRATIONS)
+    initialize_database(old_path)
+    assert schema(old_path) == schema(db_path)
+
+
+def test_failed_step_is_rolled_back(db_path, monkeypatch):
+    def broken_step(cursor):
+        cursor.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("迁移失败")
+
+    monkeypatch.setattr(database, "MIGRATIONS", MIGRATIONS + [(SCHEMA_VERSION + 1, "损坏的迁移", broken_step)])
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        with pytest.raises(RuntimeError):
+            migrate(conn)
+        assert get_schema_version(conn) == SCHEMA_VERSION
+        assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
+    finally:
+        conn.close()
@@ -0,0 +1,67 @@
+"""照片引用计数触发器：计数随 food_photos 增删变化，最后一条引用删除时照片数据和缩略图一起删除"""
+import sqlite3
+
+import pytest
+
+from data.photo_store import BlobPhotoStore, photo_hash
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = sqlite3.connect(db_path)
+    yield conn
+    conn.close()
+
+
+def add_food(conn, name):
+    return conn.execute("INSERT INTO food_items (name, city) VALUES (?, '北京')", (name,)).lastrowid
+
+
+def ref_count(conn, digest):
+    row = conn.execute("SELECT ref_count FROM photo_blobs WHERE hash = ?", (digest,)).fetchone()
+    return row[0] if row else None
+
+
+def test_ref_count_follows_references(conn):
+    store = BlobPhotoStore()
+    photo = b"same photo"
+    digest = photo_hash(photo)
+    first = store.put(conn.cursor(), add_food(conn, "甲"), photo)
+    second = store.put(conn.cursor(), add_food(conn, "乙"), photo)
+    conn.execute("INSERT INTO photo_thumbnails (photo_hash, variant, data) VALUES (?, 'small', x'00')", (digest,))
+
+    assert conn.execute("SELECT COUNT(*) FROM photo_blobs").fetchone()[0] == 1
+    assert ref_count(conn, digest) == 2
+
+    conn.execute("DELETE FROM food_photos WHERE id = ?", (first,))
+    assert ref_count(conn, digest) == 1
+
+    conn.execute("DELETE FROM food_photos WHERE id = ?", (second,))
+    assert ref_count(conn, digest) is None
+    assert conn.execute("SELECT COUNT(*) FROM photo_thumbnails WHERE photo_hash = ?", (digest,)).fetchone()[0] == 0
+
+
+def test_put_many_counts_every_reference(conn):
+    store = BlobPhotoStore()
+    food_id = add_food(conn, "甲")
+    store.put_many(conn.cursor(), [(food_id, b"a"), (food_id, b"a"), (food_id, b"b")])
+
+    assert ref_count(conn, photo_hash(b"a")) == 2
+    assert ref_count(conn, photo_hash(b"b")) == 1
+
+    conn.execute("DELETE FROM food_photos WHERE food_id = ?", (food_id,))
+    assert conn.execute("SELECT COUNT(*) FROM photo_blobs").fetchone()[0] == 0
+
+
+def test_reference_counts_match_references(conn):
+    store = BlobPhotoStore()
+    foods = [add_food(conn, str(i)) for i in range(5)]
+    for i, food_id in enumerate(foods):
+        for j in range(i + 1):
+            store.put(conn.cursor(), food_id, bytes([j]))
+    conn.execute("DELETE FROM food_photos WHERE food_id IN (?, ?)", (foods[1], foods[3]))
+
+    assert conn.execute("""
+        SELECT COUNT(*) FROM photo_blobs b
+        WHERE b.ref_count != (SELECT COUNT(*) FROM food_photos p WHERE p.photo_hash = b.hash)
+    """).fetchone()[0] == 0
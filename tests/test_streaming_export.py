@@ -0,0 +1,47 @@
+"""流式导出：内存峰值只与单张照片大小有关，与集合大小无关"""
+import json
+import os
+import sqlite3
+import tracemalloc
+
+from data.food_manager import FoodManager
+from data.photo_store import BlobPhotoStore
+
+PHOTO_SIZE = 256 * 1024
+
+
+def populate(db_path, item_count, photos_per_item):
+    conn = sqlite3.connect(db_path)
+    store = BlobPhotoStore()
+    for i in range(item_count):
+        food_id = conn.execute("""
+            INSERT INTO food_items (collection_id, name, city, rating)
+            VALUES (1, ?, '北京', 8)
+        """, (f"测试店铺{i}",)).lastrowid
+        for _ in range(photos_per_item):
+            store.put(conn.cursor(), food_id, os.urandom(PHOTO_SIZE))
+    conn.commit()
+    conn.close()
+
+
+def test_export_memory_is_bounded(db_path, tmp_path):
+    populate(db_path, item_count=40, photos_per_item=2)
+    food_manager = FoodManager(db_path, use_pool=True, photo_backend="blob")
+    file_path = str(tmp_path / "export.json")
+
+    tracemalloc.start()
+    try:
+        assert food_manager.export_collection(food_manager.personal_collection_id, file_path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # 全部照片约 20 MB，峰值应保持在几张照片的大小以内
+    assert peak < 4 * PHOTO_SIZE + 2 * 1024 * 1024
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    data = json.loads(text)
+    assert len(data["food_items"]) == 40
+    assert all(len(item["photos"]) == 2 for item in data["food_items"])
+    assert json.dumps(data, ensure_ascii=False, indent=2) == text
@@ -0,0 +1,36 @@
+"""写入队列：同一批次中失败的操作只回滚自身"""
+import sqlite3
+
+import pytest
+
+from data.photo_store import BlobPhotoStore
+from data.write_queue import WriteQueue
+
+
+def add_city(cursor, name, fail=False):
+    cursor.execute("INSERT INTO cities (name) VALUES (?)", (name,))
+    if fail:
+        raise ValueError(name)
+    return cursor.lastrowid
+
+
+def test_failed_operation_rolls_back_only_itself(db_path):
+    write_queue = WriteQueue(lambda: sqlite3.connect(db_path), BlobPhotoStore(), commit_delay=0.2)
+    futures = [
+        write_queue.submit(add_city, "南京"),
+        write_queue.submit(add_city, "西安", fail=True),
+        write_queue.submit(add_city, "武汉"),
+    ]
+    assert write_queue.flush(timeout=10)
+
+    assert futures[0].result() and futures[2].result()
+    with pytest.raises(ValueError):
+        futures[1].result()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        names = {row[0] for row in conn.execute("SELECT name FROM cities")}
+    finally:
+        conn.close()
+    assert {"南京", "武汉"} <= names
+    assert "西安" not in names
@@ -1,14 +1,100 @@
 from PyQt5.QtWidgets import (QDialog, QFormLayout, QLineEdit, QComboBox, 
                             QSpinBox, QTextEdit, QPushButton, QHBoxLayout, 
-                            QVBoxLayout, QLabel, QFileDialog, QMessageBox, QDoubleSpinBox, QScrollArea, QMenu, QAction, QWidget)
-from PyQt5.QtCore import Qt, QSize
-from PyQt5.QtGui import QPixmap, QImage
+                            QVBoxLayout, QLabel, QFileDialog, QMessageBox, QDoubleSpinBox, QScrollArea, QMenu, QAction, QWidget,
+                            QProgressDialog)
+from PyQt5.QtCore import Qt, QSize, QObject, pyqtSignal
+from PyQt5.QtGui import QPixmap, QImage, QImageReader
 import requests
 import json
 import os
-from PIL import Image
-from io import BytesIO
+import tempfile
+import threading
 from data.food_manager import FoodManager
+from data.photo_pipeline import iter_prepared_photos
+
+class FoodSaveTask(QObject):
+    """在后台保存美食记录
+    
+    新照片先在后台线程中交给进程池并行缩放和编码，处理好一张就写入临时文件，
+    全部处理完后再把字段修改、照片删除和新照片作为一个写操作提交到写入队列，在同一个事务中写入。
+    写线程只从临时文件逐张读取编码好的照片，不在事务中解码和编码图片，
+    界面线程不会被阻塞，内存中也不会同时保存全部照片。
+    信号从后台线程发出，由Qt排队到界面线程处理。
+    """
+    progress = pyqtSignal(int, int)     # 已处理数量, 总数
+    photo_failed = pyqtSignal(str, str) # 照片路径, 错误信息
+    saved = pyqtSignal(object)          # 美食ID，失败或取消时为 None
+    
+    def __init__(self, food_manager, food_id, food_data, delete_photo_ids, photo_paths, parent=None):
+        super().__init__(parent)
+        self.food_manager = food_manager
+        self.food_id = food_id
+        self.food_data = food_data
+        self.delete_photo_ids = list(delete_photo_ids)
+        self.photo_paths = list(photo_paths)
+        self._cancelled = threading.Event()
+    
+    def cancel(self):
+        """放弃保存，已写入的内容全部回滚"""
+        self._cancelled.set()
+    
+    def prepare_photos(self, spool):
+        """处理新照片并逐张写入临时文件，返回 [(偏移, 长度), ...]；处理失败的照片跳过，取消时返回 None"""
+        ranges = []
+        photos = iter_prepared_photos(self.photo_paths)
+        try:
+            for done, (path, photo_data, error) in enumerate(photos, 1):
+                if self._cancelled.is_set():
+                    return None
+                if error is not None:
+                    self.photo_failed.emit(path, str(error))
+                else:
+                    ranges.append((spool.tell(), len(photo_data)))
+                    spool.write(photo_data)
+                self.progress.emit(done, len(self.photo_paths))
+        finally:
+            photos.close()
+        return ranges
+    
+    def start(self):
+        """在后台线程中处理照片，处理完后提交到写入队列，立即返回"""
+        threading.Thread(target=self.run, name="food-save", daemon=True).start()
+    
+    def run(self):
+        spool = tempfile.TemporaryFile()
+        try:
+            ranges = self.prepare_photos(spool)
+        except Exception as e:
+            print(f"处理照片时出错: {e}")
+            ranges = None
+        
+        if ranges is None:
+            spool.close()
+            self.saved.emit(None)
+            return
+        
+        def read_photos():
+            """在写线程中逐张读出处理好的照片"""
+            for offset, length in ranges:
+                spool.seek(offset)
+                yield spool.read(length)
+        
+        future = self.food_manager.enqueue_save_food_item(
+            self.food_id,
+            self.food_data,
+            delete_photo_ids=self.delete_photo_ids,
+            new_photos=read_photos(),
+            cancel_check=self._cancelled.is_set
+        )
+        future.add_done_callback(lambda f: self.on_done(f, spool))
+    
+    def on_done(self, future, spool):
+        """在写线程中调用，事务提交或回滚后删除临时文件并发出保存结果"""
+        spool.close()
+        food_id = None
+        if not future.cancelled() and future.exception() is None:
+            food_id = future.result()
+        self.saved.emit(food_id)
 
 class AddFoodDialog(QDialog):
     def __init__(self, parent=None, editing=False, food_data=None, food_id=None, api_key=None):
@@ -20,11 +106,13 @@ class AddFoodDialog(QDialog):
         self.api_key = api_key
         
         # 添加这一行，初始化 food_manager
-        self.food_manager = FoodManager()
+        self.food_manager = FoodManager(use_pool=True)
         
         self.photo_paths = []
         self.existing_photos = []
         self.photos_to_delete = []
+        # 照片路径 -> 预览图，避免每次刷新预览都重新解码原图
+        self.preview_pixmaps = {}
         self.location_data = {"latitude": 0, "longitude": 0, "address": ""}
         
         if editing:
@@ -179,12 +267,11 @@ class AddFoodDialog(QDialog):
         
         # 获取照片数据
         try:
-            conn = self.food_manager.get_connection()
-            cursor = conn.cursor()
-            
             # 查询所有相关照片
-            cursor.execute("SELECT id, photo_data FROM photos WHERE food_item_id = ?", (food_data["id"],))
-            photos = cursor.fetchall()
+            photos = self.food_manager.get_photos(food_data["id"])
+            
+            # 预览直接使用预生成的小尺寸缩略图
+            thumbnails = dict(self.food_manager.get_thumbnails(food_data["id"], "small"))
             
             if photos:
                 import tempfile
@@ -204,16 +291,19 @@ class AddFoodDialog(QDialog):
                     
                     # 添加到照片路径列表
                     self.photo_paths.append(photo_path)
+                    
+                    pixmap = QPixmap()
+                    if photo_id in thumbnails and pixmap.loadFromData(thumbnails[photo_id]):
+                        # 缩略图尚未生成时得到的是原图，缩小到预览尺寸后再缓存
+                        if pixmap.width() > 120 or pixmap.height() > 90:
+                            pixmap = pixmap.scaled(120, 90, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                        self.preview_pixmaps[photo_path] = pixmap
                 
                 # 更新照片预览
                 self.update_photo_preview()
         
         except Exception as e:
             print(f"加载照片错误: {e}")
-        
-        finally:
-            if conn:
-                conn.close()
     
     def add_photo(self):
         file_paths, _ = QFileDialog.getOpenFileNames(
@@ -257,8 +347,7 @@ class AddFoodDialog(QDialog):
             photo_layout.setContentsMargins(5, 5, 5, 5)
             
             # 照片预览
-            pixmap = QPixmap(path)
-            pixmap = pixmap.scaled(QSize(120, 90), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            pixmap = self.get_preview_pixmap(path)
             
             photo_label = QLabel()
             photo_label.setPixmap(pixmap)
@@ -286,6 +375,20 @@ class AddFoodDialog(QDialog):
         # 添加弹性空间
         self.photos_layout.addStretch()
     
+    def get_preview_pixmap(self, path, size=QSize(120, 90)):
+        """获取照片的预览图，本地文件在解码时直接缩小"""
+        pixmap = self.preview_pixmaps.get(path)
+        if pixmap is not None:
+            return pixmap
+        
+        reader = QImageReader(path)
+        if reader.size().isValid():
+            reader.setScaledSize(reader.size().scaled(size, Qt.KeepAspectRatio))
+        
+        pixmap = QPixmap.fromImage(reader.read())
+        self.preview_pixmaps[path] = pixmap
+        return pixmap
+    
     def show_photo_context_menu(self, pos, index):
         """显示照片右键菜单"""
         menu = QMenu(self)
@@ -467,77 +570,68 @@ class AddFoodDialog(QDialog):
         
         try:
             # 构建食品数据
-            food_data = {
-                "name": self.name_edit.text(),
-                "city": self.city_combo.currentText(),
-                "address": self.location_data["address"],
-                "latitude": self.location_data["latitude"],
-                "longitude": self.location_data["longitude"],
-                "rating": self.rating_spin.value(),
-                "reason": self.reason_edit.toPlainText(),
-                "food_type": self.type_combo.currentText(),
-                "collection_id": self.parent().current_collection_id if hasattr(self.parent(), 'current_collection_id') else None
-            }
+            food_data = self.get_food_data()
+            food_data["collection_id"] = self.parent().current_collection_id if hasattr(self.parent(), 'current_collection_id') else None
             
-            # 明确区分编辑模式和新增模式
-            if self.editing and self.food_id:
-                # 编辑现有食品记录
-                print(f"更新美食记录，ID: {self.food_id}")
-                self.food_manager.update_food_item(self.food_id, food_data)
-                food_id = self.food_id
-                
-                # 删除标记为删除的照片
-                for photo_id in self.photos_to_delete:
-                    print(f"删除照片，ID: {photo_id}")
-                    self.food_manager.delete_photo(photo_id)
-            else:
-                # 添加新的食品记录
-                print("添加新的美食记录")
-                food_id = self.food_manager.add_food_item(food_data)
-                print(f"新增美食记录，ID: {food_id}")
+            # 编辑模式更新现有记录并删除标记的照片，新增模式添加新记录
+            food_id = self.food_id if self.editing and self.food_id else None
+            delete_photo_ids = self.photos_to_delete if food_id else []
+            
+            # 索引超过现有照片数量的是新添加的照片，在后台处理后与记录一起保存
+            new_photo_paths = self.photo_paths[len(self.existing_photos):]
+            
+            self.save_btn.setEnabled(False)
             
-            # 处理照片
-            for i, photo_path in enumerate(self.photo_paths):
-                # 检查这个索引是否超过了现有照片数量，表示这是新添加的照片
-                if i >= len(self.existing_photos):
-                    try:
-                        with open(photo_path, "rb") as f:
-                            photo_data = f.read()
-                        print(f"添加新照片到美食记录 {food_id}")
-                        self.food_manager.add_photo(food_id, photo_data)
-                    except Exception as e:
-                        print(f"保存照片错误: {e}")
+            self.save_progress = QProgressDialog("正在保存...", "取消", 0, max(1, len(new_photo_paths)), self)
+            self.save_progress.setWindowTitle("保存美食记录")
+            self.save_progress.setWindowModality(Qt.WindowModal)
+            self.save_progress.setMinimumDuration(500)
+            self.save_progress.setAutoClose(False)
+            self.save_progress.setAutoReset(False)
             
-            QMessageBox.information(self, "成功", "美食记录已保存！")
-            self.accept()
+            self.save_task = FoodSaveTask(self.food_manager, food_id, food_data, delete_photo_ids, new_photo_paths, self)
+            self.save_task.progress.connect(self.on_photo_progress)
+            self.save_task.photo_failed.connect(lambda path, error: print(f"保存照片错误 {path}: {error}"))
+            self.save_task.saved.connect(self.finish_save)
+            self.save_progress.canceled.connect(self.save_task.cancel)
+            self.save_task.start()
             
         except Exception as e:
             QMessageBox.warning(self, "错误", f"保存美食记录失败: {str(e)}")
     
+    def on_photo_progress(self, done, total):
+        """更新照片保存进度"""
+        self.save_progress.setValue(done)
+        self.save_progress.setLabelText(f"正在处理照片... {done}/{total}")
+    
+    def finish_save(self, food_id):
+        """保存完成后关闭对话框；失败或取消时保留对话框"""
+        # 关闭进度框会触发取消信号，需在关闭前读取是否由用户取消
+        cancelled = self.save_progress.wasCanceled()
+        self.save_progress.close()
+        
+        if food_id is None:
+            self.save_btn.setEnabled(True)
+            if not cancelled:
+                QMessageBox.warning(self, "错误", "保存美食记录失败，请重试。")
+            return
+        
+        print(f"已保存美食记录，ID: {food_id}")
+        QMessageBox.information(self, "成功", "美食记录已保存！")
+        self.accept()
+    
     def get_food_data(self):
-        # 处理照片
-        photo_data = []
-        for path in self.photo_paths:
-            # 读取图片并转换为合适的格式
-            img = Image.open(path)
-            img = img.convert('RGB')
-            
-            # 调整大小
-            max_size = (800, 800)
-            img.thumbnail(max_size, Image.LANCZOS)
-            
-            # 保存到内存
-            buffer = BytesIO()
-            img.save(buffer, format="JPEG")
-            photo_data.append(buffer.getvalue())
+        """获取表单中的美食数据
         
+        照片不在这里读取，新照片由 FoodSaveTask 在后台并行处理后与记录一起保存。
+        """
         # 构建美食数据
         return {
             "name": self.name_edit.text().strip(),
             "city": self.city_combo.currentText(),
             "rating": self.rating_spin.value(),
             "reason": self.reason_edit.toPlainText(),
-            "photos": photo_data,
+            "photos": [],
             "latitude": self.location_data["latitude"],
             "longitude": self.location_data["longitude"],
             "address": self.location_data["address"],
@@ -0,0 +1,40 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from data.food_events import ITEM_ADDED, ITEM_UPDATED, ITEM_DELETED, COLLECTION_CHANGED, PHOTOS_CHANGED
+
+
+class ChangeHub(QObject):
+    """把 FoodManager 发布的数据变更转换为Qt信号
+    
+    变更事件可能在后台写线程中发布，信号由Qt排队到界面线程；
+    新增和修改的记录在发布事件的线程中读取，界面线程只负责更新控件。
+    """
+    itemAdded = pyqtSignal(dict)          # 新增的美食记录
+    itemUpdated = pyqtSignal(dict)        # 修改后的美食记录
+    itemDeleted = pyqtSignal(int)         # 删除的美食ID
+    collectionChanged = pyqtSignal(object)  # 集合ID，None 表示可能涉及任意集合
+    photosChanged = pyqtSignal(object)    # 照片有变化的美食ID
+    
+    def __init__(self, food_manager, parent=None):
+        super().__init__(parent)
+        self.food_manager = food_manager
+        self.notifier = food_manager.notifier
+        self.notifier.subscribe(self.on_change)
+        self.destroyed.connect(lambda: self.notifier.unsubscribe(self.on_change))
+    
+    def on_change(self, event):
+        """在发布事件的线程中调用"""
+        if event.kind in (ITEM_ADDED, ITEM_UPDATED):
+            food_item = self.food_manager.get_food_item(event.food_id)
+            if food_item is None:
+                return
+            if event.kind == ITEM_ADDED:
+                self.itemAdded.emit(food_item)
+            else:
+                self.itemUpdated.emit(food_item)
+        elif event.kind == ITEM_DELETED:
+            self.itemDeleted.emit(event.food_id)
+        elif event.kind == COLLECTION_CHANGED:
+            self.collectionChanged.emit(event.collection_id)
+        elif event.kind == PHOTOS_CHANGED:
+            self.photosChanged.emit(event.food_id)
@@ -3,6 +3,7 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QLabel, QHBoxLayout,
 from PyQt5.QtCore import Qt, QSize, QBuffer, pyqtSignal
 from PyQt5.QtGui import QPixmap, QImage, QFont, QIcon
 from data.food_manager import FoodManager
+from ui.read_dispatcher import ReadDispatcher
 from io import BytesIO
 
 class FoodDetailWidget(QWidget):
@@ -13,9 +14,11 @@ class FoodDetailWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         
-        self.food_manager = FoodManager()
+        self.food_manager = FoodManager(use_pool=True)
+        self.read_dispatcher = ReadDispatcher(self.food_manager, self)
         self.food_data = None
         self.current_food_id = None
+        self.photos_food_id = None
         
         self.setup_ui()
     
@@ -113,26 +116,31 @@ class FoodDetailWidget(QWidget):
         self.load_photos(food_item["id"])
     
     def load_photos(self, food_id):
-        """加载美食照片"""
+        """在后台加载美食照片，加载完成后显示"""
         # 清除现有照片
         while self.photo_layout.count():
             item = self.photo_layout.takeAt(0)
             if item.widget():
                 item.widget().deleteLater()
         
+        # 切换到其他美食项后，之前请求的照片不再显示
+        self.photos_food_id = food_id
         if not food_id:
             return
         
-        # 获取照片数据
-        conn = None
+        # 使用预生成的详情尺寸缩略图，无需解码原图
+        self.read_dispatcher.submit(
+            "photos",
+            self.food_manager.get_thumbnails, food_id, "detail",
+            on_finished=lambda photos: self.show_photos(food_id, photos)
+        )
+    
+    def show_photos(self, food_id, photos):
+        """显示后台加载完成的照片"""
+        if food_id != self.photos_food_id:
+            return
+        
         try:
-            conn = self.food_manager.get_connection()
-            cursor = conn.cursor()
-            
-            # 查询所有相关照片 - 确保使用正确的表名
-            cursor.execute("SELECT id, photo_data FROM photos WHERE food_item_id = ?", (food_id,))
-            photos = cursor.fetchall()
-            
             if not photos:
                 # 没有照片时不显示任何内容
                 # 不显示"暂无照片"文本，让界面更加简洁
@@ -142,8 +150,9 @@ class FoodDetailWidget(QWidget):
             for photo_id, photo_data in photos:
                 pixmap = QPixmap()
                 if pixmap.loadFromData(photo_data):
-                    # 等比例缩放到合适大小
-                    pixmap = pixmap.scaled(200, 150, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                    # 缩略图尚未生成时返回的是原图，等比例缩放到合适大小
+                    if pixmap.width() > 200 or pixmap.height() > 150:
+                        pixmap = pixmap.scaled(200, 150, Qt.KeepAspectRatio, Qt.SmoothTransformation)
                     
                     photo_label = QLabel()
                     photo_label.setPixmap(pixmap)
@@ -161,10 +170,6 @@ class FoodDetailWidget(QWidget):
         
         except Exception as e:
             print(f"加载照片错误: {e}")
-        
-        finally:
-            if conn:
-                conn.close()
     
     def clear_layout(self, layout):
         """清除布局中的所有控件"""
@@ -190,6 +195,7 @@ class FoodDetailWidget(QWidget):
     def clear_details(self):
         """清除详情显示"""
         self.current_food_id = None
+        self.photos_food_id = None
         self.name_label.setText("请选择美食项")
         self.clear_layout(self.photo_layout)
         self.reason_text.hide()
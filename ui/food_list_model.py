@@ -0,0 +1,172 @@
+import html
+
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QPointF, pyqtSignal
+from PyQt5.QtGui import QIcon, QTextDocument
+from PyQt5.QtWidgets import QApplication, QStyle, QStyledItemDelegate, QStyleOptionViewItem
+
+from data.food_manager import SNIPPET_START, SNIPPET_END
+
+# 美食数据所在的角色
+FoodItemRole = Qt.UserRole
+# 检索结果摘要所在的角色，关键字用 SNIPPET_START / SNIPPET_END 标记
+SnippetRole = Qt.UserRole + 1
+
+# 评分档位对应的图标，首次使用时加载一次，所有行共用
+_rating_icons = {}
+
+
+def rating_icon(rating):
+    """根据评分返回金、银、铜星图标"""
+    if rating >= 9:
+        tier = "gold"
+    elif rating >= 7:
+        tier = "silver"
+    else:
+        tier = "bronze"
+    
+    icon = _rating_icons.get(tier)
+    if icon is None:
+        icon = QIcon(f"icons/star_{tier}.png")
+        _rating_icons[tier] = icon
+    return icon
+
+
+class FoodListModel(QAbstractListModel):
+    """分页加载的美食列表模型
+    
+    只保存已经从数据库取回的记录，不为每一行创建控件或复制数据，
+    视图只为可见的行调用 data()。滚动到底部时视图调用 fetchMore()，
+    模型发出 moreRequested 信号，由列表控件在后台读取下一页后调用 append_items。
+    """
+    moreRequested = pyqtSignal()
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.items = []
+        self.rows = {}  # 美食ID -> 行号
+        self.has_more = False
+        self.loading_more = False
+    
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.items)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        
+        item = self.items[index.row()]
+        if role == Qt.DisplayRole:
+            return f"{item['name']} ({item['city']}) - {item['rating']}分"
+        if role == Qt.DecorationRole:
+            return rating_icon(item["rating"])
+        if role == FoodItemRole:
+            return item
+        if role == SnippetRole:
+            return item.get("snippet")
+        return None
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.has_more and not self.loading_more
+    
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self.loading_more = True
+            self.moreRequested.emit()
+    
+    def set_items(self, items, has_more=False):
+        """整体替换已加载的记录"""
+        self.beginResetModel()
+        self.items = list(items)
+        self.has_more = has_more
+        self.loading_more = False
+        self._update_rows()
+        self.endResetModel()
+    
+    def append_items(self, items, has_more):
+        """追加下一页记录"""
+        self.loading_more = False
+        self.has_more = has_more
+        if not items:
+            return
+        
+        first = len(self.items)
+        self.beginInsertRows(QModelIndex(), first, first + len(items) - 1)
+        self.items.extend(items)
+        self._update_rows(first)
+        self.endInsertRows()
+    
+    def insert_item(self, row, item):
+        """在指定行插入一条记录"""
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.items.insert(row, item)
+        self._update_rows(row)
+        self.endInsertRows()
+    
+    def update_item(self, item):
+        """原位替换一条记录，返回是否找到该记录"""
+        row = self.rows.get(item["id"])
+        if row is None:
+            return False
+        
+        self.items[row] = item
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+        return True
+    
+    def remove_item(self, food_id):
+        """删除一条记录"""
+        row = self.rows.get(food_id)
+        if row is None:
+            return
+        
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.items[row]
+        del self.rows[food_id]
+        self._update_rows(row)
+        self.endRemoveRows()
+    
+    def _update_rows(self, first=0):
+        """更新 first 及之后各行的 美食ID -> 行号，之前的行号不受影响"""
+        if first == 0:
+            self.rows = {}
+        for row in range(first, len(self.items)):
+            self.rows[self.items[row]["id"]] = row
+
+
+def snippet_html(snippet):
+    """把检索摘要转换为关键字加粗高亮的HTML"""
+    text = html.escape(" ".join(snippet.split()))
+    return text.replace(SNIPPET_START, '<b style="color:#e74c3c;">').replace(SNIPPET_END, "</b>")
+
+
+class FoodItemDelegate(QStyledItemDelegate):
+    """绘制美食列表项；检索结果在名称后面显示高亮关键字的摘要，其余行按默认方式绘制"""
+    
+    def paint(self, painter, option, index):
+        snippet = index.data(SnippetRole)
+        if not snippet:
+            super().paint(painter, option, index)
+            return
+        
+        options = QStyleOptionViewItem(option)
+        self.initStyleOption(options, index)
+        text = f'{html.escape(options.text)}  <span style="color:#7f8c8d;">{snippet_html(snippet)}</span>'
+        
+        # 先绘制背景和图标，再在文本区域绘制富文本
+        options.text = ""
+        style = options.widget.style() if options.widget else QApplication.style()
+        style.drawControl(QStyle.CE_ItemViewItem, options, painter, options.widget)
+        text_rect = style.subElementRect(QStyle.SE_ItemViewItemText, options, options.widget)
+        
+        document = QTextDocument()
+        document.setDocumentMargin(0)
+        document.setDefaultFont(options.font)
+        document.setHtml(text)
+        
+        painter.save()
+        painter.setClipRect(text_rect)
+        painter.translate(QPointF(text_rect.left(), text_rect.top() + (text_rect.height() - document.size().height()) / 2))
+        document.drawContents(painter)
+        painter.restore()
@@ -1,8 +1,26 @@
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QListWidget, QListWidgetItem,
+import html
+
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QListView,
                             QLabel, QHBoxLayout, QComboBox, QLineEdit, QMenu,
                             QAction)
-from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtGui import QIcon, QFont
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer
+
+from data.food_manager import FoodQuery
+from ui.food_list_model import FoodListModel, FoodItemDelegate, FoodItemRole
+from ui.read_dispatcher import ReadDispatcher
+
+# 每次从数据库读取的记录条数
+PAGE_SIZE = 200
+
+# 停止输入多少毫秒后才执行检索
+SEARCH_DELAY_MS = 250
+
+# 排序选项：(显示名称, 排序字段, 是否降序)
+SORT_OPTIONS = [
+    ("最新添加", "created_at", True),
+    ("评分最高", "rating", True),
+    ("名称", "name", False),
+]
 
 class FoodListWidget(QWidget):
     # 自定义信号：当选择美食项时发出
@@ -10,11 +28,16 @@ class FoodListWidget(QWidget):
     food_edit_requested = pyqtSignal(int)
     food_delete_requested = pyqtSignal(int)
     foodItemDoubleClicked = pyqtSignal(dict)
+    countChanged = pyqtSignal(int)      # 当前集合的记录总数
     
-    def __init__(self):
+    def __init__(self, food_manager=None):
         super().__init__()
         
-        self.food_items = []
+        self.food_manager = food_manager
+        self.read_dispatcher = None
+        self.collection_id = None
+        self.query = None
+        self.total_count = 0
         self.setup_ui()
     
     def setup_ui(self):
@@ -47,90 +70,258 @@ class FoodListWidget(QWidget):
         search_layout = QHBoxLayout()
         search_layout.addWidget(QLabel("搜索:"))
         self.search_edit = QLineEdit()
-        self.search_edit.setPlaceholderText("输入店铺名称...")
-        self.search_edit.textChanged.connect(self.apply_filters)
+        self.search_edit.setPlaceholderText("输入名称、拼音首字母、地址、推荐理由或菜系...")
+        self.search_edit.textChanged.connect(self.on_search_text_changed)
         search_layout.addWidget(self.search_edit)
         filter_layout.addLayout(search_layout)
         
+        # 检索没有结果时提示名称相近的美食，点击后改为检索该名称
+        self.suggestion_label = QLabel()
+        self.suggestion_label.setTextFormat(Qt.RichText)
+        self.suggestion_label.setWordWrap(True)
+        self.suggestion_label.linkActivated.connect(self.search_edit.setText)
+        self.suggestion_label.hide()
+        filter_layout.addWidget(self.suggestion_label)
+        
+        # 排序
+        sort_layout = QHBoxLayout()
+        sort_layout.addWidget(QLabel("排序:"))
+        self.sort_combo = QComboBox()
+        self.sort_combo.addItems([name for name, _, _ in SORT_OPTIONS])
+        self.sort_combo.currentIndexChanged.connect(self.apply_filters)
+        sort_layout.addWidget(self.sort_combo)
+        filter_layout.addLayout(sort_layout)
+        
         layout.addLayout(filter_layout)
         
-        # 美食列表
-        self.list_widget = QListWidget()
-        self.list_widget.setAlternatingRowColors(True)
+        # 连续输入时只在停顿后检索一次
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.apply_filters)
+        
+        # 美食列表：筛选和排序在数据库中完成，模型只保存已读取的页，视图只绘制可见的行
+        self.model = FoodListModel(self)
+        self.model.moreRequested.connect(self.load_more)
+        
+        self.list_view = QListView()
+        self.list_view.setModel(self.model)
+        self.list_view.setItemDelegate(FoodItemDelegate(self.list_view))
+        self.list_view.setAlternatingRowColors(True)
+        # 所有行高度相同，视图不必逐行计算尺寸
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setEditTriggers(QListView.NoEditTriggers)
         
         # 设置右键菜单
-        self.list_widget.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.list_widget.customContextMenuRequested.connect(self.show_context_menu)
+        self.list_view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.list_view.customContextMenuRequested.connect(self.show_context_menu)
         
-        # 为列表小部件添加双击事件
-        self.list_widget.itemDoubleClicked.connect(self.on_item_double_clicked)
+        # 为列表视图添加双击事件
+        self.list_view.doubleClicked.connect(self.on_item_double_clicked)
         
-        layout.addWidget(self.list_widget)
+        layout.addWidget(self.list_view)
         
         self.setLayout(layout)
     
-    def update_food_list(self, food_items):
-        """更新美食列表数据"""
-        self.food_items = food_items
+    def get_food_manager(self):
+        """获取 FoodManager，并创建后台读取的分发器"""
+        if self.food_manager is None:
+            from data.food_manager import FoodManager
+            self.food_manager = FoodManager(use_pool=True)
+        if self.read_dispatcher is None:
+            self.read_dispatcher = ReadDispatcher(self.food_manager, self)
+        return self.food_manager
+    
+    def set_collection(self, collection_id):
+        """显示指定集合的美食记录"""
+        self.collection_id = collection_id
         self.apply_filters()
     
-    def apply_filters(self):
-        """应用筛选条件"""
-        self.list_widget.clear()
-        
+    def count(self):
+        """当前集合的记录总数（不受筛选影响）"""
+        return self.total_count
+    
+    def on_search_text_changed(self, text):
+        """检索时按相关度排序，排序选项暂不可用"""
+        self.sort_combo.setEnabled(not text.strip())
+        self.search_timer.start()
+    
+    def build_query(self):
+        """根据筛选控件生成查询；有检索关键字时按相关度排序"""
         city_filter = self.city_combo.currentText()
         rating_filter = self.rating_combo.currentText()
-        search_text = self.search_edit.text().lower()
+        _, sort_field, descending = SORT_OPTIONS[max(0, self.sort_combo.currentIndex())]
         
-        for item in self.food_items:
-            # 应用城市筛选
-            if city_filter != "全部" and item["city"] != city_filter:
-                continue
-            
-            # 应用评分筛选
-            if rating_filter != "全部" and item["rating"] < int(rating_filter):
-                continue
-            
-            # 应用搜索筛选
-            if search_text and search_text not in item["name"].lower():
-                continue
-            
-            # 创建列表项
-            list_item = QListWidgetItem()
-            
-            # 设置图标（根据评分）
-            if item["rating"] >= 9:
-                list_item.setIcon(QIcon("icons/star_gold.png"))
-            elif item["rating"] >= 7:
-                list_item.setIcon(QIcon("icons/star_silver.png"))
+        query = FoodQuery().collection(self.collection_id).order_by(sort_field, descending)
+        if city_filter and city_filter != "全部":
+            query = query.city(city_filter)
+        if rating_filter != "全部":
+            query = query.min_rating(int(rating_filter))
+        search_text = self.search_edit.text().strip()
+        if search_text:
+            query = query.text(search_text).order_by("relevance")
+        return query
+    
+    def apply_filters(self):
+        """应用筛选条件：在后台查询第一页，快速输入时只显示最后一次查询的结果"""
+        if self.collection_id is None:
+            return
+        
+        self.search_timer.stop()
+        self.get_food_manager()
+        self.query = self.build_query()
+        self.read_dispatcher.submit("page", self.fetch_page, self.query, on_finished=self.show_first_page)
+        self.refresh_count()
+    
+    def fetch_page(self, query):
+        """在读取线程中执行：返回 (一页记录, 是否还有更多)"""
+        food_items = self.food_manager.query_food_items(query.limit(PAGE_SIZE + 1))
+        return food_items[:PAGE_SIZE], len(food_items) > PAGE_SIZE
+    
+    def show_first_page(self, result):
+        food_items, has_more = result
+        self.model.set_items(food_items, has_more)
+        
+        search_text = dict(self.query.filters).get("text") if self.query else None
+        if food_items or not search_text:
+            self.suggestion_label.hide()
+            return
+        
+        # 检索没有结果，在后台查找名称相近的美食
+        self.read_dispatcher.submit("suggest", self.food_manager.suggest_food_names,
+                                    search_text, self.collection_id,
+                                    on_finished=self.show_suggestions)
+    
+    def show_suggestions(self, names):
+        """显示"您是不是要找"的候选名称"""
+        if not names or self.model.items:
+            self.suggestion_label.hide()
+            return
+        
+        links = "，".join(f'<a href="{html.escape(name)}">{html.escape(name)}</a>' for name in names)
+        self.suggestion_label.setText(f"您是不是要找：{links}")
+        self.suggestion_label.show()
+    
+    def load_more(self):
+        """列表滚动到底部时在后台读取下一页"""
+        query = self.query
+        if query is None or not self.model.items:
+            self.model.loading_more = False
+            return
+        
+        def show_more(result):
+            # 期间筛选条件已改变，丢弃旧查询的结果
+            if query is self.query:
+                self.model.append_items(*result)
+        
+        self.read_dispatcher.submit("more", self.fetch_page, query.after(self.model.items[-1]),
+                                    on_finished=show_more)
+    
+    def refresh_count(self):
+        """在后台重新统计当前集合的记录总数"""
+        if self.collection_id is None:
+            return
+        
+        def show_count(count):
+            self.total_count = count
+            self.countChanged.emit(count)
+        
+        self.get_food_manager()
+        self.read_dispatcher.submit("count", self.food_manager.count_food_items,
+                                    FoodQuery().collection(self.collection_id), on_finished=show_count)
+    
+    def add_food_item(self, item):
+        """新增一条美食记录，符合筛选条件时插入到排序中的对应位置"""
+        self.place_food_item(item)
+        self.refresh_count()
+    
+    def update_food_item(self, item):
+        """更新一条美食记录；排序位置或筛选结果改变时移动或移除对应的行"""
+        self.place_food_item(item)
+    
+    def remove_food_item(self, food_id):
+        """删除一条美食记录，只移除对应的列表行"""
+        self.model.remove_item(food_id)
+        self.refresh_count()
+    
+    def place_food_item(self, item):
+        """按当前查询的排序放置一条记录，只改动对应的行"""
+        if self.query is None:
+            return
+        
+        if not self.query.matches(item):
+            self.model.remove_item(item["id"])
+            return
+        
+        if self.query.ranked():
+            # 相关度只能由全文索引计算：已显示的记录原位更新，新记录在下次检索时出现
+            position = self.model.rows.get(item["id"])
+            if position is not None:
+                old_item = self.model.items[position]
+                self.model.update_item(dict(item, match_rank=old_item["match_rank"], snippet=old_item["snippet"]))
+            return
+        
+        # 找到排序中的位置；排在已加载的最后一条之后且还有下一页时，由下一页读取
+        position = self.model.rows.get(item["id"])
+        row, count = self.sorted_row(item, position)
+        if position is not None and position == row:
+            self.model.update_item(item)
+            return
+        
+        self.model.remove_item(item["id"])
+        if row < count or not self.model.has_more:
+            self.model.insert_item(row, item)
+    
+    def sorted_row(self, item, position=None):
+        """二分查找 item 在已加载记录中的排序位置，不计其原来所在的行 position
+        
+        返回 (行号, 不计原来的行时的记录数)；已加载的记录按当前查询排序，排序键各不相同。
+        """
+        key = self.query.sort_key(item)
+        _, descending = self.query.effective_order()
+        items = self.model.items
+        count = len(items) - (position is not None)
+        
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            # 原来的行之后的记录前移一行
+            other = items[middle + 1 if position is not None and middle >= position else middle]
+            other_key = self.query.sort_key(other)
+            if (other_key < key) if descending else (other_key > key):
+                high = middle
             else:
-                list_item.setIcon(QIcon("icons/star_bronze.png"))
-            
-            # 设置文本
-            list_item.setText(f"{item['name']} ({item['city']}) - {item['rating']}分")
-            
-            # 存储美食数据
-            list_item.setData(Qt.UserRole, item)
-            
-            self.list_widget.addItem(list_item)
+                low = middle + 1
+        return low, count
+    
+    def select_food_item(self, food_id):
+        """选中并滚动到指定的美食项，返回该记录是否在已加载的行中"""
+        row = self.model.rows.get(food_id)
+        if row is None:
+            return False
+        
+        index = self.model.index(row)
+        self.list_view.setCurrentIndex(index)
+        self.list_view.scrollTo(index)
+        return True
     
     def on_item_selected(self, current, previous):
         """当选择列表项时触发"""
-        if current:
+        if current.isValid():
             # 获取美食数据
-            food_item = current.data(Qt.UserRole)
+            food_item = current.data(FoodItemRole)
             
             # 发出信号
             self.food_selected.emit(food_item)
     
     def show_context_menu(self, pos):
         """显示右键菜单"""
-        item = self.list_widget.itemAt(pos)
-        if not item:
+        index = self.list_view.indexAt(pos)
+        if not index.isValid():
             return
             
         # 获取美食数据
-        food_item = item.data(Qt.UserRole)
+        food_item = index.data(FoodItemRole)
         
         menu = QMenu(self)
         
@@ -151,16 +342,16 @@ class FoodListWidget(QWidget):
         delete_action.triggered.connect(lambda: self.food_delete_requested.emit(food_item["id"]))
         menu.addAction(delete_action)
         
-        menu.exec_(self.list_widget.mapToGlobal(pos))
+        menu.exec_(self.list_view.viewport().mapToGlobal(pos))
     
     # 在第一次使用时加载所有城市列表
     def load_all_cities(self):
         """加载数据库中所有城市"""
         from data.food_manager import FoodManager
-        food_manager = FoodManager()
+        food_manager = FoodManager(use_pool=True)
         
         try:
-            conn = food_manager.get_connection()
+            conn = food_manager.get_connection(readonly=True)
             cursor = conn.cursor()
             
             cursor.execute("SELECT DISTINCT city FROM food_items ORDER BY city")
@@ -183,9 +374,9 @@ class FoodListWidget(QWidget):
                 conn.close()
     
     # 添加双击事件处理函数
-    def on_item_double_clicked(self, item):
+    def on_item_double_clicked(self, index):
         # 获取点击项对应的美食数据
-        food_item = item.data(Qt.UserRole)
+        food_item = index.data(FoodItemRole)
         if food_item:
             # 发出信号，传递美食项数据
             self.foodItemDoubleClicked.emit(food_item) 
\ No newline at end of file
@@ -1,23 +1,36 @@
 from PyQt5.QtWidgets import (QMainWindow, QSplitter, QAction, QFileDialog, 
-                            QMessageBox, QVBoxLayout, QWidget, QActionGroup, QHBoxLayout, QComboBox, QPushButton, QInputDialog, QLabel, QDialog, QStatusBar, QSizePolicy, QToolBar)
-from PyQt5.QtCore import Qt, QSize, QUrl
+                            QMessageBox, QVBoxLayout, QWidget, QActionGroup, QHBoxLayout, QComboBox, QPushButton, QInputDialog, QLabel, QDialog, QStatusBar, QSizePolicy, QToolBar,
+                            QProgressDialog)
+from PyQt5.QtCore import Qt, QSize, QUrl, pyqtSignal
 from PyQt5.QtGui import QIcon, QFont, QDesktopServices
 import json
 import datetime
 import os
+import threading
 
 from ui.food_list_widget import FoodListWidget
 from ui.map_widget import MapWidget
 from ui.food_detail_widget import FoodDetailWidget
 from ui.add_food_dialog import AddFoodDialog
+from ui.change_hub import ChangeHub
 from data.food_manager import FoodManager
+from data.write_queue import WriteCancelled
 from config.api_keys import PLACE_SEARCH_AK
 
 class MainWindow(QMainWindow):
+    # 后台写操作完成时从写线程发出，由界面线程调用对应的处理函数
+    writeFinished = pyqtSignal(object, object, object)  # 处理函数, 结果, 异常
+    # 后台导入进度，从写线程发出
+    importProgress = pyqtSignal(int, object, object)    # 已读取条数, 已读取字节数, 文件总字节数
+    
     def __init__(self):
         super().__init__()
         
-        self.food_manager = FoodManager()
+        self.food_manager = FoodManager(use_pool=True)
+        self.writeFinished.connect(lambda callback, result, error: callback(result, error))
+        
+        # 在后台为已有照片补齐缩略图
+        self.food_manager.thumbnail_builder.enqueue_missing()
         
         # 初始化成员变量，避免未定义错误
         self.dataset_label = None
@@ -47,6 +60,17 @@ class MainWindow(QMainWindow):
         
         # 连接食物列表的双击信号
         self.food_list_widget.foodItemDoubleClicked.connect(self.on_food_item_double_clicked)
+        
+        # 地图页面中的事件：点击标记时选中列表中的对应项，视野变化时更新状态栏
+        self.map_widget.markerClicked.connect(self.on_map_marker_clicked)
+        self.map_widget.viewportChanged.connect(self.on_map_viewport_changed)
+        
+        # 数据变更后只更新受影响的列表项和地图标记，不再整体重新加载
+        self.change_hub = ChangeHub(self.food_manager, self)
+        self.change_hub.itemAdded.connect(self.on_food_item_added)
+        self.change_hub.itemUpdated.connect(self.on_food_item_updated)
+        self.change_hub.itemDeleted.connect(self.on_food_item_deleted)
+        self.change_hub.collectionChanged.connect(self.on_collection_data_changed)
     
     def apply_stylesheet(self):
         """应用应用程序样式表"""
@@ -253,7 +277,8 @@ class MainWindow(QMainWindow):
         """)
         
         # 创建左侧美食列表，连接信号
-        self.food_list_widget = FoodListWidget()
+        self.food_list_widget = FoodListWidget(self.food_manager)
+        self.food_list_widget.countChanged.connect(lambda count: self.update_status_dataset_info())
         self.food_list_widget.food_selected.connect(self.show_food_detail_dialog)
         self.food_list_widget.food_edit_requested.connect(self.edit_food_item)
         self.food_list_widget.food_delete_requested.connect(self.delete_food_item)
@@ -378,6 +403,10 @@ class MainWindow(QMainWindow):
         # 设置默认状态信息
         status_bar.showMessage("美食地图应用已准备就绪")
         
+        # 添加地图缩放级别标签
+        self.map_zoom_label = QLabel()
+        status_bar.addPermanentWidget(self.map_zoom_label)
+        
         # 添加数据集信息标签
         self.dataset_label = QLabel()
         self.dataset_label.setStyleSheet("""
@@ -429,41 +458,59 @@ class MainWindow(QMainWindow):
         self.dataset_label.setText(f"当前地图: {collection_name} | 共 {count} 条美食记录")
     
     def load_food_data(self):
-        """从数据库加载美食数据，基于当前选择的集合"""
+        """加载当前选择的集合：列表和地图各自在后台只查询需要显示的记录
+        
+        列表按页读取，地图按当前缩放级别和视野读取聚合结果；
+        快速切换集合时只有最后一次请求的结果会被应用。
+        """
         if hasattr(self, 'current_collection_id') and self.current_collection_id:
-            food_items = self.food_manager.get_food_items_by_collection(self.current_collection_id)
-            
-            # 更新列表
-            self.food_list_widget.update_food_list(food_items)
-            
-            # 更新地图
-            self.map_widget.plot_food_locations(food_items)
-            
-            # 确保应用当前的视图模式
-            if hasattr(self, 'current_view_mode'):
-                self.map_widget.set_view_mode(self.current_view_mode)
+            self.statusBar().showMessage("正在加载美食数据...", 3000)
+            self.food_list_widget.set_collection(self.current_collection_id)
+            self.map_widget.set_collection(self.current_collection_id)
         
-        # 在加载完数据后更新状态栏
         self.update_status_dataset_info()
+    
+    def submit_write(self, future, on_finished):
+        """后台写操作或 read_after_writes 读操作完成后，在界面线程中调用 on_finished(结果, 异常)"""
+        def done(future):
+            if future.cancelled():
+                self.writeFinished.emit(on_finished, None, WriteCancelled())
+            elif future.exception() is not None:
+                self.writeFinished.emit(on_finished, None, future.exception())
+            else:
+                self.writeFinished.emit(on_finished, future.result(), None)
         
-        # 更新状态栏消息，使用statusBar()方法获取状态栏
-        self.statusBar().showMessage(f"已成功加载美食数据", 3000)
+        future.add_done_callback(done)
     
     def show_add_food_dialog(self):
         dialog = AddFoodDialog(self, api_key=PLACE_SEARCH_AK)
-        if dialog.exec_():
-            # 获取新添加的美食数据
-            food_data = dialog.get_food_data()
-            
-            # 保存到数据库
-            food_id = self.food_manager.add_food_item(food_data)
-            
-            if food_id:
-                # 刷新数据
-                self.load_food_data()
-                QMessageBox.information(self, "成功", "美食记录添加成功！")
-            else:
-                QMessageBox.warning(self, "错误", "添加美食记录失败，请重试。")
+        dialog.exec_()
+    
+    def on_food_item_added(self, food_item):
+        """新增美食记录后只添加对应的列表项，地图重新聚合后只更新有变化的标记"""
+        if food_item['collection_id'] != getattr(self, 'current_collection_id', None):
+            return
+        self.food_list_widget.add_food_item(food_item)
+        self.map_widget.refresh_map()
+    
+    def on_food_item_updated(self, food_item):
+        """修改美食记录后只更新对应的列表项和地图标记"""
+        if food_item['collection_id'] != getattr(self, 'current_collection_id', None):
+            # 记录可能被移出了当前集合
+            self.on_food_item_deleted(food_item['id'])
+            return
+        self.food_list_widget.update_food_item(food_item)
+        self.map_widget.refresh_map()
+    
+    def on_food_item_deleted(self, food_id):
+        """删除美食记录后只移除对应的列表项和地图标记"""
+        self.food_list_widget.remove_food_item(food_id)
+        self.map_widget.refresh_map()
+    
+    def on_collection_data_changed(self, collection_id):
+        """集合整体变化（导入、删除集合等）时重新加载当前集合"""
+        if collection_id is None or collection_id == getattr(self, 'current_collection_id', None):
+            self.load_food_data()
     
     def show_food_detail_dialog(self, food_item):
         """弹出对话框显示美食详情"""
@@ -512,12 +559,17 @@ class MainWindow(QMainWindow):
         )
         
         if file_path:
-            success = self.food_manager.export_collection(self.current_collection_id, file_path)
+            def finish_export(success, error):
+                if error is None and success:
+                    QMessageBox.information(self, "成功", f"地图已成功导出到 {file_path}")
+                else:
+                    QMessageBox.warning(self, "错误", "导出地图失败，请重试。")
             
-            if success:
-                QMessageBox.information(self, "成功", f"地图已成功导出到 {file_path}")
-            else:
-                QMessageBox.warning(self, "错误", "导出地图失败，请重试。")
+            # 等已提交的修改写入后在后台导出，界面不等待写线程
+            self.statusBar().showMessage("正在导出地图...", 3000)
+            future = self.food_manager.read_after_writes(
+                self.food_manager.export_collection, self.current_collection_id, file_path)
+            self.submit_write(future, finish_export)
 
     def import_food_data(self):
         """导入地图集合从JSON文件"""
@@ -536,13 +588,45 @@ class MainWindow(QMainWindow):
             )
             
             if ok:
-                success, message = self.food_manager.import_collection(file_path, name)
-                if success:
-                    QMessageBox.information(self, "成功", message)
-                    # 重新加载集合
-                    self.load_collections()
-                else:
-                    QMessageBox.warning(self, "错误", message)
+                # 导入大文件时显示进度，并允许取消
+                progress = QProgressDialog("正在导入地图...", "取消", 0, 100, self)
+                progress.setWindowTitle("导入地图")
+                progress.setWindowModality(Qt.WindowModal)
+                progress.setMinimumDuration(500)
+                progress.setAutoClose(False)
+                progress.setAutoReset(False)
+                
+                cancelled = threading.Event()
+                progress.canceled.connect(cancelled.set)
+                
+                def update_progress(count, bytes_read, total_bytes):
+                    if total_bytes:
+                        progress.setValue(min(99, bytes_read * 100 // total_bytes))
+                    progress.setLabelText(f"正在导入地图... 已读取 {count} 条美食记录")
+                
+                def finish_import(result, error):
+                    self.importProgress.disconnect(update_progress)
+                    progress.close()
+                    
+                    success, message = result if error is None else (False, f"导入失败: {error}")
+                    if success:
+                        QMessageBox.information(self, "成功", message)
+                        # 重新加载集合
+                        self.load_collections()
+                    elif cancelled.is_set():
+                        QMessageBox.information(self, "已取消", message)
+                    else:
+                        QMessageBox.warning(self, "错误", message)
+                
+                # 导入在后台写线程中单独执行，进度通过信号回到界面线程
+                self.importProgress.connect(update_progress)
+                future = self.food_manager.write_queue.submit_exclusive(
+                    self.food_manager.import_collection,
+                    file_path, name,
+                    progress_callback=self.importProgress.emit,
+                    cancel_check=cancelled.is_set
+                )
+                self.submit_write(future, finish_import)
 
     def delete_food_item(self, food_id):
         """删除美食项"""
@@ -555,13 +639,13 @@ class MainWindow(QMainWindow):
         )
         
         if confirm == QMessageBox.Yes:
-            success = self.food_manager.delete_food_item(food_id)
-            if success:
-                # 刷新数据
-                self.load_food_data()
-                QMessageBox.information(self, "成功", "美食记录已删除！")
-            else:
-                QMessageBox.warning(self, "错误", "删除美食记录失败，请重试。")
+            def finish_delete(result, error):
+                if error is None:
+                    QMessageBox.information(self, "成功", "美食记录已删除！")
+                else:
+                    QMessageBox.warning(self, "错误", "删除美食记录失败，请重试。")
+            
+            self.submit_write(self.food_manager.enqueue_delete_food_item(food_id), finish_delete)
 
     def edit_food_item(self, food_id):
         """编辑美食记录"""
@@ -580,8 +664,6 @@ class MainWindow(QMainWindow):
                 )
                 
                 if dialog.exec_():
-                    # 更新列表和地图
-                    self.load_food_data()  # 使用load_food_data替代未定义的refresh_food_list和update_map_markers方法
                     QMessageBox.information(self, "成功", "美食记录已更新！")
         
         except Exception as e:
@@ -721,37 +803,22 @@ class MainWindow(QMainWindow):
             description, ok = QInputDialog.getText(self, "地图描述", "请输入地图描述:")
             
             if ok:
-                conn = self.food_manager.get_connection()
-                cursor = conn.cursor()
-                
-                try:
-                    # 插入新集合
-                    cursor.execute("""
-                        INSERT INTO map_collections (name, description, is_personal, created_at)
-                        VALUES (?, ?, ?, ?)
-                    """, (
-                        name,
-                        description or "",
-                        1,  # 个人集合
-                        datetime.datetime.now().isoformat()
-                    ))
-                    
-                    conn.commit()
+                def finish_create(collection_id, error):
+                    if error is not None:
+                        QMessageBox.warning(self, "错误", f"创建地图失败: {str(error)}")
+                        return
                     
                     # 重新加载集合列表
                     self.load_collections()
                     
                     # 选择新创建的集合
                     for i in range(self.collection_combo.count()):
-                        if self.collection_combo.itemData(i) == cursor.lastrowid:
+                        if self.collection_combo.itemData(i) == collection_id:
                             self.collection_combo.setCurrentIndex(i)
                             break
-                    
-                except Exception as e:
-                    QMessageBox.warning(self, "错误", f"创建地图失败: {str(e)}")
                 
-                finally:
-                    conn.close()
+                # 插入新集合（个人集合）
+                self.submit_write(self.food_manager.enqueue_create_collection(name, description or ""), finish_create)
 
     def delete_collection(self):
         """删除当前选中的地图集合"""
@@ -784,25 +851,17 @@ class MainWindow(QMainWindow):
         )
         
         if confirm == QMessageBox.Yes:
-            try:
-                conn = self.food_manager.get_connection()
-                cursor = conn.cursor()
-                
-                # 删除地图及其关联的所有美食项
-                cursor.execute("DELETE FROM map_collections WHERE id = ?", (self.current_collection_id,))
-                conn.commit()
-                
-                QMessageBox.information(self, "成功", f"地图 '{collection_name}' 已删除")
-                
-                # 重新加载集合列表
-                self.load_collections()
-                
-            except Exception as e:
-                QMessageBox.warning(self, "错误", f"删除地图失败: {str(e)}")
+            def finish_delete(result, error):
+                if error is None:
+                    QMessageBox.information(self, "成功", f"地图 '{collection_name}' 已删除")
+                    
+                    # 重新加载集合列表
+                    self.load_collections()
+                else:
+                    QMessageBox.warning(self, "错误", "删除地图失败，请重试。")
             
-            finally:
-                if conn:
-                    conn.close()
+            # 删除地图及其关联的所有美食项，照片只在没有其他引用时才会删除
+            self.submit_write(self.food_manager.enqueue_delete_collection(self.current_collection_id), finish_delete)
 
     def on_food_item_double_clicked(self, food_item):
         """
@@ -820,6 +879,14 @@ class MainWindow(QMainWindow):
         # 同时高亮显示该美食点
         self.map_widget.highlight_food_location(food_item)
 
+    def on_map_marker_clicked(self, food_id):
+        """地图上的标记被点击：在列表中选中对应的美食项"""
+        self.food_list_widget.select_food_item(food_id)
+    
+    def on_map_viewport_changed(self, zoom, bounds):
+        """地图缩放或移动后在状态栏显示缩放级别；按视野重新聚合由 MapWidget 自己处理"""
+        self.map_zoom_label.setText(f"缩放级别: {zoom:.0f}")
+    
     def create_view_mode_buttons(self, toolbar):
         """创建视图模式切换按钮，添加到工具栏的右侧"""
         # 创建一个容器，使两个按钮看起来像一个分段控件
@@ -925,22 +992,27 @@ class MainWindow(QMainWindow):
         )
         
         if file_path:
-            success = self.food_manager.export_blog(self.current_collection_id, file_path)
+            def finish_export(success, error):
+                if error is None and success:
+                    QMessageBox.information(self, "成功", f"博客已成功导出到 {file_path}")
+                    
+                    # 询问是否立即查看博客
+                    reply = QMessageBox.question(
+                        self, 
+                        "查看博客", 
+                        "博客已成功导出，是否立即在浏览器中查看？",
+                        QMessageBox.Yes | QMessageBox.No,
+                        QMessageBox.Yes
+                    )
+                    
+                    if reply == QMessageBox.Yes:
+                        # 使用系统默认浏览器打开HTML文件
+                        QDesktopServices.openUrl(QUrl.fromLocalFile(file_path))
+                else:
+                    QMessageBox.warning(self, "错误", "导出博客失败，请重试。")
             
-            if success:
-                QMessageBox.information(self, "成功", f"博客已成功导出到 {file_path}")
-                
-                # 询问是否立即查看博客
-                reply = QMessageBox.question(
-                    self, 
-                    "查看博客", 
-                    "博客已成功导出，是否立即在浏览器中查看？",
-                    QMessageBox.Yes | QMessageBox.No,
-                    QMessageBox.Yes
-                )
-                
-                if reply == QMessageBox.Yes:
-                    # 使用系统默认浏览器打开HTML文件
-                    QDesktopServices.openUrl(QUrl.fromLocalFile(file_path))
-            else:
-                QMessageBox.warning(self, "错误", "导出博客失败，请重试。") 
\ No newline at end of file
+            # 等已提交的修改写入后在后台导出，界面不等待写线程
+            self.statusBar().showMessage("正在导出博客...", 3000)
+            future = self.food_manager.read_after_writes(
+                self.food_manager.export_blog, self.current_collection_id, file_path)
+            self.submit_write(future, finish_export)
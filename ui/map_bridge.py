@@ -0,0 +1,60 @@
+import json
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot
+
+
+class MapBridge(QObject):
+    """通过 QWebChannel 注册到 map.html 的桥接对象
+
+    Python 调用 send() 发送地图命令，同一轮事件循环中的命令合并为一个JSON批次，
+    通过 commandsReady 信号一次送到页面。页面初始化完成前的命令先排队，
+    页面调用 notifyReady() 后再发送，不需要反复检查地图是否加载。
+    页面中的标记点击和视野变化通过槽函数回到Python，再以信号发出。
+    """
+    # Python -> 页面
+    commandsReady = pyqtSignal(str)     # JSON 数组 [[函数名, 参数...], ...]
+    # 页面 -> Python
+    mapReady = pyqtSignal()
+    markerClicked = pyqtSignal(int)     # 美食ID
+    viewportChanged = pyqtSignal(float, object)  # 缩放级别, (最小纬度, 最小经度, 最大纬度, 最大经度)
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.ready = False
+        self.pending = []
+        self.flush_scheduled = False
+    
+    def send(self, name, *args):
+        """在页面中调用 name(*args)，参数需能序列化为JSON"""
+        self.pending.append([name, *args])
+        if self.ready and not self.flush_scheduled:
+            self.flush_scheduled = True
+            QTimer.singleShot(0, self.flush)
+    
+    def flush(self):
+        """把排队的命令作为一个批次发送到页面"""
+        self.flush_scheduled = False
+        if not self.ready or not self.pending:
+            return
+        
+        commands, self.pending = self.pending, []
+        self.commandsReady.emit(json.dumps(commands, ensure_ascii=False, separators=(",", ":")))
+    
+    def reset(self):
+        """页面重新加载时调用：丢弃发给旧页面的命令，之后的命令等待页面再次就绪"""
+        self.ready = False
+        self.pending = []
+    
+    @pyqtSlot()
+    def notifyReady(self):
+        self.ready = True
+        self.mapReady.emit()
+        self.flush()
+    
+    @pyqtSlot(int)
+    def notifyMarkerClicked(self, food_id):
+        self.markerClicked.emit(food_id)
+    
+    @pyqtSlot(float, float, float, float, float)
+    def notifyViewport(self, zoom, min_lat, min_lng, max_lat, max_lng):
+        self.viewportChanged.emit(zoom, (min_lat, min_lng, max_lat, max_lng))
@@ -1,14 +1,43 @@
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QComboBox, QHBoxLayout, QPushButton
-from PyQt5.QtCore import Qt, QUrl, pyqtSignal, QTimer
+from PyQt5.QtCore import Qt, QUrl, pyqtSignal
 from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEngineSettings
+from PyQt5.QtWebChannel import QWebChannel
 import json
 import requests
 import os
 
 from config.api_keys import PLACE_SEARCH_AK
 from config.api_keys import MAP_DISPLAY_AK
+from data.food_manager import FoodQuery
+from ui.map_bridge import MapBridge
+from ui.read_dispatcher import ReadDispatcher
+
+
+def marker_data(item):
+    """单个美食标记的数据，顺序与 map.html 中 addFoodMarker 的参数一致"""
+    return [
+        item['longitude'],
+        item['latitude'],
+        item['name'],
+        item['rating'],
+        item['id'],
+        item.get('address') or '未知',
+        item.get('reason') or '',
+        item.get('city') or '未知',
+        item.get('food_type') or '',
+    ]
+
+
+def cluster_data(cluster):
+    """单个聚合点的数据，顺序与 map.html 中 addClusterMarker 的参数一致"""
+    return [cluster['key'], cluster['lng'], cluster['lat'], cluster['count'], cluster['zoom']]
+
 
 class MapWidget(QWidget):
+    # 页面中的事件，经 MapBridge 转发
+    markerClicked = pyqtSignal(int)                 # 被点击标记的美食ID
+    viewportChanged = pyqtSignal(float, object)     # 缩放级别, (最小纬度, 最小经度, 最大纬度, 最大经度)
+    
     def __init__(self):
         super().__init__()
         
@@ -16,6 +45,12 @@ class MapWidget(QWidget):
         self.api_key_gl = MAP_DISPLAY_AK
         self.view_mode = "country"  # 默认全国视图
         self.current_city = "北京"   # 默认城市
+        self.collection_id = None   # 当前显示的集合
+        self.food_manager = None
+        self.markers = {}           # 美食ID -> 已发送到页面的标记数据，与页面中的 markerById 一致
+        self.clusters = {}          # 聚合点的键 -> 已发送到页面的聚合数据，与页面中的 clusterByKey 一致
+        self.viewport = None        # 页面报告的 (缩放级别, 视野范围)
+        self.read_dispatcher = None
         
         self.setup_ui()
         self.initialize_map()
@@ -54,6 +89,17 @@ class MapWidget(QWidget):
         settings.setAttribute(QWebEngineSettings.LocalContentCanAccessRemoteUrls, True)
         settings.setAttribute(QWebEngineSettings.AllowRunningInsecureContent, True)
         
+        # 与页面通信的桥接对象，页面通过 qwebchannel.js 访问
+        self.bridge = MapBridge(self)
+        self.bridge.markerClicked.connect(self.markerClicked)
+        self.bridge.viewportChanged.connect(self.viewportChanged)
+        self.bridge.viewportChanged.connect(self.on_viewport_changed)
+        self.bridge.mapReady.connect(self.on_map_ready)
+        self.channel = QWebChannel(self)
+        self.channel.registerObject("bridge", self.bridge)
+        self.web_view.page().setWebChannel(self.channel)
+        self.web_view.loadStarted.connect(self.on_load_started)
+        
         layout.addWidget(self.web_view)
         
         self.setLayout(layout)
@@ -81,6 +127,7 @@ class MapWidget(QWidget):
                 window.HOST_TYPE = '2';
                 window.BMapGL_loadScriptTime = (new Date).getTime();
             </script>
+            <script type="text/javascript" src="qrc:///qtwebchannel/qwebchannel.js"></script>
             <script type="text/javascript" src="https://api.map.baidu.com/getscript?type=webgl&v=1.0&ak={self.api_key_gl}&services=&t=20250313124310"></script>
         </head>
         <body>
@@ -89,7 +136,10 @@ class MapWidget(QWidget):
                 // 全局变量
                 var map;
                 var viewMode = "country";
-                var markers = [];
+                var markerById = new Map();  // 美食ID -> 标记，标记的 circle 为其探索范围圆，infoContent 为信息卡片内容
+                var highlightedMarker = null;
+                var clusterByKey = new Map();  // 聚合点的键 -> 聚合标记
+                var bridge = null;  // Python 端的 MapBridge
                 
                 // 初始化地图
                 function initMap() {{
@@ -104,87 +154,54 @@ class MapWidget(QWidget):
                     // 添加控件
                     map.addControl(new BMapGL.NavigationControl());
                     map.addControl(new BMapGL.ScaleControl());
+                    
+                    // 视野变化时通知Python
+                    map.addEventListener("zoomend", notifyViewport);
+                    map.addEventListener("moveend", notifyViewport);
+                    
+                    // 连接Python端的桥接对象，之后的命令都通过它送达
+                    new QWebChannel(qt.webChannelTransport, function(channel) {{
+                        bridge = channel.objects.bridge;
+                        bridge.commandsReady.connect(runCommands);
+                        bridge.notifyReady();
+                        notifyViewport();
+                    }});
+                }}
+                
+                // 依次执行Python发送的一批命令，每条命令为 [函数名, 参数...]
+                function runCommands(json) {{
+                    var commands = JSON.parse(json);
+                    for (var i = 0; i < commands.length; i++) {{
+                        window[commands[i][0]].apply(null, commands[i].slice(1));
+                    }}
+                }}
+                
+                // 把当前缩放级别和视野范围发送给Python
+                function notifyViewport() {{
+                    if (!bridge) return;
+                    var bounds = map.getBounds();
+                    var sw = bounds.getSouthWest();
+                    var ne = bounds.getNorthEast();
+                    bridge.notifyViewport(map.getZoom(), sw.lat, sw.lng, ne.lat, ne.lng);
                 }}
                 
                 // 添加食物标记
                 function addFoodMarker(lng, lat, name, rating, id, address, reason, city, food_type) {{
                     var point = new BMapGL.Point(lng, lat);
                     
-                    // 根据评分设置颜色
-                    var color = getColorByRating(rating);
-                    
                     // 创建标记
                     var marker = new BMapGL.Marker(point);
-                    marker.setTitle(name);
                     
-                    // 存储美食点数据
-                    marker.foodData = {{
-                        id: id,
-                        name: name,
-                        rating: rating,
-                        address: address,
-                        reason: reason || "暂无推荐理由",
-                        city: city,
-                        food_type: food_type
-                    }};
-                    
-                    // 添加点击事件
+                    // 点击标记时显示信息窗口，并通知Python；标记复用后ID会变化，从 foodData 读取
                     marker.addEventListener("click", function() {{
-                        // 关闭之前的信息窗口
-                        if (map.infoWindow) {{
-                            map.closeInfoWindow();
+                        openInfoWindow(marker);
+                        if (bridge) {{
+                            bridge.notifyMarkerClicked(marker.foodData.id);
                         }}
-                        
-                        // 创建信息卡片内容
-                        var content = `
-                            <div style="background-color: rgba(255, 255, 255, 0.8); 
-                                        padding: 15px; 
-                                        border-radius: 8px; 
-                                        max-width: 300px;
-                                        box-shadow: 0 2px 6px rgba(0, 0, 0, 0.2);">
-                                <h3 style="margin-top: 0; color: ${{color}};">${{name}}</h3>
-                                <div style="margin-bottom: 8px;">
-                                    <span style="font-weight: bold;">评分: </span>
-                                    <span>${{rating}} / 10</span>
-                                </div>
-                                <div style="margin-bottom: 8px;">
-                                    <span style="font-weight: bold;">类型: </span>
-                                    <span>${{food_type}}</span>
-                                </div>
-                                <div style="margin-bottom: 8px;">
-                                    <span style="font-weight: bold;">地址: </span>
-                                    <span>${{address}}</span>
-                                </div>
-                                <div style="margin-bottom: 8px;">
-                                    <span style="font-weight: bold;">城市: </span>
-                                    <span>${{city}}</span>
-                                </div>
-                                <div>
-                                    <span style="font-weight: bold;">推荐理由: </span>
-                                    <div style="margin-top: 5px;">${{reason}}</div>
-                                </div>
-                            </div>
-                        `;
-                        
-                        // 创建并打开信息窗口
-                        var infoWindow = new BMapGL.InfoWindow(content, {{
-                            width: 320,
-                            height: 200,
-                            title: "",
-                            enableMessage: false,
-                            enableCloseOnClick: true
-                        }});
-                        
-                        map.infoWindow = infoWindow;
-                        marker.openInfoWindow(infoWindow, point);
-                        
-                        // 通知Python应用高亮显示此美食点
-                        window.pywebview.api.highlightFoodItem(id);
                     }});
                     
                     // 添加到地图
                     map.addOverlay(marker);
-                    markers.push(marker);
                     
                     // 添加探索范围圆
                     var radius = (viewMode === "city") ? 1000 : 10000;
@@ -197,10 +214,203 @@ class MapWidget(QWidget):
                     }});
                     
                     map.addOverlay(circle);
+                    marker.circle = circle;
                     
+                    setMarkerData(marker, [lng, lat, name, rating, id, address, reason, city, food_type]);
                     return marker;
                 }}
                 
+                // 更新标记的位置和数据并登记到 markerById，data 为 addFoodMarker 的参数数组
+                function setMarkerData(marker, data) {{
+                    var point = new BMapGL.Point(data[0], data[1]);
+                    if (marker.foodData) {{
+                        marker.setPosition(point);
+                        marker.circle.setCenter(point);
+                    }}
+                    marker.setTitle(data[2]);
+                    
+                    // 存储美食点数据
+                    marker.foodData = {{
+                        id: data[4],
+                        name: data[2],
+                        rating: data[3],
+                        address: data[5],
+                        reason: data[6] || "暂无推荐理由",
+                        city: data[7],
+                        food_type: data[8]
+                    }};
+                    markerById.set(data[4], marker);
+                    
+                    // 信息卡片内容和高亮状态已过期
+                    marker.infoContent = null;
+                    if (highlightedMarker === marker) {{
+                        setHighlighted(marker, false);
+                        highlightedMarker = null;
+                    }}
+                    if (map.infoMarker === marker) {{
+                        map.closeInfoWindow();
+                        map.infoMarker = null;
+                    }}
+                }}
+                
+                // 转义HTML特殊字符，店名、地址等按普通文本显示
+                function escapeHtml(text) {{
+                    return String(text).replace(/[&<>"']/g, function(char) {{
+                        return {{"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}}[char];
+                    }});
+                }}
+                
+                // 标记的信息卡片内容，首次打开时生成，数据修改前一直复用
+                function infoContent(marker) {{
+                    if (marker.infoContent) {{
+                        return marker.infoContent;
+                    }}
+                    
+                    var foodData = marker.foodData;
+                    var color = getColorByRating(foodData.rating);
+                    marker.infoContent = `
+                        <div style="background-color: rgba(255, 255, 255, 0.8); 
+                                    padding: 15px; 
+                                    border-radius: 8px; 
+                                    max-width: 300px;
+                                    box-shadow: 0 2px 6px rgba(0, 0, 0, 0.2);">
+                            <h3 style="margin-top: 0; color: ${{color}};">${{escapeHtml(foodData.name)}}</h3>
+                            <div style="margin-bottom: 8px;">
+                                <span style="font-weight: bold;">评分: </span>
+                                <span>${{foodData.rating}} / 10</span>
+                            </div>
+                            <div style="margin-bottom: 8px;">
+                                <span style="font-weight: bold;">类型: </span>
+                                <span>${{escapeHtml(foodData.food_type)}}</span>
+                            </div>
+                            <div style="margin-bottom: 8px;">
+                                <span style="font-weight: bold;">地址: </span>
+                                <span>${{escapeHtml(foodData.address)}}</span>
+                            </div>
+                            <div style="margin-bottom: 8px;">
+                                <span style="font-weight: bold;">城市: </span>
+                                <span>${{escapeHtml(foodData.city)}}</span>
+                            </div>
+                            <div>
+                                <span style="font-weight: bold;">推荐理由: </span>
+                                <div style="margin-top: 5px;">${{escapeHtml(foodData.reason)}}</div>
+                            </div>
+                        </div>
+                    `;
+                    return marker.infoContent;
+                }}
+                
+                // 打开标记的信息窗口
+                function openInfoWindow(marker) {{
+                    // 关闭之前的信息窗口
+                    if (map.infoWindow) {{
+                        map.closeInfoWindow();
+                    }}
+                    
+                    var content = infoContent(marker);
+                    
+                    // 创建并打开信息窗口
+                    var infoWindow = new BMapGL.InfoWindow(content, {{
+                        width: 320,
+                        height: 200,
+                        title: "",
+                        enableMessage: false,
+                        enableCloseOnClick: true
+                    }});
+                    
+                    map.infoWindow = infoWindow;
+                    map.infoMarker = marker;
+                    marker.openInfoWindow(infoWindow, marker.getPosition());
+                }}
+                
+                // 按差异更新标记：removedIds 为要删除的美食ID，changed 为新增或修改的标记数据，
+                // 每一项为 addFoodMarker 的参数数组。删除的标记优先复用给新增的记录，
+                // 只移动位置、更新数据，不重建覆盖物；多余的才从地图上移除
+                function applyMarkerDiff(removedIds, changed) {{
+                    var spare = [];
+                    for (var i = 0; i < removedIds.length; i++) {{
+                        var removed = markerById.get(removedIds[i]);
+                        if (removed) {{
+                            markerById.delete(removedIds[i]);
+                            spare.push(removed);
+                        }}
+                    }}
+                    
+                    for (var j = 0; j < changed.length; j++) {{
+                        var marker = markerById.get(changed[j][4]) || spare.pop();
+                        if (marker) {{
+                            setMarkerData(marker, changed[j]);
+                        }} else {{
+                            addFoodMarker.apply(null, changed[j]);
+                        }}
+                    }}
+                    
+                    for (var k = 0; k < spare.length; k++) {{
+                        removeMarkerOverlays(spare[k]);
+                    }}
+                }}
+                
+                // 添加聚合标记：圆形气泡显示其中的美食数量，点击后放大到聚合点分开的级别
+                function addClusterMarker(key, lng, lat, count, zoom) {{
+                    var label = new BMapGL.Label("", {{position: new BMapGL.Point(lng, lat)}});
+                    label.addEventListener("click", function() {{
+                        map.centerAndZoom(label.getPosition(), label.expansionZoom);
+                    }});
+                    map.addOverlay(label);
+                    setClusterData(label, [key, lng, lat, count, zoom]);
+                    return label;
+                }}
+                
+                // 更新聚合标记的位置、数量和展开级别，data 为 addClusterMarker 的参数数组
+                function setClusterData(label, data) {{
+                    var count = data[3];
+                    var size = count < 10 ? 30 : (count < 100 ? 38 : (count < 1000 ? 46 : 54));
+                    label.setPosition(new BMapGL.Point(data[1], data[2]));
+                    label.setOffset(new BMapGL.Size(-size / 2, -size / 2));
+                    label.setContent(String(count));
+                    label.setStyle({{
+                        width: size + "px",
+                        height: size + "px",
+                        lineHeight: size + "px",
+                        borderRadius: "50%",
+                        border: "2px solid #fff",
+                        backgroundColor: "rgba(255, 140, 0, 0.85)",
+                        color: "#fff",
+                        fontSize: "13px",
+                        fontWeight: "bold",
+                        textAlign: "center",
+                        padding: "0",
+                        cursor: "pointer"
+                    }});
+                    label.expansionZoom = data[4];
+                    clusterByKey.set(data[0], label);
+                }}
+                
+                // 按差异更新聚合标记，删除的聚合标记优先复用给新增的聚合点
+                function applyClusterDiff(removedKeys, changed) {{
+                    var spare = [];
+                    for (var i = 0; i < removedKeys.length; i++) {{
+                        var removed = clusterByKey.get(removedKeys[i]);
+                        if (removed) {{
+                            clusterByKey.delete(removedKeys[i]);
+                            spare.push(removed);
+                        }}
+                    }}
+                    
+                    for (var j = 0; j < changed.length; j++) {{
+                        var label = clusterByKey.get(changed[j][0]) || spare.pop();
+                        if (label) {{
+                            setClusterData(label, changed[j]);
+                        }} else {{
+                            addClusterMarker.apply(null, changed[j]);
+                        }}
+                    }}
+                    
+                    for (var k = 0; k < spare.length; k++) {{
+                        map.removeOverlay(spare[k]);
+                    }}
+                }}
+                
                 // 根据评分获取颜色
                 function getColorByRating(rating) {{
                     if (rating >= 9) return "#FF4500";  // 橙红色
@@ -214,6 +424,13 @@ class MapWidget(QWidget):
                 // 设置视图模式
                 function setViewMode(mode) {{
                     viewMode = mode;
+                    
+                    // 已有的探索范围圆改为新视图的半径
+                    var radius = (mode === "city") ? 1000 : 10000;
+                    markerById.forEach(function(marker) {{
+                        marker.circle.setRadius(radius);
+                    }});
+                    
                     if (mode === "country") {{
                         map.setZoom(5);
                     }} else {{
@@ -231,35 +448,46 @@ class MapWidget(QWidget):
                     }}, cityName);
                 }}
                 
-                // 清除所有标记
-                function clearMarkers() {{
-                    for (var i = 0; i < markers.length; i++) {{
-                        map.removeOverlay(markers[i]);
+                // 从地图上移除标记及其范围圆
+                function removeMarkerOverlays(marker) {{
+                    if (highlightedMarker === marker) {{
+                        highlightedMarker = null;
+                    }}
+                    if (map.infoMarker === marker) {{
+                        map.closeInfoWindow();
+                        map.infoMarker = null;
                     }}
-                    markers = [];
-                    map.clearOverlays();
+                    map.removeOverlay(marker);
+                    map.removeOverlay(marker.circle);
                 }}
                 
                 // 高亮显示标记
                 function highlightMarker(id) {{
-                    // 实现高亮逻辑
+                    if (highlightedMarker) {{
+                        setHighlighted(highlightedMarker, false);
+                    }}
+                    highlightedMarker = markerById.get(id) || null;
+                    if (highlightedMarker) {{
+                        setHighlighted(highlightedMarker, true);
+                    }}
+                }}
+                
+                // 高亮的标记用红色加粗的范围圆显示
+                function setHighlighted(marker, highlighted) {{
+                    var color = highlighted ? "#E74C3C" : "#FF8C00";
+                    marker.circle.setStrokeColor(color);
+                    marker.circle.setFillColor(color);
+                    marker.circle.setStrokeWeight(highlighted ? 3 : 1);
+                    marker.circle.setFillOpacity(highlighted ? 0.4 : 0.2);
                 }}
                 
                 // 通过ID显示信息窗口的函数
                 function showInfoWindowById(id) {{
-                    // 遍历所有标记，查找匹配ID的标记
-                    for (var i = 0; i < markers.length; i++) {{
-                        if (markers[i].foodData && markers[i].foodData.id == id) {{
-                            // 找到匹配的标记，直接调用marker上已绑定的click事件处理函数
-                            var clickEvent = document.createEvent('Event');
-                            clickEvent.initEvent('click', true, true);
-                            markers[i].dispatchEvent(clickEvent);
-                            
-                            // 将地图中心移动到标记位置
-                            var point = markers[i].getPosition();
-                            map.panTo(point);
-                            break;
-                        }}
+                    var marker = markerById.get(id);
+                    if (marker) {{
+                        // 打开信息窗口并将地图中心移动到标记位置
+                        openInfoWindow(marker);
+                        map.panTo(marker.getPosition());
                     }}
                 }}
                 
@@ -284,8 +512,8 @@ class MapWidget(QWidget):
             mode (str): 'country' 表示全国视图, 'city' 表示城市视图
         """
         # 调用JavaScript方法切换视图模式
-        script = f"setViewMode('{mode}');"
-        self.web_view.page().runJavaScript(script)
+        self.view_mode = mode
+        self.bridge.send("setViewMode", mode)
         
         # 更新地图上的标记
         self.refresh_map()
@@ -293,76 +521,118 @@ class MapWidget(QWidget):
     def on_city_changed(self, city_name):
         self.current_city = city_name
         # 调用JavaScript函数更新城市
-        self.web_view.page().runJavaScript(f"setCity('{city_name}');")
+        self.bridge.send("setCity", city_name)
         
         # 如果是城市视图，则只显示当前城市的美食点
         if self.view_mode == "city":
             self.refresh_map()
     
+    def on_load_started(self):
+        """页面重新加载后其中没有任何标记，发给旧页面的命令也不再发送"""
+        self.markers = {}
+        self.clusters = {}
+        self.viewport = None
+        self.bridge.reset()
+    
+    def on_map_ready(self):
+        """页面就绪后恢复视图模式和城市；标记在页面报告视野后再读取"""
+        if self.view_mode == "city":
+            self.bridge.send("setViewMode", self.view_mode)
+            self.bridge.send("setCity", self.current_city)
+    
     def plot_food_locations(self, food_items):
-        # 检查地图是否已经加载
-        check_js = """
-        if (typeof map !== 'undefined' && typeof addFoodMarker === 'function' && typeof clearMarkers === 'function') {
-            clearMarkers();
-            true;
-        } else {
-            false;
-        }
+        """显示 food_items 中的美食点
+        
+        与页面上已有的标记比较，只发送新增、修改和删除的标记；
+        切换集合时删除的标记在页面中复用给新增的记录，不重建覆盖物。
         """
+        # 如果是城市视图，只显示当前城市的美食点
+        if self.view_mode == "city":
+            food_items = [item for item in food_items if item['city'] == self.current_city]
         
-        def on_check_result(result):
-            if result:
-                # 添加新标记
-                for item in food_items:
-                    # 如果是城市视图且不是当前城市，则跳过
-                    if self.view_mode == "city" and item['city'] != self.current_city:
-                        continue
-                        
-                    # 添加标记，传递更多信息以便显示在悬浮卡片上
-                    reason = item.get('reason', '')
-                    # 处理字符串中的引号，避免JavaScript错误
-                    reason = reason.replace('"', '\\"').replace("'", "\\'")
-                    name = item['name'].replace('"', '\\"').replace("'", "\\'")
-                    address = item.get('address', '未知').replace('"', '\\"').replace("'", "\\'")
-                    city = item.get('city', '未知').replace('"', '\\"').replace("'", "\\'")
-                    
-                    js_code = f"""addFoodMarker(
-                        {item['longitude']}, 
-                        {item['latitude']}, 
-                        "{name}", 
-                        {item['rating']}, 
-                        {item['id']},
-                        "{address}",
-                        "{reason}",
-                        "{city}",
-                        "{item['food_type']}"
-                    );"""
-                    self.web_view.page().runJavaScript(js_code)
-            else:
-                # 如果地图还没准备好，延迟200ms再试
-                QTimer.singleShot(200, lambda: self.plot_food_locations(food_items))
-        
-        self.web_view.page().runJavaScript(check_js, on_check_result)
+        markers = {item['id']: marker_data(item) for item in food_items}
+        removed = [food_id for food_id in self.markers if food_id not in markers]
+        changed = [data for food_id, data in markers.items() if self.markers.get(food_id) != data]
+        self.markers = markers
+        
+        # 地图加载完成前由 MapBridge 排队，加载后一起发送
+        if removed or changed:
+            self.bridge.send("applyMarkerDiff", removed, changed)
     
     def highlight_food_location(self, food_item):
         # 高亮显示选中的美食点
-        self.web_view.page().runJavaScript(f"highlightMarker({food_item['id']});")
+        self.bridge.send("highlightMarker", food_item['id'])
+    
+    def get_food_manager(self):
+        """首次使用时创建 FoodManager，之后复用"""
+        if self.food_manager is None:
+            from data.food_manager import FoodManager
+            self.food_manager = FoodManager(use_pool=True)
+        if self.read_dispatcher is None:
+            self.read_dispatcher = ReadDispatcher(self.food_manager, self)
+        return self.food_manager
+    
+    def set_collection(self, collection_id):
+        """设置地图显示的集合"""
+        self.collection_id = collection_id
+        self.refresh_map()
+    
+    def map_query(self):
+        """地图当前需要显示的美食记录：当前集合，城市视图时只取当前城市"""
+        query = FoodQuery()
+        if self.collection_id is not None:
+            query = query.collection(self.collection_id)
+        if self.view_mode == "city":
+            query = query.city(self.current_city)
+        return query
+    
+    def on_viewport_changed(self, zoom, bounds):
+        """地图缩放或移动后按新的视野重新聚合"""
+        self.viewport = (zoom, bounds)
+        self.refresh_map()
     
     def refresh_map(self):
-        # 重新加载所有美食点
-        from data.food_manager import FoodManager
-        food_manager = FoodManager()
-        food_items = food_manager.get_all_food_items()
-        self.plot_food_locations(food_items)
+        """在后台按当前缩放级别和视野读取聚合后的美食点，完成后只更新有变化的标记
+        
+        页面就绪后会报告视野，在此之前不读取。数据修改后聚合索引随缓存失效，
+        调用本方法即可让地图反映新增、修改和删除的记录。
+        """
+        if self.collection_id is None or self.viewport is None:
+            return
+        
+        # 向四周各扩展半个视野，小范围移动时边缘不会出现空白
+        zoom, (min_lat, min_lng, max_lat, max_lng) = self.viewport
+        pad_lat = (max_lat - min_lat) / 2
+        pad_lng = (max_lng - min_lng) / 2
+        bounds = (min_lat - pad_lat, min_lng - pad_lng, max_lat + pad_lat, max_lng + pad_lng)
+        
+        self.get_food_manager()
+        self.read_dispatcher.submit("clusters", self.load_clusters, self.map_query(), zoom, bounds,
+                                    on_finished=self.plot_clusters)
+    
+    def load_clusters(self, query, zoom, bounds):
+        """在读取线程中执行：返回 (单个美食点列表, 聚合点列表)，聚合索引每个查询只建一次"""
+        return self.food_manager.get_cluster_index(query).clusters(zoom, bounds)
+    
+    def plot_clusters(self, result):
+        """显示聚合结果：单个美食点和聚合点都只发送与页面上已有标记的差异"""
+        points, clusters = result
+        self.plot_food_locations(points)
+        
+        new_clusters = {cluster['key']: cluster_data(cluster) for cluster in clusters}
+        removed = [key for key in self.clusters if key not in new_clusters]
+        changed = [data for key, data in new_clusters.items() if self.clusters.get(key) != data]
+        self.clusters = new_clusters
+        if removed or changed:
+            self.bridge.send("applyClusterDiff", removed, changed)
     
     # 在第一次使用时加载所有城市列表
     def load_all_cities(self):
         """加载数据库中所有城市"""
-        from data.food_manager import FoodManager
-        food_manager = FoodManager()
+        food_manager = self.get_food_manager()
         
         try:
-            conn = food_manager.get_connection()
+            conn = food_manager.get_connection(readonly=True)
             cursor = conn.cursor()
             
             cursor.execute("SELECT DISTINCT city FROM food_items ORDER BY city")
@@ -451,74 +721,4 @@ class MapWidget(QWidget):
         Args:
             food_id: 美食点的ID
         """
-        # 直接执行打开信息窗口的操作，而不是尝试触发事件
-        js_code = """
-        (function() {
-            for (var i = 0; i < markers.length; i++) {
-                if (markers[i].foodData && markers[i].foodData.id == %d) {
-                    var marker = markers[i];
-                    var point = marker.getPosition();
-                    var foodData = marker.foodData;
-                    
-                    // 关闭之前的信息窗口
-                    if (map.infoWindow) {
-                        map.closeInfoWindow();
-                    }
-                    
-                    // 创建信息卡片内容
-                    var color = getColorByRating(foodData.rating);
-                    var content = `
-                        <div style="background-color: rgba(255, 255, 255, 0.8); 
-                                    padding: 15px; 
-                                    border-radius: 8px; 
-                                    max-width: 300px;
-                                    box-shadow: 0 2px 6px rgba(0, 0, 0, 0.2);">
-                            <h3 style="margin-top: 0; color: ${color};">${foodData.name}</h3>
-                            <div style="margin-bottom: 8px;">
-                                <span style="font-weight: bold;">评分: </span>
-                                <span>${foodData.rating} / 10</span>
-                            </div>
-                            <div style="margin-bottom: 8px;">
-                                <span style="font-weight: bold;">类型: </span>
-                                <span>${foodData.food_type}</span>
-                            </div>
-                            <div style="margin-bottom: 8px;">
-                                <span style="font-weight: bold;">地址: </span>
-                                <span>${foodData.address}</span>
-                            </div>
-                            <div style="margin-bottom: 8px;">
-                                <span style="font-weight: bold;">城市: </span>
-                                <span>${foodData.city}</span>
-                            </div>
-                            <div>
-                                <span style="font-weight: bold;">推荐理由: </span>
-                                <div style="margin-top: 5px;">${foodData.reason}</div>
-                            </div>
-                        </div>
-                    `;
-                    
-                    // 创建并打开信息窗口
-                    var infoWindow = new BMapGL.InfoWindow(content, {
-                        width: 320,
-                        height: 200,
-                        title: "",
-                        enableMessage: false,
-                        enableCloseOnClick: true
-                    });
-                    
-                    map.infoWindow = infoWindow;
-                    marker.openInfoWindow(infoWindow, point);
-                    
-                    // 将地图中心移动到标记位置
-                    map.panTo(point);
-                    
-                    // 通知Python应用高亮显示此美食点
-                    window.pywebview.api.highlightFoodItem(foodData.id);
-                    
-                    break;
-                }
-            }
-        })();
-        """ % food_id
-        
-        self.web_view.page().runJavaScript(js_code) 
\ No newline at end of file
+        self.bridge.send("showInfoWindowById", int(food_id))
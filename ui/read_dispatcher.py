@@ -0,0 +1,35 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class ReadDispatcher(QObject):
+    """在后台线程池中读取数据，并把结果送回界面线程
+
+    每个键只应用最新请求的结果：用户快速切换地图或美食项时，
+    尚未开始的旧请求被取消，已完成的旧请求结果直接丢弃。
+    """
+    # 从读取线程发出，由Qt排队到界面线程
+    finished = pyqtSignal(object, object, object)  # 键, Future, 处理函数
+    
+    def __init__(self, food_manager, parent=None):
+        super().__init__(parent)
+        self.food_manager = food_manager
+        self.finished.connect(self.dispatch)
+    
+    def submit(self, key, func, *args, on_finished):
+        """在后台执行 func(*args)，完成后在界面线程中调用 on_finished(结果)"""
+        # 键只在本对象内有效，不同控件的请求互不取消
+        key = (id(self), key)
+        future = self.food_manager.read_async(key, func, *args)
+        future.add_done_callback(lambda future: self.finished.emit(key, future, on_finished))
+        return future
+    
+    def dispatch(self, key, future, on_finished):
+        """只处理仍是最新请求的结果"""
+        if future.cancelled() or not self.food_manager.async_reader.is_latest(key, future):
+            return
+        
+        if future.exception() is not None:
+            print(f"后台读取数据失败: {future.exception()}")
+            return
+        
+        on_finished(future.result())